@@ -0,0 +1,115 @@
+import mmap
+import struct
+from pathlib import Path
+
+# A file that holds a whole book of verses to diff, so they can be shared with tbta_find_differences through memory
+# instead of sending every verse down the pipe. All of the numbers are little-endian unsigned 32 bit ints.
+#
+#   header:     magic (8 bytes), verse count, max diffs per verse
+#   entries:    for each verse: old text offset, old text length, new text offset, new text length (in bytes, from the start of the file)
+#   results:    for each verse: diff count, then max diffs x (old start, old end, new start, new end) (in characters)
+#   texts:      the old and new texts in UTF-16-LE (the same as .NET strings), anywhere after the results
+#
+# The diff count is NOT_DIFFED until the verse has been diffed. If a verse has more than max diffs, the count is still
+# the real count but only the first max diffs are filled in, so the caller knows to send that verse down the pipe instead.
+MAGIC = b'TBTADIF1'
+HEADER = struct.Struct('<8sII')
+ENTRY = struct.Struct('<IIII')
+COUNT = struct.Struct('<I')
+RANGE = struct.Struct('<IIII')
+TEXT_ENCODING = 'utf-16-le'
+
+MAX_DIFFS = 64
+NOT_DIFFED = 0xFFFFFFFF
+
+
+def get_slot_size(max_diffs: int):
+    return COUNT.size + max_diffs * RANGE.size
+
+
+def get_results_offset(verse_count: int):
+    return HEADER.size + verse_count * ENTRY.size
+
+
+def write_map(path: Path, pairs: list[tuple[str, str]], max_diffs=MAX_DIFFS):
+    """
+    Write the (old text, new text) pairs to a new map file, with none of them diffed yet.
+    This is what the caller (TBTA) does, so it's mostly here for testing and for python callers.
+    """
+    text_offset = get_results_offset(len(pairs)) + len(pairs) * get_slot_size(max_diffs)
+    entries, texts = [], []
+    for old, new in pairs:
+        old_bytes, new_bytes = old.encode(TEXT_ENCODING), new.encode(TEXT_ENCODING)
+        entries.append(ENTRY.pack(text_offset, len(old_bytes), text_offset + len(old_bytes), len(new_bytes)))
+        texts.extend((old_bytes, new_bytes))
+        text_offset += len(old_bytes) + len(new_bytes)
+
+    empty_slot = COUNT.pack(NOT_DIFFED) + bytes(max_diffs * RANGE.size)
+    with path.open('wb') as file:
+        file.write(HEADER.pack(MAGIC, len(pairs), max_diffs))
+        file.writelines(entries)
+        file.writelines(empty_slot for _ in pairs)
+        file.writelines(texts)
+
+
+class DiffMap:
+    """
+    A map file opened in shared memory. The texts are decoded straight from the mapping, and the diffs are written straight into it.
+    Use it like: with DiffMap(path) as diff_map: ...
+    """
+    def __init__(self, path: Path):
+        with path.open('r+b') as file:
+            self.map = mmap.mmap(file.fileno(), 0)
+        if len(self.map) < HEADER.size:
+            self.map.close()
+            raise ValueError(f'"{path.name}" is too short to be a diff map')
+        magic, self.verse_count, self.max_diffs = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            self.map.close()
+            raise ValueError(f'"{path.name}" is not a diff map')
+        self.results_offset = get_results_offset(self.verse_count)
+        self.slot_size = get_slot_size(self.max_diffs)
+        self.texts_offset = self.results_offset + self.verse_count * self.slot_size
+        if len(self.map) < self.texts_offset:
+            self.map.close()
+            raise ValueError(f'"{path.name}" is too short for {self.verse_count} verses with {self.max_diffs} diffs each')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.map.close()
+
+    def get_texts(self, index: int):
+        old_offset, old_length, new_offset, new_length = ENTRY.unpack_from(self.map, HEADER.size + index * ENTRY.size)
+        for offset, length in ((old_offset, old_length), (new_offset, new_length)):
+            # The texts must be after the results, within the file, and a whole number of UTF-16 code units
+            if offset < self.texts_offset or offset + length > len(self.map) or length % 2:
+                raise ValueError(f'verse {index} has a text at {offset}-{offset + length}, outside of {self.texts_offset}-{len(self.map)}')
+        with memoryview(self.map) as view:
+            return (str(view[old_offset:old_offset + old_length], TEXT_ENCODING), str(view[new_offset:new_offset + new_length], TEXT_ENCODING))
+
+    def set_diffs(self, index: int, ranges: list[tuple[tuple[int, int], tuple[int, int]]]):
+        """
+        Write the ((old start, old end), (new start, new end)) ranges of a verse into its result slot.
+        The count is written last, so the verse doesn't look finished until all of its ranges are there.
+        """
+        slot_offset = self.results_offset + index * self.slot_size
+        for i, ((old_start, old_end), (new_start, new_end)) in enumerate(ranges[:self.max_diffs]):
+            RANGE.pack_into(self.map, slot_offset + COUNT.size + i * RANGE.size, old_start, old_end, new_start, new_end)
+        COUNT.pack_into(self.map, slot_offset, len(ranges))
+
+    def get_diffs(self, index: int):
+        """
+        Returns the ranges of a verse the same way they were given to set_diffs(), or None if it hasn't been diffed yet.
+        If there were more than max diffs, only the first max diffs are returned.
+        """
+        slot_offset = self.results_offset + index * self.slot_size
+        (count,) = COUNT.unpack_from(self.map, slot_offset)
+        if count == NOT_DIFFED:
+            return None
+        return [((old_start, old_end), (new_start, new_end))
+            for old_start, old_end, new_start, new_end in RANGE.iter_unpack(self.map[slot_offset + COUNT.size:slot_offset + COUNT.size + min(count, self.max_diffs) * RANGE.size])]
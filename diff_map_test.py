@@ -0,0 +1,69 @@
+import tempfile
+import unittest
+from pathlib import Path
+from diff_map import *
+
+
+class TestDiffMap(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.temp_dir.name) / 'Ruth.map'
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_texts(self):
+        # Texts can have newlines and any unicode, since they don't go through the pipe
+        pairs = [('Wan Hirudis mautus.', 'Imbah itu Hirudis\nmanyuruh.'), ('', '你好。世界'), ('¿Qué?', '')]
+        write_map(self.path, pairs)
+        with DiffMap(self.path) as diff_map:
+            self.assertEqual(3, diff_map.verse_count)
+            self.assertListEqual(pairs, [diff_map.get_texts(i) for i in range(3)])
+
+    def test_diffs(self):
+        write_map(self.path, [('a', 'b'), ('c', 'd')], max_diffs=2)
+        with DiffMap(self.path) as diff_map:
+            self.assertIsNone(diff_map.get_diffs(0))
+            diff_map.set_diffs(0, [((0, 3), (0, 9)), ((12, 18), (18, 26))])
+            diff_map.set_diffs(1, [])
+            self.assertListEqual([((0, 3), (0, 9)), ((12, 18), (18, 26))], diff_map.get_diffs(0))
+            self.assertListEqual([], diff_map.get_diffs(1))
+
+        # The diffs are in the file, for the caller to read
+        with DiffMap(self.path) as diff_map:
+            self.assertListEqual([((0, 3), (0, 9)), ((12, 18), (18, 26))], diff_map.get_diffs(0))
+
+    def test_too_many_diffs(self):
+        write_map(self.path, [('a', 'b'), ('c', 'd')], max_diffs=1)
+        with DiffMap(self.path) as diff_map:
+            diff_map.set_diffs(0, [((0, 1), (0, 1)), ((2, 3), (2, 3))])
+            # The count is still the real count, and the next verse is left alone
+            self.assertEqual(2, COUNT.unpack_from(diff_map.map, diff_map.results_offset)[0])
+            self.assertListEqual([((0, 1), (0, 1))], diff_map.get_diffs(0))
+            self.assertIsNone(diff_map.get_diffs(1))
+            self.assertEqual(('c', 'd'), diff_map.get_texts(1))
+
+    def test_not_a_map(self):
+        self.path.write_bytes(b'Not a diff map file')
+        with self.assertRaises(ValueError):
+            DiffMap(self.path)
+
+    def test_too_short(self):
+        # A header that claims more verses than the file holds
+        self.path.write_bytes(HEADER.pack(MAGIC, 1000, MAX_DIFFS))
+        with self.assertRaises(ValueError):
+            DiffMap(self.path)
+
+    def test_bad_entry(self):
+        # The texts were cut off, so the last verse's entry points past the end of the file
+        write_map(self.path, [('Wan Hirudis mautus.', 'Imbah itu Hirudis manyuruh.'), ('a', 'b')])
+        self.path.write_bytes(self.path.read_bytes()[:-3])
+        with DiffMap(self.path) as diff_map:
+            self.assertEqual(('Wan Hirudis mautus.', 'Imbah itu Hirudis manyuruh.'), diff_map.get_texts(0))
+            with self.assertRaises(ValueError):
+                diff_map.get_texts(1)
+
+
+if __name__ == '__main__':
+    unittest.main()
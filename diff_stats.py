@@ -0,0 +1,120 @@
+import json
+import time
+import cProfile
+from bisect import bisect_left
+from pathlib import Path
+
+# The upper bound of each bucket. Anything over the last one goes in an extra bucket at the end.
+LATENCY_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+TOKEN_BUCKETS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+# The parts of a diff that are timed separately
+PHASE_TOKENIZE = 'tokenize'
+PHASE_LCS = 'lcs'               # finding the ranges that changed, including any sentence or chunk fallbacks
+PHASE_FIXUP = 'fixup'           # turning the matches into differences, i.e. spaces, punctuation and matching similar words
+PHASE_TOTAL = 'total'
+PHASES = (PHASE_TOKENIZE, PHASE_LCS, PHASE_FIXUP, PHASE_TOTAL)
+
+
+class Histogram:
+    """
+    Counts values in fixed buckets, so it takes the same memory however many values are added.
+    Percentiles are estimated as the upper bound of the bucket they fall in.
+    """
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, fraction):
+        if not self.count:
+            return 0
+        target = fraction * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= target:
+                return round(min(bound, self.max), 3)
+        return round(self.max, 3)
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean': round(self.total / self.count, 3) if self.count else 0,
+            'p50': self.percentile(0.5),
+            'p95': self.percentile(0.95),
+            'max': round(self.max, 3),
+            'buckets': { f'<={bound}': count for bound, count in zip(self.bounds, self.counts) if count }
+                | ({ f'>{self.bounds[-1]}': self.counts[-1] } if self.counts[-1] else {}),
+        }
+
+
+class DiffStats:
+    """
+    Counters and histograms for the diffs done by a long running process.
+    find_differences() adds each diff with the time it spent in each phase when it is given one of these.
+    """
+    def __init__(self):
+        self.start_time = time.time()
+        self.requests = 0
+        self.approximate = 0
+        self.tokens = Histogram(TOKEN_BUCKETS)
+        self.latency_ms = { phase: Histogram(LATENCY_BUCKETS_MS) for phase in PHASES }
+
+    def add_request(self, token_count, approximate, phase_seconds: dict):
+        self.requests += 1
+        self.approximate += 1 if approximate else 0
+        self.tokens.add(token_count)
+        for phase, seconds in phase_seconds.items():
+            self.latency_ms[phase].add(seconds * 1000)
+
+    def summary(self):
+        return {
+            'uptime_s': round(time.time() - self.start_time, 1),
+            'requests': self.requests,
+            'approximate': self.approximate,
+            'tokens': self.tokens.summary(),
+            'latency_ms': { phase: histogram.summary() for phase, histogram in self.latency_ms.items() },
+        }
+
+    def to_json(self):
+        # One line, so it can be sent back over the pipe like any other response
+        return json.dumps(self.summary(), separators=(',', ':'))
+
+
+class Profiler:
+    """
+    A profiler that can be turned on and off while the process keeps running, and dumps pstats files.
+    """
+    def __init__(self):
+        self.profile = None
+
+    @property
+    def running(self):
+        return self.profile is not None
+
+    def start(self):
+        if not self.profile:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+
+    def dump(self, path: Path):
+        """
+        Stop profiling and save the stats to the path, which can be opened with pstats or snakeviz.
+        Returns the path, or None if the profiler wasn't running.
+        """
+        if not self.profile:
+            return None
+        self.profile.disable()
+        self.profile.dump_stats(path)
+        self.profile = None
+        return path
+
@@ -0,0 +1,63 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from diff_stats import *
+
+
+class TestHistogram(unittest.TestCase):
+
+    def test_buckets(self):
+        histogram = Histogram((1, 10, 100))
+        for value in [0.5, 1, 5, 50, 500]:
+            histogram.add(value)
+        self.assertEqual([2, 1, 1, 1], histogram.counts)
+        self.assertEqual({ '<=1': 2, '<=10': 1, '<=100': 1, '>100': 1 }, histogram.summary()['buckets'])
+        self.assertEqual(500, histogram.summary()['max'])
+
+    def test_percentiles(self):
+        histogram = Histogram((1, 10, 100))
+        self.assertEqual(0, histogram.percentile(0.5))
+        for value in [2] * 19 + [50]:
+            histogram.add(value)
+        # Estimated as the upper bound of the bucket, but never more than the largest value
+        self.assertEqual(10, histogram.percentile(0.5))
+        self.assertEqual(10, histogram.percentile(0.95))
+        self.assertEqual(50, histogram.percentile(1))
+
+
+class TestDiffStats(unittest.TestCase):
+
+    def test_summary(self):
+        stats = DiffStats()
+        stats.add_request(20, False, { PHASE_TOKENIZE: 0.001, PHASE_LCS: 0.002, PHASE_FIXUP: 0.001, PHASE_TOTAL: 0.004 })
+        stats.add_request(3000, True, { PHASE_TOKENIZE: 0.01, PHASE_LCS: 0.5, PHASE_FIXUP: 0.01, PHASE_TOTAL: 0.52 })
+
+        summary = json.loads(stats.to_json())
+        self.assertEqual(2, summary['requests'])
+        self.assertEqual(1, summary['approximate'])
+        self.assertEqual(1510, summary['tokens']['mean'])
+        self.assertEqual(500, summary['latency_ms'][PHASE_LCS]['max'])
+        self.assertEqual({ '<=2.5': 1, '<=500': 1 }, summary['latency_ms'][PHASE_LCS]['buckets'])
+
+
+class TestProfiler(unittest.TestCase):
+
+    def test_dump(self):
+        profiler = Profiler()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / 'test.pstats'
+            self.assertIsNone(profiler.dump(path))
+
+            profiler.start()
+            self.assertTrue(profiler.running)
+            sorted(range(1000), key=lambda x: -x)
+            self.assertEqual(path, profiler.dump(path))
+            self.assertFalse(profiler.running)
+
+            import pstats
+            self.assertTrue(pstats.Stats(str(path)).total_calls)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,210 @@
+import re
+from html import escape
+
+# Documents that are built with plain strings rather than python-docx, for when the output only needs to be read.
+# They take the same text data as doc_utils: a run is a string or { text, bold?, red?, highlight?, size? },
+# and a paragraph or table cell is a run or a list of runs.
+
+DEFAULT_FONT = 'Calibri'
+DEFAULT_SIZE = 11           # points
+DEFAULT_SPACE_AFTER = 8     # points, the same as Word's Normal style
+
+# A Letter page with the margins (in cm) of python-docx's default template, which the Word documents are made from
+PAGE_WIDTH = 21.59
+PAGE_HEIGHT = 27.94
+MARGIN_Y = 2.54
+MARGIN_X = 3.175
+
+
+def get_runs(text_data):
+    if isinstance(text_data, list):
+        return text_data
+    return [text_data]
+
+
+def get_run_text(run_data):
+    return run_data['text'] if isinstance(run_data, dict) else str(run_data)
+
+
+class TextDoc:
+    """
+    The parts of the document are kept as a list of strings, which are only joined when it's saved.
+    Table rows can also be rendered separately (e.g. in a worker process) with render_rows() and added with add_rendered_rows().
+    """
+    suffix = ''
+
+    def __init__(self, landscape=False, my=None, mx=None):
+        self.landscape = landscape
+        self.page_width, self.page_height = (PAGE_HEIGHT, PAGE_WIDTH) if landscape else (PAGE_WIDTH, PAGE_HEIGHT)
+        self.margin_y = my or MARGIN_Y
+        self.margin_x = mx or MARGIN_X
+        self.parts = []
+
+    def add_table(self, rows, col_widths):
+        self.start_table(col_widths)
+        self.parts.append(self.render_rows(rows, col_widths))
+        self.end_table()
+
+    def add_rendered_rows(self, rendered_parts, col_widths):
+        self.start_table(col_widths)
+        for part in rendered_parts:
+            self.parts.append(part.result() if hasattr(part, 'result') else part)
+        self.end_table()
+
+    def to_bytes(self):
+        return (self.get_start() + ''.join(self.parts) + self.get_end()).encode('utf-8')
+
+
+class HtmlDoc(TextDoc):
+    suffix = '.html'
+
+    def get_start(self):
+        return ('<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n<style>\n'
+            f'@page {{ size: {self.page_width}cm {self.page_height}cm; margin: {self.margin_y}cm {self.margin_x}cm; }}\n'
+            f'body {{ font-family: {DEFAULT_FONT}, sans-serif; font-size: {DEFAULT_SIZE}pt; }}\n'
+            f'p {{ margin: 0 0 {DEFAULT_SPACE_AFTER}pt; }}\n'
+            'table { border-collapse: collapse; table-layout: fixed; }\n'
+            'td { border: 1px solid black; padding: 0 5pt; vertical-align: top; }\n'
+            '.hl { background: yellow; }\n'
+            '</style>\n</head>\n<body>\n')
+
+    def get_end(self):
+        return '</body>\n</html>\n'
+
+    def add_paragraph(self, text='', formatting={}):
+        styles = []
+        if 'space_after' in formatting:
+            styles.append(f'margin-bottom: {formatting["space_after"]}pt')
+        if formatting.get('center'):
+            styles.append('text-align: center')
+        style = f' style="{"; ".join(styles)}"' if styles else ''
+        self.parts.append(f'<p{style}>{render_html_runs(text) if text else ""}</p>\n')
+
+    def start_table(self, col_widths):
+        self.parts.append('<table>\n<colgroup>' + ''.join(f'<col style="width: {width}cm">' for width in col_widths) + '</colgroup>\n')
+
+    def end_table(self):
+        self.parts.append('</table>\n')
+
+    @staticmethod
+    def render_rows(rows, col_widths):
+        return ''.join('<tr>' + ''.join(f'<td>{render_html_runs(row_data[col_num]) if col_num < len(row_data) else ""}</td>'
+            for col_num in range(len(col_widths))) + '</tr>\n' for row_data in rows)
+
+
+def render_html_runs(text_data):
+    return ''.join(render_html_run(run_data) for run_data in get_runs(text_data))
+
+
+def render_html_run(run_data):
+    text = escape(get_run_text(run_data), quote=False).replace('\n', '<br>')
+    if not isinstance(run_data, dict):
+        return text
+    if run_data.get('bold'):
+        text = f'<b>{text}</b>'
+    styles = []
+    if run_data.get('red'):
+        styles.append('color: red')
+    if 'size' in run_data:
+        styles.append(f'font-size: {run_data["size"]}pt')
+    if styles:
+        text = f'<span style="{"; ".join(styles)}">{text}</span>'
+    if run_data.get('highlight'):
+        text = f'<span class="hl">{text}</span>'
+    return text
+
+
+TWIPS_PER_CM = 1440 / 2.54
+RTF_ESCAPE_REGEX = re.compile('[\\\\{}\n\u0080-\U0010ffff]')
+
+# The colours used by the runs, as indexes into the colour table (0 is the default colour)
+RTF_RED = 1
+RTF_YELLOW = 2
+
+class RtfDoc(TextDoc):
+    suffix = '.rtf'
+
+    def get_start(self):
+        return ('{\\rtf1\\ansi\\ansicpg1252\\deff0\\uc1'
+            f'{{\\fonttbl{{\\f0\\fswiss {DEFAULT_FONT};}}}}'
+            '{\\colortbl;\\red255\\green0\\blue0;\\red255\\green255\\blue0;}\n'
+            f'\\paperw{to_twips(self.page_width)}\\paperh{to_twips(self.page_height)}'
+            f'\\margt{to_twips(self.margin_y)}\\margb{to_twips(self.margin_y)}\\margl{to_twips(self.margin_x)}\\margr{to_twips(self.margin_x)}'
+            + ('\\landscape' if self.landscape else '') + f'\\fs{DEFAULT_SIZE * 2}\n')
+
+    def get_end(self):
+        return '}\n'
+
+    def add_paragraph(self, text='', formatting={}):
+        space_after = formatting.get('space_after', DEFAULT_SPACE_AFTER)
+        alignment = '\\qc' if formatting.get('center') else ''
+        self.parts.append(f'\\pard\\sa{space_after * 20}{alignment} {render_rtf_runs(text) if text else ""}\\par\n')
+
+    def start_table(self, col_widths):
+        pass
+
+    def end_table(self):
+        # The paragraph after a table mustn't carry on the table's settings
+        self.parts.append('\\pard\n')
+
+    @staticmethod
+    def render_rows(rows, col_widths):
+        # Each row gives the borders and the right edge of each of its cells, then the cells' text
+        border = '\\brdrs\\brdrw10'
+        cell_edges = [to_twips(sum(col_widths[:col_num + 1])) for col_num in range(len(col_widths))]
+        row_start = '\\trowd\\trgaph108' + ''.join(f'\\clbrdrt{border}\\clbrdrl{border}\\clbrdrb{border}\\clbrdrr{border}\\cellx{edge}' for edge in cell_edges) + '\n'
+        return ''.join(row_start + ''.join(f'\\pard\\intbl\\sa0 {render_rtf_runs(row_data[col_num]) if col_num < len(row_data) else ""}\\cell\n'
+            for col_num in range(len(col_widths))) + '\\row\n' for row_data in rows)
+
+
+def to_twips(cm):
+    return round(cm * TWIPS_PER_CM)
+
+
+def render_rtf_runs(text_data):
+    return ''.join(render_rtf_run(run_data) for run_data in get_runs(text_data))
+
+
+def render_rtf_run(run_data):
+    text = escape_rtf(get_run_text(run_data))
+    if not isinstance(run_data, dict):
+        return text
+    controls = ''
+    if run_data.get('bold'):
+        controls += '\\b'
+    if run_data.get('red'):
+        controls += f'\\cf{RTF_RED}'
+    if run_data.get('highlight'):
+        controls += f'\\highlight{RTF_YELLOW}'
+    if 'size' in run_data:
+        controls += f'\\fs{round(run_data["size"] * 2)}'
+    return f'{{{controls} {text}}}' if controls else text
+
+
+def escape_rtf(text):
+    # RTF is 7 bit, so anything else is written as \uN? (as UTF-16, with a ? for readers that don't understand it)
+    return RTF_ESCAPE_REGEX.sub(escape_rtf_char, text)
+
+
+def escape_rtf_char(match):
+    char = match[0]
+    if char in '\\{}':
+        return '\\' + char
+    if char == '\n':
+        return '\\line '
+    code = ord(char)
+    if code >= 0x10000:
+        code -= 0x10000
+        return escape_rtf_code(0xD800 + (code >> 10)) + escape_rtf_code(0xDC00 + (code & 0x3FF))
+    return escape_rtf_code(code)
+
+
+def escape_rtf_code(code):
+    # The numbers are signed 16 bit
+    return f'\\u{code - 0x10000 if code >= 0x8000 else code}?'
+
+
+TEXT_DOCS = {
+    'html': HtmlDoc,
+    'rtf': RtfDoc,
+}
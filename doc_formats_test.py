@@ -0,0 +1,86 @@
+import unittest
+import tempfile
+from pathlib import Path
+import doc_utils
+from doc_formats import *
+
+ROWS = [
+    [{ 'text': 'Verse', 'bold': True }, { 'text': 'English', 'bold': True }],
+    ['Ruth 1:1', [{ 'text': 'In the days ' }, { 'text': 'when', 'red': True, 'bold': True }, { 'text': ' <judges>', 'highlight': True }]],
+    ['Ruth 1:2'],
+]
+
+
+class TestHtml(unittest.TestCase):
+
+    def test_runs(self):
+        self.assertEqual('a &lt;b&gt; &amp; c', render_html_runs('a <b> & c'))
+        self.assertEqual('<span class="hl"><span style="color: red"><b>x</b></span></span>', render_html_run({ 'text': 'x', 'bold': True, 'red': True, 'highlight': True }))
+        self.assertEqual('<span style="font-size: 14pt">x</span>', render_html_run({ 'text': 'x', 'size': 14 }))
+
+    def test_table(self):
+        doc = doc_utils.create_doc(landscape=True, doc_format='html')
+        doc_utils.add_table(doc, iter(ROWS), [3, 15], caption='Table 1. Verses')
+        html = doc.to_bytes().decode('utf-8')
+        self.assertIn('<p style="margin-bottom: 0pt; text-align: center">Table 1. Verses</p>', html)
+        self.assertIn('<col style="width: 3cm"><col style="width: 15cm">', html)
+        self.assertIn('<tr><td>Ruth 1:2</td><td></td></tr>', html)
+        self.assertIn('size: 27.94cm 21.59cm', html)
+
+
+class TestRtf(unittest.TestCase):
+
+    def test_escape(self):
+        self.assertEqual('a\\{b\\}\\\\c\\line d', escape_rtf('a{b}\\c\nd'))
+        self.assertEqual('Ta\\u297?to \\u-25060?', escape_rtf('Taĩto 鸜'))
+        # Characters outside of the BMP are written as a UTF-16 surrogate pair
+        self.assertEqual('\\u-10179?\\u-8704?', escape_rtf('😀'))
+
+    def test_runs(self):
+        self.assertEqual('{\\b\\cf1\\highlight2\\fs28 x}', render_rtf_run({ 'text': 'x', 'bold': True, 'red': True, 'highlight': True, 'size': 14 }))
+        self.assertEqual('x', render_rtf_run({ 'text': 'x' }))
+
+    def test_table(self):
+        doc = doc_utils.create_doc(doc_format='rtf', my=2, mx=1.5)
+        doc_utils.add_paragraph(doc, { 'text': 'Esther 1', 'bold': True, 'size': 14 })
+        doc_utils.add_table(doc, ROWS, [3, 15])
+        rtf = doc.to_bytes().decode('ascii')
+        self.assertTrue(rtf.startswith('{\\rtf1') and rtf.endswith('}\n'))
+        self.assertEqual(rtf.count('{'), rtf.count('}'))
+        self.assertIn('\\paperw12240\\paperh15840\\margt1134', rtf)
+        self.assertEqual(3, rtf.count('\\row'))
+        self.assertEqual(6, rtf.count('\\cell\n'))
+        self.assertIn('\\cellx1701', rtf)
+        self.assertIn('\\cellx10205', rtf)
+
+
+class TestDocUtils(unittest.TestCase):
+
+    def test_rendered_rows(self):
+        # Rows rendered separately (e.g. in a worker process) make the same document as adding them all at once
+        for doc_format in TEXT_DOCS:
+            doc = doc_utils.create_doc(doc_format=doc_format)
+            doc_utils.add_table(doc, ROWS, [3, 15])
+            rendered_doc = doc_utils.create_doc(doc_format=doc_format)
+            rendered_parts = [doc_utils.render_table_rows(ROWS[:1], [3, 15], doc_format), doc_utils.render_table_rows(ROWS[1:], [3, 15], doc_format)]
+            doc_utils.add_rendered_table(rendered_doc, rendered_parts, [3, 15])
+            self.assertEqual(doc.to_bytes(), rendered_doc.to_bytes())
+
+    def test_save(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / f'Ruth 1{doc_utils.get_format_suffix("html")}'
+            doc = doc_utils.create_doc(doc_format='html')
+            doc_utils.add_paragraph(doc, 'In the days when the judges ruled')
+            self.assertEqual(path, doc_utils.save_document(doc, path))
+            self.assertIn('<p>In the days when the judges ruled</p>', path.read_text(encoding='utf-8'))
+
+    def test_parse_format(self):
+        self.assertEqual('html', doc_utils.parse_format_arg('HTML'))
+        self.assertEqual('rtf', doc_utils.parse_format_arg('.rtf'))
+        self.assertEqual('docx', doc_utils.parse_format_arg('docx'))
+        self.assertIsNone(doc_utils.parse_format_arg('pdf'))
+        self.assertEqual('.docx', doc_utils.get_format_suffix('docx'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,12 +1,68 @@
 from docx import Document
 from docx.enum.section import WD_ORIENT
 from docx.enum.text import WD_ALIGN_PARAGRAPH, WD_COLOR_INDEX
+from docx.oxml import parse_xml
 from docx.shared import Cm, Pt, RGBColor
+from lxml import etree
 import datetime
+import importlib.resources
+import io
+import os
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
 
+from doc_formats import TEXT_DOCS, TextDoc
 
-def create_doc(landscape=False, my=None, mx=None):
-    doc = Document()
+# Output formats. A Word document is made by default, and the others are much quicker to make when the output only needs to be read.
+FORMAT_DOCX = 'docx'
+FORMATS = [FORMAT_DOCX, *TEXT_DOCS]
+
+
+_template_bytes = None
+def load_template():
+    # Read the default template once, so processes that create many documents don't keep going back to disk
+    global _template_bytes
+    if _template_bytes is None:
+        # The same template that docx.Document() uses, which python-docx ships with the package
+        _template_bytes = (importlib.resources.files('docx') / 'templates' / 'default.docx').read_bytes()
+    return _template_bytes
+
+
+def parse_format_arg(text):
+    """
+    e.g. 'docx', 'html' or 'rtf'. Returns None if the text isn't one of those.
+    """
+    text = text.lower().lstrip('.')
+    return text if text in FORMATS else None
+
+
+def get_format_suffix(doc_format):
+    return TEXT_DOCS[doc_format].suffix if doc_format in TEXT_DOCS else '.docx'
+
+
+# Set to a number of seconds since 1970 (like reproducible builds do) to give Word documents a fixed time,
+# so the same text always makes exactly the same document
+FIXED_TIME_ENV = 'SOURCE_DATE_EPOCH'
+
+def get_fixed_time():
+    """
+    Returns the fixed time to use for documents, or None if they should have the current time.
+    It comes from the environment so that worker processes use it as well.
+    """
+    seconds = os.environ.get(FIXED_TIME_ENV)
+    if not seconds:
+        return None
+    return datetime.datetime.fromtimestamp(int(seconds), tz=datetime.timezone.utc).replace(tzinfo=None)
+
+
+def create_doc(landscape=False, my=None, mx=None, doc_format=FORMAT_DOCX):
+    if doc_format in TEXT_DOCS:
+        return TEXT_DOCS[doc_format](landscape, my, mx)
+
+    doc = Document(io.BytesIO(load_template()))
     doc.styles['Normal'].font.name = 'Calibri (Body)'
 
     section = doc.sections[-1]
@@ -24,9 +80,10 @@ def create_doc(landscape=False, my=None, mx=None):
         section.left_margin = Cm(mx)
         section.right_margin = Cm(mx)
     
+    doc_time = get_fixed_time() or datetime.datetime.today()
     doc.core_properties.author = 'TBTA'
-    doc.core_properties.created = datetime.datetime.today()
-    doc.core_properties.modified = datetime.datetime.today()
+    doc.core_properties.created = doc_time
+    doc.core_properties.modified = doc_time
     return doc
 
 
@@ -55,6 +112,10 @@ def format_paragraph(paragraph, text_data):
 
 
 def add_paragraph(doc, text='', formatting={}):
+    if isinstance(doc, TextDoc):
+        doc.add_paragraph(text, formatting)
+        return None
+
     paragraph = doc.add_paragraph()
     if text:
         format_paragraph(paragraph, text)
@@ -66,14 +127,25 @@ def add_paragraph(doc, text='', formatting={}):
 
 
 def add_table(doc, rows, col_widths, caption=None):
-    if not len(rows):
+    # rows can be any iterable (including a generator), so check for the first row rather than the length
+    rows = iter(rows)
+    first_row = next(rows, None)
+    if first_row is None:
         return None
     
     if caption:
         add_paragraph(doc, caption, formatting={ 'center': True, 'space_after': 0 })
 
+    if isinstance(doc, TextDoc):
+        doc.add_table(chain([first_row], rows), col_widths)
+        return None
+
     table = doc.add_table(rows=0, cols=len(col_widths), style='Table Grid')
+    add_rows(table, chain([first_row], rows), col_widths)
+    return table
+
 
+def add_rows(table, rows, col_widths):
     for row_data in rows:
         # Note: this is MUCH faster than accessing the row cells each time within the cell loop
         row_cells = table.add_row().cells
@@ -86,4 +158,265 @@ def add_table(doc, rows, col_widths, caption=None):
             # Each cell needs its width set individually for some reason
             cell.width = Cm(col_width)
 
-    return table
\ No newline at end of file
+
+def render_table_rows(rows, col_widths, doc_format=FORMAT_DOCX):
+    """
+    Build the table rows in a scratch document and return the table XML (or the rows' text for the other formats).
+    This can be run in a worker process, with the result passed to add_rendered_table().
+    """
+    if doc_format in TEXT_DOCS:
+        return TEXT_DOCS[doc_format].render_rows(rows, col_widths)
+
+    doc = create_doc()
+    table = doc.add_table(rows=0, cols=len(col_widths), style='Table Grid')
+    add_rows(table, rows, col_widths)
+    return etree.tostring(table._tbl)
+
+
+def add_rendered_table(doc, rendered_parts, col_widths, caption=None):
+    """
+    Same as add_table(), but the rows come from the XML returned by render_table_rows().
+    The parts are added in order, and can be futures if they are still being rendered.
+    The resulting document is identical to the one add_table() would make with all the rows.
+    """
+    if caption:
+        add_paragraph(doc, caption, formatting={ 'center': True, 'space_after': 0 })
+
+    if isinstance(doc, TextDoc):
+        doc.add_rendered_rows(rendered_parts, col_widths)
+        return None
+
+    table = doc.add_table(rows=0, cols=len(col_widths), style='Table Grid')
+    for part in rendered_parts:
+        if hasattr(part, 'result'):
+            part = part.result()
+        for row in parse_xml(part).tr_lst:
+            table._tbl.append(row)
+
+    return table
+
+
+SAVE_RETRIES = 5
+SAVE_RETRY_DELAY = 2    # seconds
+
+_save_retries = SAVE_RETRIES
+_save_retry_delay = SAVE_RETRY_DELAY
+def set_save_retries(retries, retry_delay=SAVE_RETRY_DELAY):
+    """
+    Change how save_document() retries for the rest of this process, for callers that don't give their own.
+    """
+    global _save_retries, _save_retry_delay
+    _save_retries, _save_retry_delay = retries, retry_delay
+
+
+def init_save_worker():
+    # Worker processes save with another name straight away, since waiting would hold up all the other work queued for them
+    set_save_retries(0)
+
+
+def save_document(doc, path, retries=None, retry_delay=None):
+    """
+    Save the document, and return the path it was saved to.
+    The document is built into memory first, then written to a temporary file next to the output
+    and moved into place, so the output is never left half written.
+    If the output is open in Word, the save is retried a few times in case it gets closed (see set_save_retries()),
+    and then the document is saved with another name, so the work of building it isn't lost.
+    Raises PermissionError only if that fails as well.
+    """
+    retries = _save_retries if retries is None else retries
+    retry_delay = _save_retry_delay if retry_delay is None else retry_delay
+    if isinstance(doc, TextDoc):
+        data = doc.to_bytes()
+    else:
+        buffer = io.BytesIO()
+        doc.save(buffer)
+        data = buffer.getvalue()
+        fixed_time = get_fixed_time()
+        if fixed_time:
+            data = set_zip_times(data, fixed_time)
+
+    for attempt in range(retries + 1):
+        try:
+            write_file(data, path)
+            return path
+        except PermissionError:
+            if attempt == 0:
+                print(f'"{path.name}" is currently open. Please close it...')
+            if attempt < retries:
+                time.sleep(retry_delay)
+
+    alternate_path = get_alternate_path(path)
+    write_file(data, alternate_path)
+    print(f'"{path.name}" is still open, so the document was saved as "{alternate_path.name}" instead')
+    return alternate_path
+
+
+def set_zip_times(data, date_time):
+    """
+    A .docx is a zip file, and each file in it has the time it was added. Set them all to the given time instead.
+    """
+    # Zip files can't have times before 1980
+    date_time = max(date_time, datetime.datetime(1980, 1, 1)).timetuple()[:6]
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(data)) as source, zipfile.ZipFile(buffer, 'w') as target:
+        for info in source.infolist():
+            fixed_info = zipfile.ZipInfo(info.filename, date_time)
+            fixed_info.compress_type = info.compress_type
+            fixed_info.external_attr = info.external_attr
+            target.writestr(fixed_info, source.read(info))
+    return buffer.getvalue()
+
+
+def write_file(data, path):
+    temp_path = path.with_name(f'~{path.stem}.{os.getpid()}.tmp')
+    try:
+        temp_path.write_bytes(data)
+        os.replace(temp_path, path)
+    finally:
+        if temp_path.exists():
+            temp_path.unlink()
+
+
+def get_alternate_path(path):
+    # e.g. "Ruth 1.docx" -> "Ruth 1 (2).docx"
+    num = 2
+    while path.with_name(f'{path.stem} ({num}){path.suffix}').exists():
+        num += 1
+    return path.with_name(f'{path.stem} ({num}){path.suffix}')
+
+
+# Ways to split a large export into parts. A number means a number of rows (or paragraphs) per part.
+PARTS_CHAPTER = 'chapter'
+PARTS_BOOK = 'book'
+
+def parse_parts_arg(text):
+    """
+    e.g. 'chapter', 'book', or '500'. Returns None if the text isn't one of those.
+    """
+    text = text.lower()
+    if text in (PARTS_CHAPTER, PARTS_BOOK):
+        return text
+    if text.isdigit() and int(text) > 0:
+        return int(text)
+    return None
+
+
+def get_part_key(ref, parts):
+    # The reference is in the format {book} {chapter}:{verse}(:{sentence})
+    book, _, numbers = ref.rpartition(' ')
+    if parts == PARTS_BOOK:
+        return book
+    if parts == PARTS_CHAPTER:
+        return (book, numbers.split(':')[0])
+    return None
+
+
+def split_parts(items, parts, get_ref, get_size=lambda item: 1):
+    """
+    Yields lists of the items, split by chapter, by book, or by the number of rows given by parts.
+    get_ref(item) gives the verse reference of each item, or None if it doesn't have one. Those items
+    (e.g. headings) are kept with the next item that has a reference, so they start the right part.
+    Parts are only split between items, so a part can go over the number of rows.
+    """
+    part, part_key, part_size = [], None, 0
+    waiting = []
+    for item in items:
+        ref = get_ref(item)
+        if ref is None:
+            waiting.append(item)
+            continue
+
+        key = get_part_key(ref, parts)
+        size = sum(get_size(waiting_item) for waiting_item in waiting) + get_size(item)
+        if isinstance(parts, int):
+            is_new_part = part_size + size > parts
+        else:
+            is_new_part = key != part_key
+        if part and is_new_part:
+            yield part
+            part, part_size = [], 0
+
+        part.extend(waiting)
+        part.append(item)
+        waiting = []
+        part_key = key
+        part_size += size
+
+    part.extend(waiting)
+    if part:
+        yield part
+
+
+def get_part_path(path, part_num):
+    # e.g. "Ruth.docx" -> "Ruth - part 1.docx"
+    return path.with_name(f'{path.stem} - part {part_num}{path.suffix}')
+
+
+def get_index_path(path):
+    # e.g. "Ruth.docx" -> "Ruth.docx.index", which isn't a .txt file so it isn't taken for a TBTA export
+    return path.with_name(f'{path.name}.index')
+
+
+def get_part_paths(path):
+    """
+    The index and the parts it lists, from the last time the document was split into parts.
+    Returns [] if there is no index, or if any part had to be saved with another name (since then the part with
+    the usual name is out of date).
+    """
+    index_path = get_index_path(path)
+    if not index_path.exists():
+        return []
+    part_names = [line.partition(': ')[0] for line in index_path.read_text(encoding='utf-8').splitlines() if line]
+    part_paths = [path.with_name(name) for name in part_names]
+    if part_paths != [get_part_path(path, part_num) for part_num in range(1, len(part_paths) + 1)]:
+        return []
+    return [index_path, *part_paths]
+
+
+def export_parts(parts, path, export_part, get_ref):
+    """
+    Save each part as its own document, in worker processes, plus an index of the verses in each part.
+    export_part(items, part_path) is run in a worker, and returns the path it saved to, or None if it failed.
+    Returns True if every part was saved.
+    """
+    index = []
+    success = True
+    part_count = 0
+    max_pending = 2 * (os.cpu_count() or 1)
+    with ProcessPoolExecutor(initializer=init_save_worker) as executor:
+        pending = deque()
+        for part_num, items in enumerate(parts, start=1):
+            part_count = part_num
+            refs = [ref for ref in map(get_ref, items) if ref]
+            pending.append((executor.submit(export_part, items, get_part_path(path, part_num)), refs[:1] + refs[-1:]))
+            if len(pending) >= max_pending:
+                success &= add_part_index(index, *pending.popleft())
+
+        while pending:
+            success &= add_part_index(index, *pending.popleft())
+
+    remove_old_parts(path, part_count)
+    index_path = get_index_path(path)
+    write_file(''.join(f'{part_name}: {refs}\n' for part_name, refs in index).encode('utf-8'), index_path)
+    print(f'Saved {len(index)} parts, listed in "{index_path}"')
+    return success
+
+
+def remove_old_parts(path, part_count):
+    # An earlier export might have had more parts, which would otherwise look like they belong to this one
+    part_num = part_count + 1
+    while (part_path := get_part_path(path, part_num)).exists():
+        try:
+            part_path.unlink()
+            print(f'Deleted "{part_path.name}" from an earlier export')
+        except PermissionError:
+            print(f'Unable to delete "{part_path.name}" from an earlier export, since it is open')
+        part_num += 1
+
+
+def add_part_index(index, future, refs):
+    part_path = future.result()
+    if not part_path:
+        return False
+    index.append((part_path.name, ' - '.join(dict.fromkeys(refs))))
+    return True
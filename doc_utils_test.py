@@ -0,0 +1,128 @@
+import unittest
+import os
+import tempfile
+import zipfile
+from pathlib import Path
+from unittest import mock
+import doc_utils
+
+
+class TestSaveDocument(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.temp_dir.name) / 'Ruth 1.docx'
+        self.doc = doc_utils.create_doc()
+        doc_utils.add_paragraph(self.doc, 'In the days when the judges ruled')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def lock(self, locked_paths, close_after_first_try=False):
+        # Act like Word has the files open, so they can't be replaced
+        locked_paths = set(locked_paths)
+        real_replace = os.replace
+        def replace(src, dst):
+            if Path(dst) in locked_paths:
+                if close_after_first_try:
+                    locked_paths.remove(Path(dst))
+                raise PermissionError(dst)
+            real_replace(src, dst)
+        return mock.patch('doc_utils.os.replace', side_effect=replace)
+
+    def test_save(self):
+        self.assertEqual(self.path, doc_utils.save_document(self.doc, self.path))
+        with zipfile.ZipFile(self.path) as docx:
+            self.assertIn(b'judges', docx.read('word/document.xml'))
+        # Only the document is left
+        self.assertEqual([self.path], list(self.path.parent.iterdir()))
+
+    def test_retry(self):
+        # The file gets closed after the first try
+        with self.lock([self.path], close_after_first_try=True):
+            saved_path = doc_utils.save_document(self.doc, self.path, retry_delay=0)
+        self.assertEqual(self.path, saved_path)
+        self.assertTrue(self.path.exists())
+
+    def test_alternate_name(self):
+        self.path.write_bytes(b'old')
+        (self.path.parent / 'Ruth 1 (2).docx').write_bytes(b'old')
+        with self.lock([self.path]):
+            saved_path = doc_utils.save_document(self.doc, self.path, retries=2, retry_delay=0)
+
+        self.assertEqual(self.path.parent / 'Ruth 1 (3).docx', saved_path)
+        self.assertTrue(zipfile.is_zipfile(saved_path))
+        # The locked file wasn't touched, and no temporary files are left
+        self.assertEqual(b'old', self.path.read_bytes())
+        self.assertEqual(3, len(list(self.path.parent.iterdir())))
+
+    def test_worker(self):
+        # Workers don't wait for the file to be closed
+        self.addCleanup(doc_utils.set_save_retries, doc_utils.SAVE_RETRIES)
+        doc_utils.init_save_worker()
+        with self.lock([self.path]), mock.patch('doc_utils.time.sleep') as sleep:
+            saved_path = doc_utils.save_document(self.doc, self.path)
+        sleep.assert_not_called()
+        self.assertEqual(self.path.parent / 'Ruth 1 (2).docx', saved_path)
+
+    def test_still_locked(self):
+        alternate_path = self.path.parent / 'Ruth 1 (2).docx'
+        with self.lock([self.path, alternate_path]):
+            with self.assertRaises(PermissionError):
+                doc_utils.save_document(self.doc, self.path, retries=0)
+        self.assertEqual([], list(self.path.parent.iterdir()))
+
+
+class TestPartPaths(unittest.TestCase):
+
+    def test_part_paths(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / 'Ruth.docx'
+            self.assertEqual([], doc_utils.get_part_paths(path))
+
+            index_path = doc_utils.get_index_path(path)
+            index_path.write_text('Ruth - part 1.docx: Ruth 1:1 - Ruth 1:22\nRuth - part 2.docx: Ruth 2:1 - Ruth 2:23\n', encoding='utf-8')
+            self.assertEqual([index_path, path.with_name('Ruth - part 1.docx'), path.with_name('Ruth - part 2.docx')], doc_utils.get_part_paths(path))
+
+            # A part that was open and saved with another name means the parts are out of date
+            index_path.write_text('Ruth - part 1.docx: Ruth 1:1 - Ruth 1:22\nRuth - part 2 (2).docx: Ruth 2:1 - Ruth 2:23\n', encoding='utf-8')
+            self.assertEqual([], doc_utils.get_part_paths(path))
+
+
+class TestSplitParts(unittest.TestCase):
+
+    ITEMS = [None, 'Ruth 1:1', 'Ruth 1:2', None, 'Ruth 2:1', 'Ruth 2:2', 'Esther 1:1', None]
+
+    def split(self, parts):
+        return list(doc_utils.split_parts(self.ITEMS, parts, get_ref=lambda item: item))
+
+    def test_chapter(self):
+        # The items without a reference (headings) go with the next verse
+        self.assertEqual([
+            [None, 'Ruth 1:1', 'Ruth 1:2'],
+            [None, 'Ruth 2:1', 'Ruth 2:2'],
+            ['Esther 1:1', None],
+        ], self.split(doc_utils.PARTS_CHAPTER))
+
+    def test_book(self):
+        self.assertEqual([
+            [None, 'Ruth 1:1', 'Ruth 1:2', None, 'Ruth 2:1', 'Ruth 2:2'],
+            ['Esther 1:1', None],
+        ], self.split(doc_utils.PARTS_BOOK))
+
+    def test_rows(self):
+        self.assertEqual([
+            [None, 'Ruth 1:1', 'Ruth 1:2'],
+            [None, 'Ruth 2:1', 'Ruth 2:2'],
+            ['Esther 1:1', None],
+        ], self.split(3))
+
+    def test_parse(self):
+        self.assertEqual(doc_utils.PARTS_CHAPTER, doc_utils.parse_parts_arg('Chapter'))
+        self.assertEqual(500, doc_utils.parse_parts_arg('500'))
+        self.assertIsNone(doc_utils.parse_parts_arg('0'))
+        self.assertIsNone(doc_utils.parse_parts_arg('verse'))
+
+
+if __name__ == '__main__':
+    unittest.main()
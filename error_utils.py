@@ -0,0 +1,27 @@
+import os
+from contextlib import contextmanager
+
+# When this is set, errors are only printed. The export server and watcher run the scripts where nobody would see a
+# message box, and it would block the worker until someone closed it. It's an environment variable so worker processes
+# started by the scripts themselves (e.g. for --parts) inherit it.
+NO_DIALOGS_ENV = 'TBTA_NO_DIALOGS'
+
+
+def show_error_dialog(text, title='Error Creating Word Document'):
+    if os.environ.get(NO_DIALOGS_ENV):
+        return
+    import ctypes
+    ctypes.windll.user32.MessageBoxW(0, text, title, 0 + 16)
+
+
+@contextmanager
+def no_dialogs():
+    old_value = os.environ.get(NO_DIALOGS_ENV)
+    os.environ[NO_DIALOGS_ENV] = '1'
+    try:
+        yield
+    finally:
+        if old_value is None:
+            del os.environ[NO_DIALOGS_ENV]
+        else:
+            os.environ[NO_DIALOGS_ENV] = old_value
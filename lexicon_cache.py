@@ -0,0 +1,79 @@
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import NamedTuple, Iterable
+
+CACHE_FILE_NAME = 'Lexicon Cache.sqlite3'
+
+
+class CachedConcept(NamedTuple):
+    category: str
+    word: str
+    gloss: str
+    verse_ref: str|None
+    verse_text: str|None
+    sample: str|None
+    targets: str|None
+    document: str|None = None   # the document the concept was first exported to
+
+
+class LexiconCache:
+    """
+    A record of the unlinked concepts that have already been exported, kept in a sqlite database
+    so that later exports of the same project can skip them or build one lexicon for the whole project.
+    Concepts are looked up by (category, word), which is the primary key, so lookups stay fast as the cache grows.
+    """
+    def __init__(self, path: Path):
+        self.path = path
+        self.connection = sqlite3.connect(str(path))
+        self.connection.execute('''
+            CREATE TABLE IF NOT EXISTS concepts (
+                category TEXT NOT NULL,
+                word TEXT NOT NULL,
+                gloss TEXT NOT NULL,
+                verse_ref TEXT,
+                verse_text TEXT,
+                sample TEXT,
+                targets TEXT,
+                document TEXT,
+                first_exported TEXT NOT NULL,
+                last_exported TEXT NOT NULL,
+                PRIMARY KEY (category, word)
+            )''')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.connection.commit()
+        self.connection.close()
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM concepts').fetchone()[0]
+
+    def contains(self, category: str, word: str):
+        cursor = self.connection.execute('SELECT 1 FROM concepts WHERE category = ? AND word = ?', (category, word))
+        return cursor.fetchone() is not None
+
+    def add(self, concepts: Iterable[CachedConcept]):
+        """
+        Record the concepts as exported. Concepts that are already in the cache keep the document
+        they were first exported to, but pick up any target words that weren't known before.
+        """
+        now = datetime.now().isoformat(timespec='seconds')
+        self.connection.executemany('''
+            INSERT INTO concepts (category, word, gloss, verse_ref, verse_text, sample, targets, document, first_exported, last_exported)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (category, word) DO UPDATE SET
+                targets = COALESCE(excluded.targets, targets),
+                sample = COALESCE(sample, excluded.sample),
+                last_exported = excluded.last_exported
+            ''', ((*concept, now, now) for concept in concepts))
+        self.connection.commit()
+
+    def get_all(self):
+        cursor = self.connection.execute('''
+            SELECT category, word, gloss, verse_ref, verse_text, sample, targets, document
+            FROM concepts ORDER BY category, word COLLATE NOCASE, word''')
+        return (CachedConcept(*row) for row in cursor)
@@ -0,0 +1,63 @@
+import unittest
+import tempfile
+from pathlib import Path
+from lexicon_cache import *
+
+
+def make_concept(word, category='Noun', targets=None, document='Lexicon - Esther 1.docx'):
+    return CachedConcept(category, word, 'a gloss', 'Esther 1:1', 'The king gave a banquet.', None, targets, document)
+
+
+class TestLexiconCache(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.temp_dir.name) / CACHE_FILE_NAME
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_add(self):
+        with LexiconCache(self.path) as cache:
+            cache.add([make_concept('king-A'), make_concept('banquet-A')])
+
+        # The cache is still there the next time
+        with LexiconCache(self.path) as cache:
+            self.assertEqual(2, len(cache))
+            self.assertTrue(cache.contains('Noun', 'king-A'))
+            self.assertFalse(cache.contains('Verb', 'king-A'))
+            self.assertFalse(cache.contains('Noun', 'queen-A'))
+
+    def test_add_again(self):
+        with LexiconCache(self.path) as cache:
+            cache.add([make_concept('king-A')])
+            cache.add([make_concept('king-A', targets='mfalme', document='Lexicon - Esther 2.docx')])
+            cache.add([make_concept('king-A', targets=None, document='Lexicon - Esther 3.docx')])
+            [concept] = list(cache.get_all())
+
+        # The first document is kept, and the target words aren't lost
+        self.assertEqual('Lexicon - Esther 1.docx', concept.document)
+        self.assertEqual('mfalme', concept.targets)
+
+    def test_get_all_order(self):
+        with LexiconCache(self.path) as cache:
+            cache.add([make_concept('king-A'), make_concept('Banquet-A'), make_concept('angry-A', category='Adjective')])
+            concepts = list(cache.get_all())
+
+        self.assertEqual([('Adjective', 'angry-A'), ('Noun', 'Banquet-A'), ('Noun', 'king-A')], [(c.category, c.word) for c in concepts])
+
+    def test_many_concepts(self):
+        words = [f'word{i}-A' for i in range(20000)]
+        with LexiconCache(self.path) as cache:
+            cache.add(make_concept(word) for word in words)
+            found = sum(cache.contains('Noun', word) for word in words)
+            # Each lookup uses the primary key's index rather than scanning the table, so it stays fast as the cache grows
+            plan = ' '.join(row[-1] for row in cache.connection.execute('EXPLAIN QUERY PLAN SELECT 1 FROM concepts WHERE category = ? AND word = ?', ('Noun', words[0])))
+
+        self.assertEqual(len(words), found)
+        self.assertIn('SEARCH', plan)
+        self.assertNotIn('SCAN', plan)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,161 @@
+import os
+import re
+import json
+import unittest
+import tempfile
+import tracemalloc
+from pathlib import Path
+from typing import NamedTuple
+
+import tbta_export_to_word
+import tbta_export_to_table
+import tbta_missing_concepts_to_word
+import tbta_analyze_edits
+
+# The peak memory of each stage is checked against the budgets in this file.
+# To record new budgets (e.g. after making something use less memory), run with RECORD_MEMORY_BUDGETS=1
+BUDGETS_PATH = Path('./test_docs/memory_budgets.json')
+RECORD_BUDGETS = bool(os.environ.get('RECORD_MEMORY_BUDGETS'))
+HEADROOM = 1.25     # budgets are recorded with some room to spare, since python versions allocate a bit differently
+
+COPIES = 5          # how many times each test document is repeated, to make it more like a whole book
+TRACE_FRAMES = 5
+TOP_SITES = 8
+
+
+class StageMemory(NamedTuple):
+    stage: str
+    peak: int
+    top_sites: list[str]
+
+
+def measure(stage, func, *args):
+    """
+    Run the function under tracemalloc. Returns (result, StageMemory).
+    The top sites are where the memory that is still held at the end of the stage was allocated.
+    """
+    tracemalloc.start(TRACE_FRAMES)
+    try:
+        result = func(*args)
+        _, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+        ])
+    finally:
+        tracemalloc.stop()
+
+    top_sites = [f'{stat.size / 1024:.0f} KiB in {stat.count} blocks: {stat.traceback[0]}' for stat in snapshot.statistics('lineno')[:TOP_SITES]]
+    return result, StageMemory(stage, peak, top_sites)
+
+
+def repeat_text(path: Path, copies: int, encoding='utf-8-sig'):
+    text = path.read_text(encoding=encoding)
+    return '\n'.join(text for _ in range(copies))
+
+
+def repeat_concepts(path: Path, copies: int):
+    # Each copy gets its own words, otherwise they would all be merged into the same rows
+    text = path.read_text(encoding='utf-8-sig')
+    return '\n'.join(re.sub(r'^(Concept \(\w+\): [^-\n]+)-', lambda m: f'{m[1]}{copy}-', text, flags=re.MULTILINE) if copy else text
+        for copy in range(copies))
+
+
+def repeat_chapters(path: Path, copies: int):
+    # Each copy gets its own chapter numbers, otherwise the verses would replace each other
+    text = path.read_text(encoding='utf-8-sig')
+    return '\n'.join(re.sub(r'^\\c (\d+)', lambda m: f'\\c {int(m[1]) + copy * 1000}', text, flags=re.MULTILINE)
+        for copy in range(copies))
+
+
+class TestMeasure(unittest.TestCase):
+
+    def test_peak(self):
+        # The peak includes memory that was freed again before the end
+        def allocate():
+            data = bytearray(4 * 2**20)
+            return len(data)
+
+        result, memory = measure('allocate', allocate)
+        self.assertEqual(4 * 2**20, result)
+        self.assertGreaterEqual(memory.peak, 4 * 2**20)
+        self.assertFalse(tracemalloc.is_tracing())
+
+
+class TestMemoryBudgets(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.budgets = json.loads(BUDGETS_PATH.read_text(encoding='utf-8')) if BUDGETS_PATH.exists() else {}
+        cls.measured = {}
+        cls.temp_dir = tempfile.TemporaryDirectory()
+        cls.folder = Path(cls.temp_dir.name)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.temp_dir.cleanup()
+        if RECORD_BUDGETS:
+            budgets = { **cls.budgets, **{ stage: int(peak * HEADROOM) for stage, peak in cls.measured.items() } }
+            BUDGETS_PATH.write_text(json.dumps(dict(sorted(budgets.items())), indent=2) + '\n', encoding='utf-8')
+
+        print('\nPeak memory for each stage:')
+        for stage, peak in cls.measured.items():
+            budget = cls.budgets.get(stage)
+            print(f'  {stage}: {peak / 2**20:.1f} MiB' + (f' (budget {budget / 2**20:.1f} MiB)' if budget else ''))
+
+    def write_input(self, name, text):
+        path = self.folder / name
+        path.write_text(text, encoding='utf-8')
+        return path
+
+    def run_stage(self, stage, func, *args):
+        result, memory = measure(stage, func, *args)
+        self.measured[stage] = memory.peak
+
+        budget = self.budgets.get(stage)
+        if not RECORD_BUDGETS:
+            self.assertIsNotNone(budget, f'No memory budget for "{stage}". Run with RECORD_MEMORY_BUDGETS=1 to record one.')
+            self.assertLessEqual(memory.peak, budget,
+                f'"{stage}" used {memory.peak / 2**20:.1f} MiB at its peak, over its budget of {budget / 2**20:.1f} MiB.\n'
+                'Memory still held at the end was allocated at:\n  ' + '\n  '.join(memory.top_sites))
+        return result
+
+    def test_export_table(self):
+        input_path = self.write_input('Ibwe Differences.txt', repeat_text(Path('./test_docs/export_to_word/Ibwe Differences.txt'), COPIES))
+        params = tbta_export_to_table.get_params(['tbta_export_to_table', '-c', '-s', '-t', str(input_path)])
+
+        def import_stage():
+            verses, language_names = tbta_export_to_table.import_text(params[tbta_export_to_table.PARAM_INPUT_PATH])
+            return list(tbta_export_to_table.split_verse_sentences(verses)), language_names
+
+        verses, language_names = self.run_stage('table: import_text', import_stage)
+        success = self.run_stage('table: export_table', tbta_export_to_table.export_table, verses, language_names, params)
+        self.assertTrue(success)
+
+    def test_export_concepts(self):
+        input_path = self.write_input('Esther 1 Issues.txt', repeat_concepts(Path('./test_docs/missing_concepts_to_word/Esther 1 Issues.txt'), COPIES))
+        params = tbta_missing_concepts_to_word.get_params(['tbta_missing_concepts_to_word', '-t', str(input_path)])
+
+        categories = self.run_stage('concepts: import_concepts', tbta_missing_concepts_to_word.import_concepts, params)
+        success = self.run_stage('concepts: export_document', tbta_missing_concepts_to_word.export_document, categories, params)
+        self.assertTrue(success)
+
+    def test_analyze_edits(self):
+        old_path = self.write_input('old.SFM', repeat_chapters(Path('./test_docs/analyze_edits/41MATATW_Ibwe 1-4.SFM.BAK'), COPIES))
+        new_path = self.write_input('new.SFM', repeat_chapters(Path('./test_docs/analyze_edits/41MATATW_Ibwe 1-4.SFM'), COPIES))
+
+        old_verses = self.run_stage('analyze_edits: import_verses_from_paratext', tbta_analyze_edits.import_verses_from_paratext, old_path)
+        new_verses = tbta_analyze_edits.import_verses_from_paratext(new_path)
+        diffs = self.run_stage('analyze_edits: compare_verses', tbta_analyze_edits.compare_verses, old_verses, new_verses)
+        self.assertTrue(diffs)
+
+    def test_export_text(self):
+        input_path = self.write_input('Genesis.txt', repeat_text(Path('./test_docs/export_to_word/Genesis 25-27 - Gichuka.txt'), COPIES))
+        params = tbta_export_to_word.get_file_params(input_path, is_test=True)
+
+        error = self.run_stage('word: export_text', tbta_export_to_word.export_text, params)
+        self.assertIsNone(error)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import os
+import sys
+import json
+import hashlib
+from pathlib import Path
+from typing import NamedTuple
+
+import doc_utils
+
+# TBTA often exports exactly the same text again. A memo file next to the output records what it was made from,
+# so the next export of the same text with the same options can skip making it again.
+MEMO_SUFFIX = '.memo'
+HASH_CHUNK_SIZE = 2**20
+
+
+class Memo(NamedTuple):
+    path: Path      # the memo file, e.g. "Ruth 1.docx.memo"
+    key: str        # a hash of the input files, the options, and the version of the code
+
+
+_code_version = None
+def get_code_version():
+    """
+    A hash of the code that makes the outputs, so that a new version of the scripts makes them again.
+    For an executable that's its size and time, and otherwise it's the source of every script in this folder (apart from
+    the tests), so it is the same however the script was started, whichever modules it happens to have loaded.
+    """
+    global _code_version
+    if _code_version is None:
+        if getattr(sys, 'frozen', False):
+            stat = Path(sys.executable).stat()
+            _code_version = f'{stat.st_size}-{stat.st_mtime_ns}'
+        else:
+            folder = Path(__file__).resolve().parent
+            code_hash = hashlib.sha256()
+            for path in sorted(folder.glob('*.py')):
+                if not path.stem.endswith('_test'):
+                    code_hash.update(path.name.encode('utf-8'))
+                    code_hash.update(path.read_bytes())
+            _code_version = code_hash.hexdigest()
+    return _code_version
+
+
+def get_memo(output_path: Path, input_paths: list[Path], options: dict):
+    """
+    The options are everything (apart from the input files) that changes what the output looks like, e.g. the script name and its flags.
+    """
+    key_hash = hashlib.sha256()
+    key_hash.update(get_code_version().encode('utf-8'))
+    key_hash.update(json.dumps(options, sort_keys=True, default=str).encode('utf-8'))
+    for input_path in input_paths:
+        with input_path.open('rb') as file:
+            while chunk := file.read(HASH_CHUNK_SIZE):
+                key_hash.update(chunk)
+    return Memo(output_path.with_name(output_path.name + MEMO_SUFFIX), key_hash.hexdigest())
+
+
+def find_unchanged(memo: Memo):
+    """
+    If the outputs were made from the same inputs with the same options, and they are all still there, touch them
+    (so they look as new as the input) and return their paths. Otherwise returns None.
+    """
+    try:
+        record = json.loads(memo.path.read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return None
+    if record.get('key') != memo.key:
+        return None
+
+    output_paths = [memo.path.with_name(name) for name in record.get('outputs', [])]
+    if not output_paths or not all(path.exists() for path in output_paths):
+        return None
+    for path in output_paths:
+        os.utime(path)
+    return output_paths
+
+
+def save_memo(memo: Memo, output_paths: list[Path]):
+    """
+    Record the outputs that were made. If there are none, e.g. because an output was open and had to be saved
+    with another name, any old memo is removed instead, so the next export makes them again.
+    """
+    if not output_paths:
+        memo.path.unlink(missing_ok=True)
+        return
+    record = { 'key': memo.key, 'outputs': [path.name for path in output_paths] }
+    doc_utils.write_file(json.dumps(record, indent=2).encode('utf-8'), memo.path)
@@ -0,0 +1,76 @@
+import sys
+import unittest
+import tempfile
+import subprocess
+from pathlib import Path
+from output_memo import *
+
+
+class TestMemo(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.dir = Path(self.temp_dir.name)
+        self.input_path = self.dir / 'Ruth 1.txt'
+        self.input_path.write_text('Ruth 1:1 In the days...', encoding='utf-8')
+        self.output_path = self.dir / 'Ruth 1.docx'
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_key(self):
+        memo = get_memo(self.output_path, [self.input_path], { 'format': 'docx' })
+        self.assertEqual(self.dir / 'Ruth 1.docx.memo', memo.path)
+        self.assertEqual(memo, get_memo(self.output_path, [self.input_path], { 'format': 'docx' }))
+
+        # Different options or a different text give a different key
+        self.assertNotEqual(memo.key, get_memo(self.output_path, [self.input_path], { 'format': 'html' }).key)
+        self.input_path.write_text('Ruth 1:1 Long ago...', encoding='utf-8')
+        self.assertNotEqual(memo.key, get_memo(self.output_path, [self.input_path], { 'format': 'docx' }).key)
+
+    def test_code_version(self):
+        # The same however the script was started, so a standalone run and the export server share their memos
+        def code_version(imports):
+            code = f'import {imports}; print(output_memo.get_code_version())'
+            return subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+        self.assertEqual(code_version('output_memo'), code_version('tbta_export_server, output_memo'))
+
+    def test_unchanged(self):
+        memo = get_memo(self.output_path, [self.input_path], {})
+        self.assertIsNone(find_unchanged(memo))
+
+        self.output_path.write_bytes(b'document')
+        save_memo(memo, [self.output_path])
+        self.assertEqual([self.output_path], find_unchanged(memo))
+
+        # The memo is no use once the output is gone
+        self.output_path.unlink()
+        self.assertIsNone(find_unchanged(memo))
+
+    def test_parts(self):
+        part_paths = [self.dir / 'Ruth 1.docx.index', self.dir / 'Ruth 1 - Part 1.docx', self.dir / 'Ruth 1 - Part 2.docx']
+        for path in part_paths:
+            path.write_bytes(b'part')
+        memo = get_memo(self.output_path, [self.input_path], { 'parts': 'chapter' })
+        save_memo(memo, part_paths)
+        self.assertEqual(part_paths, find_unchanged(memo))
+
+        part_paths[2].unlink()
+        self.assertIsNone(find_unchanged(memo))
+
+    def test_no_outputs(self):
+        # An old memo is removed when the outputs couldn't be saved with their usual names
+        self.output_path.write_bytes(b'document')
+        memo = get_memo(self.output_path, [self.input_path], {})
+        save_memo(memo, [self.output_path])
+        save_memo(memo, [])
+        self.assertFalse(memo.path.exists())
+
+    def test_bad_memo(self):
+        memo = get_memo(self.output_path, [self.input_path], {})
+        memo.path.write_text('not json', encoding='utf-8')
+        self.assertIsNone(find_unchanged(memo))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import re
+from typing import NamedTuple
+
+LAST_VERSE = 999    # stands in for the last verse of a chapter, when a range is given by whole chapters
+
+
+class RefRange(NamedTuple):
+    """
+    A range of verses like 'Gen 1:1-2:25', for only exporting part of a text.
+    The book is optional, and matches any book name that starts with it (ignoring case), so 'Gen' matches 'Genesis'.
+    """
+    book: str|None
+    start: tuple[int, int]      # (chapter, verse)
+    end: tuple[int, int]
+
+    def contains_book(self, book: str|None):
+        return not self.book or not book or book.lower().startswith(self.book.lower())
+
+    def contains_chapter(self, chapter: int, book: str|None=None):
+        return self.start[0] <= chapter <= self.end[0] and self.contains_book(book)
+
+    def contains_verse(self, chapter: int, verse: int, book: str|None=None):
+        return self.start <= (chapter, verse) <= self.end and self.contains_book(book)
+
+    def contains_ref(self, ref: str):
+        """
+        Check a reference in the format '{book} {chapter}:{verse}(:{sentence})'.
+        Anything that isn't a verse reference (e.g. a heading) isn't in the range.
+        """
+        ref_match = REF_REGEX.match(ref)
+        if not ref_match:
+            return False
+        return self.contains_verse(int(ref_match['chapter']), int(ref_match['verse']), ref_match['book'])
+
+
+RANGE_REGEX = re.compile(r'\s*(?:(?P<book>\S.*?)\s+)?(?P<start_chapter>\d+)(?::(?P<start_verse>\d+))?'
+    r'(?:\s*-\s*(?P<end_chapter>\d+)(?::(?P<end_verse>\d+))?)?\s*')
+REF_REGEX = re.compile(r'(?P<book>.+?) (?P<chapter>\d+):(?P<verse>\d+)')
+
+def parse_range(text: str):
+    """
+    Parse a range like 'Gen 1:1-2:25', 'Genesis 1-2', 'Ruth 1', 'Ruth 1:5-10' or '3:1-16'.
+    The end is a verse in the same chapter if the start has a verse and the end doesn't, e.g. 1:5-10.
+    Returns a RefRange, or None if the text isn't a range.
+    """
+    range_match = RANGE_REGEX.fullmatch(text)
+    if not range_match:
+        return None
+
+    start_chapter = int(range_match['start_chapter'])
+    start_verse = int(range_match['start_verse'] or 1)
+    if not range_match['end_chapter']:
+        # A single chapter or verse
+        end = (start_chapter, int(range_match['start_verse'] or LAST_VERSE))
+    elif range_match['end_verse']:
+        end = (int(range_match['end_chapter']), int(range_match['end_verse']))
+    elif range_match['start_verse']:
+        end = (start_chapter, int(range_match['end_chapter']))
+    else:
+        end = (int(range_match['end_chapter']), LAST_VERSE)
+
+    if end < (start_chapter, start_verse):
+        return None
+    return RefRange(range_match['book'], (start_chapter, start_verse), end)
+
+
+def get_range_arg(argv):
+    """
+    Returns (range argument, RefRange) from --range="Gen 1:1-2:25" in the arguments, or (None, None) if there isn't one.
+    The RefRange is None if the argument is given but isn't a range.
+    """
+    range_arg = next((a for a in argv if a.lower().startswith('--range=')), None)
+    if not range_arg:
+        return (None, None)
+    return (range_arg, parse_range(range_arg[len('--range='):].strip('"')))
+
+RANGE_ERROR = 'Please give the range of verses like --range="Gen 1:1-2:25", --range="Ruth 1-2" or --range="3:1-16"'
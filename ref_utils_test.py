@@ -0,0 +1,56 @@
+import unittest
+from ref_utils import *
+
+
+class TestParseRange(unittest.TestCase):
+
+    def test_formats(self):
+        self.assertEqual(RefRange('Gen', (1, 1), (2, 25)), parse_range('Gen 1:1-2:25'))
+        self.assertEqual(RefRange('Genesis', (1, 1), (2, LAST_VERSE)), parse_range('Genesis 1-2'))
+        self.assertEqual(RefRange('Ruth', (1, 1), (1, LAST_VERSE)), parse_range('Ruth 1'))
+        self.assertEqual(RefRange('Ruth', (1, 5), (1, 10)), parse_range('Ruth 1:5-10'))
+        self.assertEqual(RefRange('Ruth', (1, 5), (1, 5)), parse_range('Ruth 1:5'))
+        self.assertEqual(RefRange('1 Samuel', (3, 1), (4, 2)), parse_range('1 Samuel 3:1 - 4:2'))
+        self.assertEqual(RefRange(None, (3, 1), (3, 16)), parse_range('3:1-16'))
+        self.assertEqual(RefRange(None, (1, 1), (4, LAST_VERSE)), parse_range('1-4'))
+
+    def test_bad_formats(self):
+        self.assertIsNone(parse_range(''))
+        self.assertIsNone(parse_range('Genesis'))
+        self.assertIsNone(parse_range('Gen 2-1'))
+        self.assertIsNone(parse_range('Gen 1:10-5'))
+
+    def test_get_range_arg(self):
+        self.assertEqual((None, None), get_range_arg(['script', '-t', 'file.txt']))
+        self.assertEqual(('--range=Ruth 1', parse_range('Ruth 1')), get_range_arg(['script', '--range=Ruth 1', 'file.txt']))
+        self.assertEqual(('--range=Ruth', None), get_range_arg(['script', '--range=Ruth', 'file.txt']))
+
+
+class TestRefRange(unittest.TestCase):
+
+    def test_contains_ref(self):
+        ref_range = parse_range('Gen 1:3-2:4')
+        self.assertTrue(ref_range.contains_ref('Genesis 1:3'))
+        self.assertTrue(ref_range.contains_ref('genesis 2:4:2'))
+        self.assertFalse(ref_range.contains_ref('Genesis 1:2'))
+        self.assertFalse(ref_range.contains_ref('Genesis 2:5'))
+        self.assertFalse(ref_range.contains_ref('Exodus 1:5'))
+        self.assertFalse(ref_range.contains_ref('Title: Creation'))
+
+    def test_no_book(self):
+        # Without a book, the range is in any book
+        ref_range = parse_range('1:1-5')
+        self.assertTrue(ref_range.contains_ref('Ruth 1:5'))
+        self.assertTrue(ref_range.contains_ref('Ruthu 1:5'))
+        self.assertFalse(ref_range.contains_ref('Ruth 2:1'))
+
+    def test_contains_chapter(self):
+        ref_range = parse_range('Gen 2:10-4:1')
+        self.assertFalse(ref_range.contains_chapter(1))
+        self.assertTrue(ref_range.contains_chapter(2))
+        self.assertTrue(ref_range.contains_chapter(4))
+        self.assertFalse(ref_range.contains_chapter(5))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,12 +2,16 @@ import sys
 import re
 from pathlib import Path
 from typing import NamedTuple
+import error_utils
+import ref_utils
+import text_utils
 from tbta_find_differences import Indices, find_differences
 
 # Parameter Name constants
 PARAM_INPUT_PATH_OLD = 'input_path_old'
 PARAM_INPUT_PATH_NEW = 'input_path_new'
 PARAM_OUTPUT_PATH = 'output_path'
+PARAM_RANGE = 'range'
 
 
 class VerseRef(NamedTuple):
@@ -20,20 +24,27 @@ class DiffOccurrence(NamedTuple):
     new: Indices
 
 
-def get_params():
-    # usage is: tbta_analyze_edits.exe "sfm_file_old.sfm" "sfm_file_new.sfm"
+def get_params(argv):
+    # usage is: tbta_analyze_edits.exe (--range="1-4") "sfm_file_old.sfm" "sfm_file_new.sfm"
 
-    if len(sys.argv) < 3:
+    # Only some of the chapters or verses can be compared, e.g. --range="1-4"
+    range_arg, ref_range = ref_utils.get_range_arg(argv)
+    if range_arg and not ref_range:
+        show_error(f'Unexpected format for "{range_arg}". {ref_utils.RANGE_ERROR}')
+        return None
+
+    file_args = [a for a in argv if not a.startswith('-')]
+    if len(file_args) < 3:
         show_error('Please specify two .sfm files to compare')
         return None
 
-    file_name_old = sys.argv[1]
+    file_name_old = file_args[1]
     file_path_old = Path(file_name_old)
     if not file_path_old.exists():
         show_error(f'Specified File "{file_name_old}" does not exist...')
         return None
     
-    file_name_new = sys.argv[2]
+    file_name_new = file_args[2]
     file_path_new = Path(file_name_new)
     if not file_path_new.exists():
         show_error(f'Specified File "{file_name_new}" does not exist...')
@@ -43,26 +54,30 @@ def get_params():
         PARAM_INPUT_PATH_OLD: file_path_old,
         PARAM_INPUT_PATH_NEW: file_path_new,
         PARAM_OUTPUT_PATH: Path('AnalysisOfEdits.txt'),
+        PARAM_RANGE: ref_range,
     }
 
 
-def import_file(input_path: Path):
-    try:
-        return import_verses_from_paratext(input_path)
-    except IOError:
-        return import_verses_from_paratext(input_path, encoding='utf-8-sig')
+def import_file(input_path: Path, ref_range=None):
+    # The encoding is worked out while reading, so the file is only read once
+    return import_verses_from_paratext(input_path, ref_range)
 
 
 VERSE_REGEX = re.compile(r'\\v (\d+) (.*)')
 FOOTNOTE_REPLACE_REGEX = re.compile(r'\\f \+ \\fr (\d*:\d*) \\ft|\\f\*')
-def import_verses_from_paratext(input_path: Path, encoding='utf-8'):
+def import_verses_from_paratext(input_path: Path, ref_range=None):
+    """
+    If a RefRange is given, only the verses in it are imported. Chapters outside of it are skipped as soon as their \\c marker is reached.
+    The file only has one book, so the book of the range isn't checked.
+    """
     verses = {}
 
     print(f'Importing text from "{input_path}"')
 
-    with input_path.open(encoding=encoding, newline='\n') as file:
+    with text_utils.open_text(input_path) as file:
         current_chapter = 0
         current_heading = None
+        skip_chapter = False
 
         for line in file:
             # The line ending seems to be inconsistent, so strip all whitespace at the end before doing anything
@@ -70,6 +85,10 @@ def import_verses_from_paratext(input_path: Path, encoding='utf-8'):
 
             if line.startswith('\\c '):
                 current_chapter = int(line[3:])
+                skip_chapter = ref_range is not None and not ref_range.contains_chapter(current_chapter)
+                continue
+
+            if skip_chapter:
                 continue
 
             if line.startswith('\\s '):
@@ -81,11 +100,15 @@ def import_verses_from_paratext(input_path: Path, encoding='utf-8'):
                 if footnote_match:
                     print(f'Footnote ref: "{footnote_match[1]}"')
                     ref_key = VerseRef(*(int(part) for part in footnote_match[1].split(':')))
+                    if ref_range and not ref_range.contains_verse(*ref_key):
+                        continue
                     verses[ref_key] = verses.setdefault(ref_key, '') + FOOTNOTE_REPLACE_REGEX.sub('', line)
             
             verse_match = VERSE_REGEX.fullmatch(line)
             if verse_match:
                 ref_key = VerseRef(current_chapter, int(verse_match[1]))
+                if ref_range and not ref_range.contains_verse(*ref_key):
+                    continue
                 verses[ref_key] = FOOTNOTE_REPLACE_REGEX.sub('', verse_match[2])
 
                 # TODO uncomment when titles are handled on the TBTA side
@@ -106,9 +129,12 @@ def compare_verses(old: dict[VerseRef, str], new: dict[VerseRef, str]):
             continue
 
         new_verse = new[ref]
-        for diff, old_indices, new_indices in find_differences(old_verse, new_verse, try_match_words=True, separate_punctuation=True):
-            diff_value = DiffOccurrence(ref, old_indices, new_indices)
-            diff_tracker.setdefault(diff, []).append(diff_value)
+        diffs = find_differences(old_verse, new_verse, try_match_words=True, separate_punctuation=True)
+        if any(diff.approximate for diff in diffs):
+            print(f'Warning: {ref.chapter}:{ref.verse} changed too much to compare word by word, so its differences are approximate')
+        for diff in diffs:
+            diff_value = DiffOccurrence(ref, diff.old_indices, diff.new_indices)
+            diff_tracker.setdefault(diff.diff, []).append(diff_value)
     
     # sort the diffs by most frequent, then by the first verse reference
     sorted_diffs = sorted(diff_tracker.items(), key=lambda diff: (len(diff[1])*-1, diff[1][0].ref))
@@ -125,14 +151,20 @@ def export_file(diffs: list[tuple[str, list[DiffOccurrence]]], params: dict):
 
 def show_error(text):
     print("Error: " + text)
-    import ctypes  
-    ctypes.windll.user32.MessageBoxW(0, text, "Error Creating Word Document", 0 + 16)
+    error_utils.show_error_dialog(text)
+
+
+def main(argv):
+    params = get_params(argv)
+    if not params:
+        return False
+    old_verses = import_file(params[PARAM_INPUT_PATH_OLD], params[PARAM_RANGE])
+    new_verses = import_file(params[PARAM_INPUT_PATH_NEW], params[PARAM_RANGE])
+    diffs = compare_verses(old_verses, new_verses)
+    export_file(diffs, params)
+    return True
 
 
 if __name__ == "__main__":
-    params = get_params()
-    if params:
-        old_verses = import_file(params[PARAM_INPUT_PATH_OLD])
-        new_verses = import_file(params[PARAM_INPUT_PATH_NEW])
-        diffs = compare_verses(old_verses, new_verses)
-        export_file(diffs, params)
+    main(sys.argv)
+
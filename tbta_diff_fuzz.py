@@ -0,0 +1,285 @@
+import re
+import sys
+import time
+import random
+import itertools
+from pathlib import Path
+from typing import NamedTuple
+
+from tbta_find_differences import DIFF_BUDGET, DIFF_ENGINES, DiffData, Indices, Token, Tokenizer, find_differences, get_default_tokenizer
+from tbta_analyze_edits import import_file
+
+REFERENCE_ENGINE = 'reference'
+SOURCE_FOLDER = Path(__file__).parent / 'test_docs' / 'analyze_edits'
+
+# Parameter Name constants
+PARAM_COUNT = 'count'
+PARAM_SEED = 'seed'
+PARAM_ENGINES = 'engines'
+
+DEFAULT_COUNT = 200
+SMALL_BUDGET = 200      # small enough that the sentence and chunk fallbacks are used for most verses
+
+# Every combination of options is checked for each pair of texts
+OPTION_SETS = [
+    { 'try_match_words': try_match_words, 'separate_punctuation': separate_punctuation, 'budget': budget }
+    for try_match_words, separate_punctuation, budget in itertools.product([False, True], [False, True], [DIFF_BUDGET, SMALL_BUDGET, None])
+]
+
+
+class Mismatch(NamedTuple):
+    engine: str
+    options: dict
+    old: str
+    new: str
+    expected: list[DiffData]
+    actual: list[DiffData]
+
+
+def get_params(argv):
+    # usage is: tbta_diff_fuzz.py (--count=200) (--seed=1) (--engine=trimmed)
+    params = {
+        PARAM_COUNT: DEFAULT_COUNT,
+        PARAM_SEED: None,
+        PARAM_ENGINES: [engine for engine in DIFF_ENGINES if engine != REFERENCE_ENGINE],
+    }
+    for arg in argv[1:]:
+        name, _, value = arg.partition('=')
+        try:
+            if name == '--count':
+                params[PARAM_COUNT] = int(value)
+            elif name == '--seed':
+                params[PARAM_SEED] = int(value)
+            elif name == '--engine':
+                if value not in DIFF_ENGINES:
+                    print(f'Unknown engine "{value}". The engines are: {", ".join(DIFF_ENGINES)}')
+                    return None
+                params[PARAM_ENGINES] = [value]
+            else:
+                print(f'Unexpected argument "{arg}"')
+                return None
+        except ValueError:
+            print(f'Unexpected format for "{arg}". Please give a whole number, like {name}=1')
+            return None
+    return params
+
+
+def load_source_verses(folder: Path = SOURCE_FOLDER):
+    """
+    The real verse texts that the random pairs are made from.
+    """
+    verses = []
+    for path in sorted(folder.glob('*.SFM')):
+        verses.extend(text for text in import_file(path).values() if text.strip())
+    return verses
+
+
+PUNCTUATION_CHOICES = ',.?!:'
+SMART_QUOTES = [('“', '”'), ('‘', '’'), ('"', '"')]
+
+def swap_words(rng: random.Random, words: list[str], verses: list[str]):
+    if len(words) > 1:
+        i = rng.randrange(len(words) - 1)
+        words[i], words[i + 1] = words[i + 1], words[i]
+
+def edit_punctuation(rng: random.Random, words: list[str], verses: list[str]):
+    i = rng.randrange(len(words))
+    if words[i] and words[i][-1] in PUNCTUATION_CHOICES:
+        # change or remove the punctuation
+        words[i] = words[i][:-1] + rng.choice(PUNCTUATION_CHOICES + ' ').strip()
+    else:
+        words[i] += rng.choice(PUNCTUATION_CHOICES)
+
+def add_smart_quotes(rng: random.Random, words: list[str], verses: list[str]):
+    start = rng.randrange(len(words))
+    end = rng.randrange(start, len(words))
+    open_quote, close_quote = rng.choice(SMART_QUOTES)
+    words[start] = open_quote + words[start]
+    words[end] += close_quote
+
+def insert_words(rng: random.Random, words: list[str], verses: list[str]):
+    other_words = rng.choice(verses).split(' ')
+    start = rng.randrange(len(other_words))
+    i = rng.randrange(len(words) + 1)
+    words[i:i] = other_words[start:start + rng.randint(1, 4)]
+
+def delete_words(rng: random.Random, words: list[str], verses: list[str]):
+    if len(words) > 1:
+        i = rng.randrange(len(words))
+        del words[i:i + rng.randint(1, 3)]
+
+def change_letters(rng: random.Random, words: list[str], verses: list[str]):
+    i = rng.randrange(len(words))
+    word = words[i]
+    if word:
+        j = rng.randrange(len(word))
+        words[i] = word[:j] + rng.choice(['', word[j].swapcase(), word[j] * 2, 'a']) + word[j + 1:]
+
+MUTATIONS = [swap_words, edit_punctuation, add_smart_quotes, insert_words, delete_words, change_letters]
+
+def mutate(rng: random.Random, text: str, verses: list[str]):
+    words = text.split(' ')
+    for _ in range(rng.randint(1, 6)):
+        if not words:
+            break
+        rng.choice(MUTATIONS)(rng, words, verses)
+    return ' '.join(words)
+
+
+def generate_pairs(verses: list[str], count: int, seed=None):
+    """
+    Yields (old, new) pairs of texts, where the new text is a mutated copy of a real verse.
+    Some of the pairs are long verses made by joining several verses together, and a few are completely unrelated.
+    """
+    rng = random.Random(seed)
+    for _ in range(count):
+        kind = rng.random()
+        if kind < 0.1:
+            old = ' '.join(rng.choice(verses) for _ in range(rng.randint(5, 20)))
+        else:
+            old = rng.choice(verses)
+
+        if kind > 0.97:
+            new = rng.choice(verses)
+        else:
+            new = mutate(rng, old, verses)
+
+        # The old and new texts are swapped sometimes, so deletions are tested as well as insertions
+        yield (new, old) if rng.random() < 0.5 else (old, new)
+
+
+def get_differences(engine: str, old: str, new: str, options: dict):
+    return find_differences(old, new, engine=engine, **options)
+
+
+def is_mismatch(engine: str, old: str, new: str, options: dict):
+    return get_differences(engine, old, new, options) != get_differences(REFERENCE_ENGINE, old, new, options)
+
+
+def minimize(engine: str, old: str, new: str, options: dict):
+    """
+    Make the old and new texts as short as possible while the engine still doesn't match the reference,
+    by removing runs of words from them (like delta debugging).
+    """
+    texts = [old.split(' '), new.split(' ')]
+    for side in (0, 1, 0, 1):
+        chunk_size = max(len(texts[side]) // 2, 1)
+        while chunk_size >= 1:
+            start = 0
+            while start < len(texts[side]):
+                candidate = texts.copy()
+                candidate[side] = texts[side][:start] + texts[side][start + chunk_size:]
+                if is_mismatch(engine, ' '.join(candidate[0]), ' '.join(candidate[1]), options):
+                    texts = candidate
+                else:
+                    start += chunk_size
+            chunk_size //= 2
+    return (' '.join(texts[0]), ' '.join(texts[1]))
+
+
+def run_fuzz(pairs: list[tuple[str, str]], engines: list[str], option_sets=OPTION_SETS):
+    """
+    Diff every pair with every set of options, using the reference engine and each of the other engines.
+    Returns (mismatches, {engine: seconds taken}). Each mismatch is minimized, and only the first one for each engine and set of options is kept.
+    """
+    timings = {}
+    results = {}
+    for engine in [REFERENCE_ENGINE, *engines]:
+        start_time = time.perf_counter()
+        results[engine] = [[get_differences(engine, old, new, options) for options in option_sets] for old, new in pairs]
+        timings[engine] = time.perf_counter() - start_time
+
+    mismatches = []
+    for engine in engines:
+        found_options = set()
+        for (old, new), expected_list, actual_list in zip(pairs, results[REFERENCE_ENGINE], results[engine]):
+            for option_index, (options, expected, actual) in enumerate(zip(option_sets, expected_list, actual_list)):
+                if expected == actual or option_index in found_options:
+                    continue
+                found_options.add(option_index)
+                min_old, min_new = minimize(engine, old, new, options)
+                mismatches.append(Mismatch(engine, options, min_old, min_new,
+                    get_differences(REFERENCE_ENGINE, min_old, min_new, options), get_differences(engine, min_old, min_new, options)))
+    return mismatches, timings
+
+
+# The regex split that tokenized text before the Tokenizer, kept to check against and to time
+LEGACY_PUNCTUATION = ',.?!:<>"“”‘’'
+LEGACY_SPLIT_REGEX = re.compile(f'([ {LEGACY_PUNCTUATION}])')
+def legacy_split_tokens(text: str):
+    tokens = []
+    token_start, token_end = 0, 0
+    for token in LEGACY_SPLIT_REGEX.split(text):
+        if not len(token):
+            continue
+        token_end = token_start + len(token)
+        tokens.append(Token(token, Indices(token_start, token_end)))
+        token_start = token_end
+    return tokens
+
+
+def check_tokenizer(texts: list[str], repeats=5):
+    """
+    Check that a Tokenizer with the old punctuation splits the texts exactly like the old regex split did,
+    and time both, along with the default Tokenizer.
+    Returns (texts that were split differently, {name: seconds taken}).
+    """
+    legacy_tokenizer = Tokenizer(punctuation=LEGACY_PUNCTUATION)
+    def get_tokens(text):
+        tokens = legacy_tokenizer.split(text)
+        return list(zip(tokens.texts, zip(tokens.starts, tokens.ends)))
+    mismatched = [text for text in texts if get_tokens(text) != legacy_split_tokens(text)]
+
+    timings = {}
+    for name, split in [('regex split', legacy_split_tokens), ('tokenizer', legacy_tokenizer.split), ('unicode tokenizer', get_default_tokenizer().split)]:
+        start_time = time.perf_counter()
+        for _ in range(repeats):
+            for text in texts:
+                split(text)
+        timings[name] = time.perf_counter() - start_time
+    return mismatched, timings
+
+
+def show_tokenizer_report(texts, mismatched, timings):
+    print(f'\nSplit {len(texts)} texts into tokens')
+    for name, seconds in timings.items():
+        print(f'  {name}: {seconds:.3f}s ({timings["regex split"] / seconds:.2f}x the regex split)')
+    if mismatched:
+        print(f'  MISMATCH: {len(mismatched)} texts were split differently, e.g. {mismatched[0]!r}')
+
+
+def show_report(pairs, mismatches, timings, option_sets=OPTION_SETS):
+    diff_count = len(pairs) * len(option_sets)
+    print(f'\nDiffed {len(pairs)} pairs of texts with {len(option_sets)} sets of options')
+    for engine, seconds in timings.items():
+        engine_mismatches = [m for m in mismatches if m.engine == engine]
+        status = '' if engine == REFERENCE_ENGINE else f' - {"MISMATCH" if engine_mismatches else "OK"}'
+        print(f'  {engine}: {diff_count / seconds:.0f} diffs/s ({seconds:.2f}s, {timings[REFERENCE_ENGINE] / seconds:.2f}x the reference){status}')
+
+    for mismatch in mismatches:
+        print(f'\n{mismatch.engine} with {mismatch.options}:')
+        print(f'  old: {mismatch.old!r}')
+        print(f'  new: {mismatch.new!r}')
+        print(f'  expected: {mismatch.expected}')
+        print(f'  actual:   {mismatch.actual}')
+
+
+def main(argv):
+    params = get_params(argv)
+    if not params:
+        return False
+
+    seed = params[PARAM_SEED] if params[PARAM_SEED] is not None else random.randrange(1_000_000)
+    print(f'Using seed {seed}')
+    pairs = list(generate_pairs(load_source_verses(), params[PARAM_COUNT], seed))
+    mismatches, timings = run_fuzz(pairs, params[PARAM_ENGINES])
+    show_report(pairs, mismatches, timings)
+
+    texts = [text for pair in pairs for text in pair]
+    mismatched_texts, tokenizer_timings = check_tokenizer(texts)
+    show_tokenizer_report(texts, mismatched_texts, tokenizer_timings)
+    return not mismatches and not mismatched_texts
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main(sys.argv) else 1)
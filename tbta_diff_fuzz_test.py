@@ -0,0 +1,53 @@
+import unittest
+from unittest.mock import patch
+from tbta_find_differences import DIFF_ENGINES, find_overlaps
+from tbta_diff_fuzz import REFERENCE_ENGINE, OPTION_SETS, load_source_verses, generate_pairs, run_fuzz, is_mismatch, check_tokenizer
+
+
+def find_overlaps_broken(a, b):
+    # Misses the first match, like a buggy optimization might
+    return find_overlaps(a, b)[1:]
+
+
+class TestDiffFuzz(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.verses = load_source_verses()
+
+    def test_same_pairs_for_seed(self):
+        first = list(generate_pairs(self.verses, 20, seed=5))
+        second = list(generate_pairs(self.verses, 20, seed=5))
+        self.assertListEqual(first, second)
+        self.assertTrue(any(old != new for old, new in first))
+
+    def test_engines_match_reference(self):
+        pairs = list(generate_pairs(self.verses, 30, seed=1))
+        engines = [engine for engine in DIFF_ENGINES if engine != REFERENCE_ENGINE]
+        mismatches, timings = run_fuzz(pairs, engines)
+        self.assertListEqual(mismatches, [])
+        self.assertSetEqual(set(timings), set(DIFF_ENGINES))
+
+    def test_mismatch_minimized(self):
+        pairs = list(generate_pairs(self.verses, 5, seed=1))
+        options = OPTION_SETS[:1]
+        with patch.dict(DIFF_ENGINES, { 'broken': find_overlaps_broken }):
+            mismatches, _ = run_fuzz(pairs, ['broken'], options)
+            self.assertEqual(len(mismatches), 1)
+
+            mismatch = mismatches[0]
+            self.assertEqual(mismatch.engine, 'broken')
+            self.assertNotEqual(mismatch.expected, mismatch.actual)
+            self.assertTrue(is_mismatch('broken', mismatch.old, mismatch.new, options[0]))
+            # Only a word or two should be left
+            self.assertLessEqual(len(mismatch.old.split()) + len(mismatch.new.split()), 4)
+
+    def test_tokenizer_matches_regex_split(self):
+        # With the old punctuation, the tokenizer splits exactly like the old regex split
+        texts = [text for pair in generate_pairs(self.verses, 50, seed=2) for text in pair]
+        mismatched, timings = check_tokenizer(texts, repeats=1)
+        self.assertListEqual([], mismatched)
+        self.assertIn('regex split', timings)
+
+
+if __name__ == '__main__':
+    unittest.main()
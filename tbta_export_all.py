@@ -0,0 +1,237 @@
+import sys
+import json
+import shlex
+import multiprocessing
+from pathlib import Path
+from typing import NamedTuple
+from concurrent.futures import ProcessPoolExecutor
+
+import doc_utils
+import output_memo
+import ref_utils
+import text_utils
+import tbta_export_to_word
+import tbta_export_to_table
+
+# Parameter Name constants
+PARAM_INPUT_PATH = 'input_path'
+PARAM_SINKS = 'sinks'
+PARAM_TABLE_PARAMS = 'table_params'
+PARAM_RANGE = 'range'
+PARAM_FORMAT = 'format'
+PARAM_REBUILD = 'rebuild'
+PARAM_TEST = 'test'
+
+# Outputs that can be made from the one text file
+SINK_WORD = 'word'
+SINK_TABLE = 'table'
+SINK_JSON = 'json'
+
+
+class ParsedText(NamedTuple):
+    lines: list[str]
+    verses: list[tbta_export_to_table.Verse]
+    language_names: list[str]
+
+
+def get_params(argv):
+    # usage is: tbta_export_all.exe (--word) (--table(="-n -s -c")) (--json) (--range="Gen 1:1-2:25") (--format=(docx|html|rtf)) (--rebuild) (-t) "text_file.txt"
+    # With no outputs given, all of them are made
+    non_flag_args = [a for a in argv if not a.startswith('-')]
+    if len(non_flag_args) < 2:
+        tbta_export_to_word.show_error('Please specify a .txt file to import')
+        return None
+
+    file_name = non_flag_args[-1]
+    file_path = Path(file_name).with_suffix('.txt')
+    if not file_path.exists():
+        tbta_export_to_word.show_error(f'Specified File "{file_name}" does not exist...')
+        return None
+
+    # Only some of the verses can be exported, e.g. --range="Gen 1:1-2:25"
+    range_arg, ref_range = ref_utils.get_range_arg(argv)
+    if range_arg and not ref_range:
+        tbta_export_to_word.show_error(f'Unexpected format for "{range_arg}". {ref_utils.RANGE_ERROR}')
+        return None
+
+    # The Word document and the table can both be made as HTML or RTF instead, e.g. --format=html
+    format_arg = next((a for a in argv if a.lower().startswith('--format=')), None)
+    doc_format = doc_utils.FORMAT_DOCX
+    if format_arg:
+        doc_format = doc_utils.parse_format_arg(format_arg[len('--format='):])
+        if not doc_format:
+            tbta_export_to_word.show_error(f'Unexpected format for "{format_arg}". Please use --format=docx, --format=html or --format=rtf')
+            return None
+
+    sinks = []
+    table_flags = []
+    for arg in argv[1:]:
+        if arg == '--word':
+            sinks.append(SINK_WORD)
+        elif arg == '--table' or arg.startswith('--table='):
+            sinks.append(SINK_TABLE)
+            table_flags = shlex.split(arg[len('--table='):])
+        elif arg == '--json':
+            sinks.append(SINK_JSON)
+
+    # The table flags are checked by the table script itself, as if it was called with them
+    table_params = tbta_export_to_table.get_params(['tbta_export_to_table', *table_flags, str(file_path)])
+    if not table_params:
+        return None
+    table_params[tbta_export_to_table.PARAM_FORMAT] = doc_format
+    table_params[tbta_export_to_table.PARAM_OUTPUT_PATH] = get_output_path(file_path, SINK_TABLE, doc_format)
+
+    return {
+        PARAM_INPUT_PATH: file_path,
+        PARAM_SINKS: list(dict.fromkeys(sinks)) or [SINK_WORD, SINK_TABLE, SINK_JSON],
+        PARAM_TABLE_PARAMS: table_params,
+        PARAM_RANGE: ref_range,
+        PARAM_FORMAT: doc_format,
+        PARAM_REBUILD: '--rebuild' in argv,
+        PARAM_TEST: '-T' in argv or '-t' in argv,
+    }
+
+
+def get_output_path(input_path, sink, doc_format=doc_utils.FORMAT_DOCX):
+    # The Word document and the table would both be called {name}.docx, so the table gets its own name
+    suffix = doc_utils.get_format_suffix(doc_format)
+    if sink == SINK_WORD:
+        return input_path.with_name(f'{input_path.stem}{suffix}')
+    if sink == SINK_TABLE:
+        return input_path.with_name(f'{input_path.stem} - Table{suffix}')
+    return input_path.with_name(f'{input_path.stem}.json')
+
+
+def parse_text(input_path, ref_range=None):
+    """
+    Read and parse the text file once, for all of the outputs to share.
+    With a range, only the lines of the verses in it are kept.
+    """
+    print(f'Importing text from "{input_path}"')
+
+    with text_utils.open_text(input_path) as file:
+        lines = list(tbta_export_to_word.filter_lines(file, ref_range)) if ref_range else file.readlines()
+
+    verses, language_names = tbta_export_to_table.get_verses(tbta_export_to_table.parse_verse_texts(lines))
+    return ParsedText(lines, list(verses), language_names)
+
+
+def export_sink(sink, parsed, params):
+    """
+    Make one output from the parsed text. This is run in a worker process.
+    Returns (success, output path).
+    """
+    output_path = get_output_path(params[PARAM_INPUT_PATH], sink, params[PARAM_FORMAT])
+
+    if sink == SINK_WORD:
+        word_params = tbta_export_to_word.get_file_params(params[PARAM_INPUT_PATH], is_test=True, doc_format=params[PARAM_FORMAT])
+        word_params[tbta_export_to_word.PARAM_OUTPUT_PATH] = output_path
+        error = tbta_export_to_word.export_lines(parsed.lines, word_params)
+        if error:
+            print('Error: ' + error)
+        return (error is None, word_params[tbta_export_to_word.PARAM_OUTPUT_PATH])
+
+    if not parsed.verses:
+        print(f'Error: No verses were found for the {sink} output')
+        return (False, output_path)
+
+    if sink == SINK_TABLE:
+        table_params = params[PARAM_TABLE_PARAMS]
+        verses = iter(parsed.verses)
+        if table_params[tbta_export_to_table.PARAM_SPLIT_SENTENCES]:
+            verses = tbta_export_to_table.split_verse_sentences(verses)
+        success = tbta_export_to_table.export_table(verses, parsed.language_names, table_params)
+        return (success, table_params[tbta_export_to_table.PARAM_OUTPUT_PATH])
+
+    return export_json(parsed, output_path)
+
+
+def export_json(parsed, output_path):
+    data = {
+        'languages': parsed.language_names,
+        'verses': [{ 'ref': ref, 'texts': dict(zip(parsed.language_names, texts)) } for ref, texts in parsed.verses],
+    }
+    try:
+        doc_utils.write_file(json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8'), output_path)
+    except PermissionError:
+        print(f'Error: "{output_path.name}" is currently open. Please close and try again.')
+        return (False, output_path)
+    print(f'Successfully exported "{output_path}"')
+    return (True, output_path)
+
+
+def export_all(parsed, params):
+    """
+    Make each of the outputs at the same time, each in its own worker process.
+    Returns a list of (sink, success, output path).
+    """
+    sinks = params[PARAM_SINKS]
+    with ProcessPoolExecutor(max_workers=len(sinks), initializer=doc_utils.init_save_worker) as executor:
+        futures = [executor.submit(export_sink, sink, parsed, params) for sink in sinks]
+        return [(sink, *future.result()) for sink, future in zip(sinks, futures)]
+
+
+def get_memo_options(sink, params):
+    # Everything apart from the text itself that changes the output
+    options = tbta_export_to_table.get_memo_options(params[PARAM_TABLE_PARAMS]) if sink == SINK_TABLE else {}
+    options.update({ 'script': 'tbta_export_all', 'sink': sink, 'range': params[PARAM_RANGE] })
+    if sink != SINK_JSON:
+        options['format'] = params[PARAM_FORMAT]
+    return options
+
+
+def get_saved_paths(sink, output_path, params):
+    """
+    The files that were made for an output, or [] if any of them had to be saved with another name because the usual one was open.
+    """
+    expected_path = get_output_path(params[PARAM_INPUT_PATH], sink, params[PARAM_FORMAT])
+    if sink == SINK_TABLE and params[PARAM_TABLE_PARAMS][tbta_export_to_table.PARAM_PARTS]:
+        return doc_utils.get_part_paths(expected_path)
+    return [output_path] if output_path == expected_path else []
+
+
+def main(argv):
+    params = get_params(argv)
+    if not params:
+        return False
+
+    # Outputs that were already made from the same text with the same options are left as they are.
+    # If none of them need to be made again, the text doesn't even need to be read.
+    memos = { sink: output_memo.get_memo(get_output_path(params[PARAM_INPUT_PATH], sink, params[PARAM_FORMAT]), [params[PARAM_INPUT_PATH]], get_memo_options(sink, params))
+        for sink in params[PARAM_SINKS] }
+    results = []
+    sinks = []
+    for sink in params[PARAM_SINKS]:
+        unchanged_paths = None if params[PARAM_REBUILD] else output_memo.find_unchanged(memos[sink])
+        if unchanged_paths:
+            print(f'"{params[PARAM_INPUT_PATH].name}" has not changed since "{unchanged_paths[0].name}" was made, so it was not exported again')
+            results.append((sink, True, unchanged_paths[0]))
+        else:
+            sinks.append(sink)
+
+    if sinks:
+        parsed = parse_text(params[PARAM_INPUT_PATH], params[PARAM_RANGE])
+        for sink, success, output_path in export_all(parsed, { **params, PARAM_SINKS: sinks }):
+            if success:
+                output_memo.save_memo(memos[sink], get_saved_paths(sink, output_path, params))
+            results.append((sink, success, output_path))
+        results.sort(key=lambda result: params[PARAM_SINKS].index(result[0]))
+
+    failed = [sink for sink, success, _ in results if not success]
+    for sink, success, output_path in results:
+        print(f'  {"OK" if success else "FAILED"}: {sink} - "{output_path.name}"')
+    if failed:
+        tbta_export_to_word.show_error(f'Unable to create the {", ".join(failed)} output. "{params[PARAM_INPUT_PATH].name}" was not deleted.')
+        return False
+
+    # Only delete the text file once every output has been made
+    if not params[PARAM_TEST]:
+        print(f'Deleting {params[PARAM_INPUT_PATH]}')
+        params[PARAM_INPUT_PATH].unlink()
+    return True
+
+
+if __name__ == "__main__":
+    # Needed for the worker processes when running as a frozen executable
+    multiprocessing.freeze_support()
+    main(sys.argv)
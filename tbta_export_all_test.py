@@ -0,0 +1,85 @@
+import unittest
+import json
+import shutil
+import tempfile
+import zipfile
+from unittest.mock import patch
+from pathlib import Path
+from tbta_export_all import *
+
+
+class TestExportAll(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.dir = Path(self.temp_dir.name)
+        shutil.copy('./test_docs/export_to_word/Ibwe Differences.txt', self.dir)
+        self.input_path = self.dir / 'Ibwe Differences.txt'
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_params(self):
+        params = get_params(['', '--table=-c -n', '--json', str(self.input_path)])
+        self.assertEqual([SINK_TABLE, SINK_JSON], params[PARAM_SINKS])
+        table_params = params[PARAM_TABLE_PARAMS]
+        self.assertTrue(table_params[tbta_export_to_table.PARAM_COMPARE])
+        self.assertTrue(table_params[tbta_export_to_table.PARAM_NOTES_COLUMN])
+        self.assertFalse(table_params[tbta_export_to_table.PARAM_SPLIT_SENTENCES])
+
+        # Everything by default
+        params = get_params(['', str(self.input_path)])
+        self.assertEqual([SINK_WORD, SINK_TABLE, SINK_JSON], params[PARAM_SINKS])
+
+    def test_parse(self):
+        parsed = parse_text(self.input_path)
+        self.assertEqual(['English', 'Old Ibwe', 'New Ibwe'], parsed.language_names)
+        self.assertEqual(19, len(parsed.verses))
+        self.assertEqual('Markus 1:19', parsed.verses[0].ref)
+
+    def test_export_all(self):
+        self.assertTrue(main(['', '--word', '--table=-c', '--json', str(self.input_path)]))
+
+        # The text file is deleted once everything has been made
+        self.assertFalse(self.input_path.exists())
+        self.assertTrue(zipfile.is_zipfile(self.dir / 'Ibwe Differences.docx'))
+        self.assertTrue(zipfile.is_zipfile(self.dir / 'Ibwe Differences - Table.docx'))
+        data = json.loads((self.dir / 'Ibwe Differences.json').read_text(encoding='utf-8'))
+        self.assertEqual(19, len(data['verses']))
+        self.assertIn('Old Ibwe', data['verses'][0]['texts'])
+
+    def test_same_as_scripts(self):
+        # The table should be exactly what the table script makes on its own
+        params = get_params(['', '--table=-c -s', '-t', str(self.input_path)])
+        self.assertTrue(main(['', '--table=-c -s', '-t', str(self.input_path)]))
+        tbta_export_to_table.main(['', '-c', '-s', '-t', str(self.input_path)])
+
+        with zipfile.ZipFile(params[PARAM_TABLE_PARAMS][tbta_export_to_table.PARAM_OUTPUT_PATH]) as combined, zipfile.ZipFile(self.dir / 'Ibwe Differences.docx') as single:
+            self.assertEqual(single.read('word/document.xml'), combined.read('word/document.xml'))
+
+    def test_unchanged(self):
+        self.assertTrue(main(['', '--word', '--json', '-t', str(self.input_path)]))
+
+        # The outputs that were already made aren't made again, but the new one is
+        with patch('tbta_export_all.export_all', wraps=export_all) as export:
+            self.assertTrue(main(['', '--word', '--json', '--table', '-t', str(self.input_path)]))
+            self.assertEqual([SINK_TABLE], export.call_args.args[1][PARAM_SINKS])
+            self.assertTrue((self.dir / 'Ibwe Differences - Table.docx').exists())
+
+            # Nothing is made when they are all there, unless rebuilding
+            export.reset_mock()
+            self.assertTrue(main(['', '--word', '--json', '--table', '-t', str(self.input_path)]))
+            export.assert_not_called()
+            self.assertTrue(main(['', '--word', '--json', '--table', '--rebuild', '-t', str(self.input_path)]))
+            self.assertEqual([SINK_WORD, SINK_JSON, SINK_TABLE], export.call_args.args[1][PARAM_SINKS])
+
+    def test_no_verses(self):
+        # A plain text file can be made into a Word document, but not a table
+        shutil.copy('./test_docs/export_to_word/Ruth 1 w English.txt', self.dir)
+        input_path = self.dir / 'Ruth 1 w English.txt'
+        results = export_all(parse_text(input_path), get_params(['', '--word', '--json', str(input_path)]))
+        self.assertEqual([(SINK_WORD, True), (SINK_JSON, False)], [(sink, success) for sink, success, _ in results])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import sys
+import os
+import importlib
+from pathlib import Path
+from multiprocessing import AuthenticationError
+
+from tbta_export_server import SCRIPTS, JOB_SCRIPT, JOB_ARGV, JOB_CWD, RESULT_SUCCESS, RESULT_OUTPUT, send_job
+
+
+def get_script(argv):
+    # usage is: tbta_export_client.exe tbta_export_to_table -s -n "text_file.txt"
+    # or the client can be built under a script's name, and then the usage is the same as the script itself
+    exe_name = Path(argv[0]).stem
+    if exe_name in SCRIPTS:
+        return (exe_name, argv)
+    if len(argv) > 1 and argv[1] in SCRIPTS:
+        return (argv[1], [argv[0], *argv[2:]])
+    return (None, argv)
+
+
+def run_script(script, argv):
+    try:
+        result = send_job({ JOB_SCRIPT: script, JOB_ARGV: argv, JOB_CWD: os.getcwd() })
+        print(result[RESULT_OUTPUT], end='')
+        return result[RESULT_SUCCESS]
+    except ConnectionRefusedError:
+        # No server is running, so just do the work in this process
+        pass
+    except (EOFError, AuthenticationError) as e:
+        # The server is stopping, or was started with a different key
+        print(f'Could not use the export server ({type(e).__name__}), so running here instead')
+    return bool(importlib.import_module(script).main(argv))
+
+
+if __name__ == "__main__":
+    script, argv = get_script(sys.argv)
+    if not script:
+        print(f'Please specify one of: {", ".join(SCRIPTS)}')
+        sys.exit(1)
+    sys.exit(0 if run_script(script, argv) else 1)
@@ -0,0 +1,199 @@
+import sys
+import os
+import io
+import secrets
+import importlib
+import multiprocessing
+import threading
+import traceback
+from pathlib import Path
+from contextlib import redirect_stdout
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener, Client
+
+import error_utils
+
+# The server and client talk over a local socket. Only processes that know the key can submit jobs, since the server
+# unpickles whatever it is sent. The key is made at random for each user, and kept in a file only they can read.
+SERVER_ADDRESS = ('localhost', 48620)
+AUTHKEY_SIZE = 32
+
+# The scripts that can be run as jobs, by module name
+SCRIPTS = [
+    'tbta_export_to_word',
+    'tbta_export_to_table',
+    'tbta_missing_concepts_to_word',
+    'tbta_analyze_edits',
+    'tbta_export_all',
+]
+
+# Job Fields
+JOB_COMMAND = 'command'
+JOB_SCRIPT = 'script'
+JOB_ARGV = 'argv'
+JOB_CWD = 'cwd'
+
+# Result Fields
+RESULT_SUCCESS = 'success'
+RESULT_OUTPUT = 'output'
+
+# Commands
+COMMAND_RUN = 'run'
+COMMAND_STATUS = 'status'
+COMMAND_STOP = 'stop'
+
+WORKER_COUNT = max(1, min(4, (os.cpu_count() or 1) - 1))
+
+
+def get_authkey_path():
+    # LOCALAPPDATA is private to the user on Windows
+    return Path(os.environ.get('LOCALAPPDATA') or Path.home()) / 'TBTA' / 'export_server.key'
+
+
+def get_authkey(path: Path|None=None):
+    """
+    Read the key that the server and client share, making it first if there isn't one yet.
+    """
+    path = path or get_authkey_path()
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            # Only the user can read it (on Windows the folder already takes care of that)
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            with os.fdopen(fd, 'wb') as file:
+                file.write(secrets.token_bytes(AUTHKEY_SIZE))
+        except FileExistsError:
+            pass    # the server and client made it at the same time
+    return path.read_bytes()
+
+
+def init_worker():
+    # Pay for the imports (python-docx especially) once per worker rather than once per job
+    for script in SCRIPTS:
+        importlib.import_module(script)
+
+    import doc_utils
+    doc_utils.load_template()
+    doc_utils.init_save_worker()
+
+    # The tokenizers build their tables of punctuation from the whole of unicode, so build them before the first diff
+    import tbta_find_differences
+    for language_name in [None, *tbta_find_differences.LANGUAGE_TOKENIZERS]:
+        tbta_find_differences.get_tokenizer(language_name)
+
+
+def run_job(script, argv, cwd):
+    """
+    Run a script's main() as if it was called from the command line in the given directory.
+    Errors are only printed rather than shown in a message box, since nobody would see it to close it.
+    Returns (success, output) where output is everything the script printed.
+    """
+    output = io.StringIO()
+    old_cwd = os.getcwd()
+    with redirect_stdout(output), error_utils.no_dialogs():
+        try:
+            os.chdir(cwd)
+            module = importlib.import_module(script)
+            success = bool(module.main(argv))
+        except Exception:
+            traceback.print_exc(file=output)
+            success = False
+        finally:
+            # The worker runs other jobs after this one, so don't leave it in this job's folder
+            os.chdir(old_cwd)
+    return (success, output.getvalue())
+
+
+class ExportServer:
+    def __init__(self, address=SERVER_ADDRESS, workers=WORKER_COUNT, authkey: bytes|None=None):
+        self.address = address
+        self.workers = workers
+        self.authkey = authkey or get_authkey()
+        self.jobs_run = 0
+        self.jobs_failed = 0
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+
+    def serve(self):
+        print(f'Starting {self.workers} workers...')
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker) as executor:
+            self.executor = executor
+            with Listener(self.address, authkey=self.authkey) as listener:
+                print(f'Listening on {self.address[0]}:{self.address[1]}')
+                while not self.stopping.is_set():
+                    try:
+                        conn = listener.accept()
+                    except (AuthenticationError, EOFError, ConnectionError):
+                        # A process without the key (or one that gave up) mustn't stop the server
+                        continue
+                    threading.Thread(target=self.handle_connection, args=(conn,), daemon=True).start()
+        print('Server stopped')
+
+    def handle_connection(self, conn):
+        with conn:
+            try:
+                job = conn.recv()
+            except EOFError:
+                return
+
+            command = job.get(JOB_COMMAND, COMMAND_RUN)
+            if command == COMMAND_STATUS:
+                conn.send({ RESULT_SUCCESS: True, RESULT_OUTPUT: self.status() })
+            elif command == COMMAND_STOP:
+                self.stopping.set()
+                conn.send({ RESULT_SUCCESS: True, RESULT_OUTPUT: 'Stopping server' })
+                # The listener is blocked in accept(), so wake it up with a dummy connection
+                wake_listener(self.address, self.authkey)
+            elif job.get(JOB_SCRIPT) not in SCRIPTS:
+                conn.send({ RESULT_SUCCESS: False, RESULT_OUTPUT: f'Unknown script "{job.get(JOB_SCRIPT)}"' })
+            else:
+                try:
+                    future = self.executor.submit(run_job, job[JOB_SCRIPT], job[JOB_ARGV], job[JOB_CWD])
+                    success, output = future.result()
+                except KeyError as e:
+                    success, output = False, f'Job is missing {e}'
+                except Exception as e:
+                    # e.g. a worker crashed and broke the pool. The client still needs a reply.
+                    success, output = False, f'Job failed: {e!r}'
+                with self.lock:
+                    self.jobs_run += 1
+                    self.jobs_failed += 0 if success else 1
+                conn.send({ RESULT_SUCCESS: success, RESULT_OUTPUT: output })
+
+    def status(self):
+        with self.lock:
+            return f'{self.workers} workers, {self.jobs_run} jobs run, {self.jobs_failed} failed'
+
+
+def wake_listener(address, authkey):
+    try:
+        Client(address, authkey=authkey).close()
+    except OSError:
+        pass
+
+
+def send_job(job, address=SERVER_ADDRESS, authkey: bytes|None=None):
+    """
+    Send a job to a running server and wait for the result.
+    Raises ConnectionRefusedError if no server is running.
+    """
+    with Client(address, authkey=authkey or get_authkey()) as conn:
+        conn.send(job)
+        return conn.recv()
+
+
+if __name__ == "__main__":
+    # Needed for the worker processes when running as a frozen executable
+    multiprocessing.freeze_support()
+
+    # usage is: tbta_export_server.exe (--status | --stop)
+    if '--status' in sys.argv or '--stop' in sys.argv:
+        command = COMMAND_STATUS if '--status' in sys.argv else COMMAND_STOP
+        try:
+            result = send_job({ JOB_COMMAND: command })
+            print(result[RESULT_OUTPUT])
+        except ConnectionRefusedError:
+            print('Server is not running')
+    else:
+        ExportServer().serve()
@@ -0,0 +1,124 @@
+import unittest
+import shutil
+import time
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+from tbta_export_server import *
+from tbta_export_client import get_script, run_script
+
+
+class TestRunJob(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.dir = Path(self.temp_dir.name)
+        shutil.copy('./test_docs/export_to_word/Ibwe Differences.txt', self.dir)
+        self.cwd = os.getcwd()
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.temp_dir.cleanup()
+
+    def test_run_table_export(self):
+        success, output = run_job('tbta_export_to_table', ['tbta_export_to_table', '-c', '-t', 'Ibwe Differences.txt'], str(self.dir))
+        self.assertTrue(success)
+        self.assertIn('Successfully exported', output)
+        self.assertTrue((self.dir / 'Ibwe Differences.docx').exists())
+        self.assertTrue((self.dir / 'Ibwe Differences.txt').exists())
+
+        # The worker goes back to where it was for the next job
+        self.assertEqual(self.cwd, os.getcwd())
+
+    def test_run_deletes_input(self):
+        success, _ = run_job('tbta_export_to_word', ['tbta_export_to_word', 'Ibwe Differences.txt'], str(self.dir))
+        self.assertTrue(success)
+        self.assertTrue((self.dir / 'Ibwe Differences.docx').exists())
+        self.assertFalse((self.dir / 'Ibwe Differences.txt').exists())
+
+    def test_run_error(self):
+        # The error is printed, without a message box that nobody would close
+        with patch('ctypes.windll', create=True) as windll:
+            success, output = run_job('tbta_export_to_table', ['tbta_export_to_table', '-t', 'Missing.txt'], str(self.dir))
+            windll.user32.MessageBoxW.assert_not_called()
+        self.assertFalse(success)
+        self.assertIn('Missing', output)
+        self.assertNotIn(error_utils.NO_DIALOGS_ENV, os.environ)
+
+
+class TestAuthkey(unittest.TestCase):
+
+    def test_authkey(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / 'TBTA' / 'export_server.key'
+            key = get_authkey(path)
+            self.assertEqual(AUTHKEY_SIZE, len(key))
+            self.assertEqual(key, get_authkey(path))
+            if os.name == 'posix':
+                self.assertEqual(0o600, path.stat().st_mode & 0o777)
+
+            # Each user gets their own key
+            self.assertNotEqual(key, get_authkey(Path(temp_dir) / 'Other' / 'export_server.key'))
+
+
+class TestClient(unittest.TestCase):
+
+    def test_script_from_argument(self):
+        script, argv = get_script(['tbta_export_client.exe', 'tbta_export_to_table', '-s', 'file.txt'])
+        self.assertEqual('tbta_export_to_table', script)
+        self.assertListEqual(['tbta_export_client.exe', '-s', 'file.txt'], argv)
+
+    def test_script_from_exe_name(self):
+        script, argv = get_script(['C:/TBTA/tbta_export_to_table.exe', '-s', 'file.txt'])
+        self.assertEqual('tbta_export_to_table', script)
+        self.assertListEqual(['C:/TBTA/tbta_export_to_table.exe', '-s', 'file.txt'], argv)
+
+    def test_unknown_script(self):
+        script, _ = get_script(['tbta_export_client.exe', 'file.txt'])
+        self.assertIsNone(script)
+
+    def test_run_here_without_server(self):
+        for error in (ConnectionRefusedError, EOFError, AuthenticationError):
+            with patch('tbta_export_client.send_job', side_effect=error), patch('tbta_export_to_table.main', return_value=True) as main:
+                self.assertTrue(run_script('tbta_export_to_table', ['tbta_export_to_table', 'file.txt']))
+                main.assert_called_once_with(['tbta_export_to_table', 'file.txt'])
+
+
+class TestServer(unittest.TestCase):
+
+    address = ('localhost', 48621)
+
+    def setUp(self):
+        server = ExportServer(self.address, workers=1, authkey=b'right key')
+        self.thread = threading.Thread(target=server.serve)
+        self.thread.start()
+
+    def tearDown(self):
+        send_job({ JOB_COMMAND: COMMAND_STOP }, self.address, b'right key')
+        self.thread.join()
+
+    def send_job(self, job, authkey=b'right key'):
+        for _ in range(50):
+            try:
+                return send_job(job, self.address, authkey)
+            except ConnectionRefusedError:
+                time.sleep(0.1)     # still starting
+        self.fail('Server did not start')
+
+    def test_wrong_key(self):
+        with self.assertRaises(AuthenticationError):
+            self.send_job({ JOB_COMMAND: COMMAND_STATUS }, b'wrong key')
+
+        # The server is still running for the right key
+        self.assertTrue(self.send_job({ JOB_COMMAND: COMMAND_STATUS })[RESULT_SUCCESS])
+
+    def test_bad_job(self):
+        # A job without all its fields gets a reply rather than closing the connection
+        result = self.send_job({ JOB_SCRIPT: 'tbta_export_to_table' })
+        self.assertFalse(result[RESULT_SUCCESS])
+        self.assertIn(JOB_ARGV, result[RESULT_OUTPUT])
+        self.assertIn('1 failed', self.send_job({ JOB_COMMAND: COMMAND_STATUS })[RESULT_OUTPUT])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,21 @@
 import sys
+import os
 import re
+import math
 from pathlib import Path
+from typing import NamedTuple
+from itertools import accumulate, chain, groupby
+from collections import deque
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
 
 import doc_utils
-from tbta_find_differences import find_differences
+import error_utils
+import output_memo
+import ref_utils
+import text_utils
+from tbta_find_differences import find_differences, get_tokenizer
 
 
 # Parameter Name constants
@@ -12,22 +24,61 @@ PARAM_OUTPUT_PATH = 'output_path'
 PARAM_SPLIT_SENTENCES = 'split_sentences'
 PARAM_NOTES_COLUMN = 'add_notes_column'
 PARAM_COMPARE = 'compare'
+PARAM_PARALLEL = 'parallel'
+PARAM_PARTS = 'parts'
+PARAM_RANGE = 'range'
+PARAM_FORMAT = 'format'
+PARAM_REBUILD = 'rebuild'
 PARAM_TEST = 'test'
 
-# Verse Fields
-VERSE_REF = 'ref'
-VERSE_TEXT = 'text'
 
+class Verse(NamedTuple):
+    ref: str
+    texts: tuple[str, ...]  # one text for each language, in the same order as the language names
 
-def get_params():
-    # usage is: tbta_export_to_table.exe -s -n -c -t "text_file.txt"
+
+def get_params(argv):
+    # usage is: tbta_export_to_table.exe -s -n -c(=2-3,4-5) -p --parts=(chapter|book|500) --range="Gen 1:1-2:25" --format=(docx|html|rtf) --rebuild -t "text_file.txt"
     # The text file path is required
-    do_split = '-S' in sys.argv or '-s' in sys.argv
-    do_notes = '-N' in sys.argv or '-n' in sys.argv
-    do_compare = '-C' in sys.argv or '-c' in sys.argv
-    is_test = '-T' in sys.argv or '-t' in sys.argv
+    do_split = '-S' in argv or '-s' in argv
+    do_notes = '-N' in argv or '-n' in argv
+    do_compare = '-C' in argv or '-c' in argv
+    do_parallel = '-P' in argv or '-p' in argv
+    is_test = '-T' in argv or '-t' in argv
+
+    # The columns to compare can be given as pairs of column numbers, e.g. -c=2-3,4-5
+    compare_arg = next((a for a in argv if a[:3].lower() == '-c='), None)
+    if compare_arg:
+        do_compare = parse_compare_pairs(compare_arg[3:])
+        if not do_compare:
+            show_error(f'Unexpected format for "{compare_arg}". Please list the columns to compare like -c=2-3,4-5')
+            return None
+
+    # Large exports can be split into several documents, e.g. --parts=chapter
+    parts_arg = next((a for a in argv if a.lower().startswith('--parts=')), None)
+    parts = None
+    if parts_arg:
+        parts = doc_utils.parse_parts_arg(parts_arg[len('--parts='):])
+        if not parts:
+            show_error(f'Unexpected format for "{parts_arg}". Please use --parts=chapter, --parts=book, or a number of rows like --parts=500')
+            return None
+
+    # Only some of the verses can be exported, e.g. --range="Gen 1:1-2:25"
+    range_arg, ref_range = ref_utils.get_range_arg(argv)
+    if range_arg and not ref_range:
+        show_error(f'Unexpected format for "{range_arg}". {ref_utils.RANGE_ERROR}')
+        return None
 
-    non_flag_args = [a for a in sys.argv if not a.startswith('-')]
+    # Tables that only need to be read can be made much more quickly as HTML or RTF, e.g. --format=html
+    format_arg = next((a for a in argv if a.lower().startswith('--format=')), None)
+    doc_format = doc_utils.FORMAT_DOCX
+    if format_arg:
+        doc_format = doc_utils.parse_format_arg(format_arg[len('--format='):])
+        if not doc_format:
+            show_error(f'Unexpected format for "{format_arg}". Please use --format=docx, --format=html or --format=rtf')
+            return None
+
+    non_flag_args = [a for a in argv if not a.startswith('-')]
 
     if len(non_flag_args) < 2:
         show_error('Please specify a .txt file to import')
@@ -41,131 +92,389 @@ def get_params():
 
     return {
         PARAM_INPUT_PATH: file_path,
-        PARAM_OUTPUT_PATH: file_path.with_name(f'{file_path.stem}.docx'),
+        PARAM_OUTPUT_PATH: file_path.with_name(file_path.stem + doc_utils.get_format_suffix(doc_format)),
         PARAM_SPLIT_SENTENCES: do_split,
         PARAM_NOTES_COLUMN: do_notes,
         PARAM_COMPARE: do_compare,
+        PARAM_PARALLEL: do_parallel,
+        PARAM_PARTS: parts,
+        PARAM_RANGE: ref_range,
+        PARAM_FORMAT: doc_format,
+        PARAM_REBUILD: '--rebuild' in argv,
         PARAM_TEST: is_test,
     }
 
 
-def import_text(input_path):
-    verses = []
-    language_names = []
+def parse_compare_pairs(text):
+    """
+    Parse column pairs like '2-3,4-5' (numbered from 1 in the order of the text file) into a list of
+    (old_index, new_index) tuples, numbered from 0. Returns None if the format is unexpected.
+    """
+    pairs = []
+    for pair in text.split(','):
+        match = re.fullmatch(r'\s*(\d+)\s*-\s*(\d+)\s*', pair)
+        if not match or '0' in (match[1], match[2]) or match[1] == match[2]:
+            return None
+        pairs.append((int(match[1]) - 1, int(match[2]) - 1))
+    return pairs
+
+
+def get_compare_pairs(compare, num_languages):
+    # By default, compare the last two texts
+    if compare is True:
+        return [(num_languages - 2, num_languages - 1)] if num_languages >= 2 else None
+    if not compare or any(col >= num_languages for pair in compare for col in pair):
+        return None
+    return compare
+
+
+def import_text(input_path, ref_range=None):
+    """
+    Returns (verses, language_names), where verses is a generator that reads the verses from the text file as they come.
+    The language names are taken from the first verse, which is read straight away.
+    If a RefRange is given, only the verses in it are read.
+    """
+    return get_verses(read_verse_texts(input_path, ref_range))
+
+
+def get_verses(verse_texts):
+    """
+    Same as import_text(), but for the (ref, [(language_name, text)]) of each verse from read_verse_texts() or parse_verse_texts().
+    """
+    first_verse = next(verse_texts, None)
+
+    # set the language names (all verses will have the same languages, in the same order)
+    language_names = [lang_name for lang_name, _ in first_verse[1]] if first_verse else []
+    lang_indices = {lang_name: idx for idx, lang_name in enumerate(language_names)}
+
+    def make_verses():
+        if not first_verse:
+            return
+        for ref, texts in chain([first_verse], verse_texts):
+            verse_texts_by_index = [''] * len(language_names)
+            for lang_name, text in texts:
+                if lang_name in lang_indices:
+                    verse_texts_by_index[lang_indices[lang_name]] = text
+            yield Verse(ref, tuple(verse_texts_by_index))
+
+    return (make_verses(), language_names)
+
+
+def read_verse_texts(input_path, ref_range=None):
+    """
+    Yields (ref, [(language_name, text)]) for each verse in the text file.
+    Each verse is yielded as soon as the next verse reference (or the end of the file) is reached.
+    """
+    print(f'Importing text from "{input_path}"')
+
+    with text_utils.open_text(input_path) as file:
+        yield from parse_verse_texts(file, ref_range)
+
 
+def parse_verse_texts(lines, ref_range=None):
+    """
+    Same as read_verse_texts(), but for lines of text that have already been read.
+    The texts of verses that aren't in the range are skipped without being matched.
+    """
     VERSE_REF_REGEX = re.compile(r'.+? [\d:]+')
     VERSE_TEXT_REGEX = re.compile(r'(.+?):(.*)')
 
-    print(f'Importing text from "{input_path}"')
-
-    # TODO handle utf-16-le again?
-    with input_path.open(encoding='utf-8-sig', newline='\n') as file:
-        for line in file:
-            # The line ending seems to be inconsistent, so strip all whitespace at the end before doing anything
-            line = line.strip()
-            if not line:
-                # a blank line separates each verse
+    ref, texts = None, []
+    num_verses = 0
+
+    for line in lines:
+        # The line ending seems to be inconsistent, so strip all whitespace at the end before doing anything
+        line = line.strip()
+        if not line:
+            # a blank line separates each verse
+            continue
+        
+        ref_match = VERSE_REF_REGEX.fullmatch(line)
+        if ref_match:
+            if ref:
+                yield (ref, texts)
+            ref, texts = ref_match[0], []
+            if ref_range and not ref_range.contains_ref(ref):
+                ref = None
                 continue
-            
-            ref_match = VERSE_REF_REGEX.fullmatch(line)
-            text_match = VERSE_TEXT_REGEX.fullmatch(line)
-            if ref_match:
-                verses.append({ VERSE_REF: ref_match[0], VERSE_TEXT: {} })
+            num_verses += 1
 
-            elif text_match:
-                lang_name = text_match[1]
-                lang_text = text_match[2]
-                verses[-1][VERSE_TEXT][lang_name] = lang_text.strip()
+        elif ref:
+            text_match = VERSE_TEXT_REGEX.fullmatch(line)
+            if text_match:
+                texts.append((text_match[1], text_match[2].strip()))
 
-                # set the language names (all verses will have the same languages, in the same order)
-                if len(verses) == 1:
-                    language_names.append(lang_name)
+    if ref:
+        yield (ref, texts)
 
-    print(f'Retrieved {len(verses)} verses')
-    return (verses, language_names)
+    print(f'Retrieved {num_verses} verses')
 
 
 SENTENCE_REGEX = re.compile(r'([^.?!]+[.?!]\S*) ?')
 def split_verse_sentences(verses):
     for full_verse in verses:
         yield full_verse
-        sentences_by_lang = {lang: SENTENCE_REGEX.findall(text) for lang, text in full_verse[VERSE_TEXT].items()}
+        sentences_by_lang = [SENTENCE_REGEX.findall(text) for text in full_verse.texts]
+
+        # Add a row for each group of aligned sentences. Where a sentence in one language
+        # was combined or split up in another, the sentences are put in the same row.
+        for line_num, texts in enumerate(align_verse_sentences(sentences_by_lang)):
+            yield Verse(f'{full_verse.ref}:{line_num+1}', texts)
+
+
+def align_verse_sentences(sentences_by_lang):
+    """
+    Line up the sentences of each language, and return the text of each row (one text per language).
+    Every language is aligned against the one with the most sentences, and the rows are only
+    split where every language agrees. A sentence that has no match in another language is
+    given its own row, with a blank in the other language to notify the user.
+    """
+    pivot_idx = max(range(len(sentences_by_lang)), key=lambda idx: len(sentences_by_lang[idx]), default=0)
+    if not sentences_by_lang or not sentences_by_lang[pivot_idx]:
+        return []
+    pivot = sentences_by_lang[pivot_idx]
+
+    # Find where each language allows a row to end (as a number of pivot sentences)
+    beads_by_lang = []
+    row_ends = set(range(1, len(pivot) + 1))
+    for lang_idx, sentences in enumerate(sentences_by_lang):
+        beads = [(1, 1)] * len(pivot) if lang_idx == pivot_idx else align_sentences(pivot, sentences)
+        beads_by_lang.append(beads)
+        row_ends.intersection_update(accumulate(pivot_count for pivot_count, _ in beads))
+
+    # Put the sentences of each language into the rows
+    rows = [[] for _ in row_ends]
+    row_ends = sorted(row_ends)
+    for sentences, beads in zip(sentences_by_lang, beads_by_lang):
+        row_idx, pivot_i, i = 0, 0, 0
+        row_sentences = []
+        for pivot_count, count in beads:
+            row_sentences.extend(sentences[i:i+count])
+            pivot_i += pivot_count
+            i += count
+            if pivot_i == row_ends[row_idx]:
+                rows[row_idx].append(' '.join(row_sentences))
+                row_sentences = []
+                row_idx += 1
+
+    return [tuple(row) for row in rows]
+
+
+# Gale & Church (1993) parameters: the prior probability of each bead (pivot sentences, other sentences),
+# and the variance of the length of the other text compared to the pivot text.
+ALIGNMENT_BEAD_PRIORS = {
+    (1, 1): 0.89,
+    (1, 0): 0.0099,
+    (0, 1): 0.0099,
+    (2, 1): 0.089,
+    (1, 2): 0.089,
+}
+ALIGNMENT_VARIANCE = 6.8
+ALIGNMENT_BAND = 3
+def align_sentences(pivot, other):
+    """
+    Align two lists of sentences using the Gale-Church length-based method, and return a list of
+    beads (pivot_count, other_count). Every pivot sentence is in exactly one bead with at least one
+    pivot sentence in it, so any unmatched sentences in the other language are joined to a neighbour.
+    Only alignments near the diagonal are considered, so the time is linear in the number of sentences.
+    """
+    n, m = len(pivot), len(other)
+    if not m:
+        return [(1, 0)] * n
+
+    pivot_lens = [len(s) for s in pivot]
+    other_lens = [len(s) for s in other]
+
+    # Some languages need more characters than others, so compare lengths relative to the whole verse
+    ratio = sum(other_lens) / max(sum(pivot_lens), 1) or 1
+
+    band = ALIGNMENT_BAND + abs(n - m)
+    infinity = float('inf')
+    costs = [[infinity] * (m + 1) for _ in range(n + 1)]
+    back = [[None] * (m + 1) for _ in range(n + 1)]
+    costs[0][0] = 0
+    for i in range(n + 1):
+        diagonal = i * m // n
+        for j in range(max(0, diagonal - band), min(m, diagonal + band) + 1):
+            if i == 0 and j == 0:
+                continue
+            for bead, prior in ALIGNMENT_BEAD_PRIORS.items():
+                di, dj = bead
+                if di > i or dj > j or costs[i-di][j-dj] == infinity:
+                    continue
+                cost = costs[i-di][j-dj] + bead_cost(sum(pivot_lens[i-di:i]), sum(other_lens[j-dj:j]), ratio, prior)
+                if cost < costs[i][j]:
+                    costs[i][j] = cost
+                    back[i][j] = bead
+
+    # Backtrack to find the beads, from start to end
+    beads = []
+    i, j = n, m
+    while i > 0 or j > 0:
+        di, dj = back[i][j]
+        beads.append((di, dj))
+        i -= di
+        j -= dj
+    beads.reverse()
+
+    # Join any sentences that have no pivot sentence to the bead before (or after, at the start)
+    joined_beads = []
+    extra = 0
+    for di, dj in beads:
+        if di == 0 and joined_beads:
+            joined_beads[-1] = (joined_beads[-1][0], joined_beads[-1][1] + dj)
+        elif di == 0:
+            extra += dj
+        else:
+            joined_beads.append((di, dj + extra))
+            extra = 0
+    return joined_beads
 
-        # Some sentences in either language may be combined so it may
-        # not correspond exactly, but an empty line should notify the
-        # user of the issue and not mess up the sentence alignment
-        num_lines = max([len(sentences) for _, sentences in sentences_by_lang.items()])
-        for _, sentences in sentences_by_lang.items():
-            sentences.extend([''] * (num_lines - len(sentences)))
 
-        # Add a row for each sentence
-        for line_num in range(num_lines):
-            yield {
-                VERSE_REF: f'{full_verse[VERSE_REF]}:{line_num+1}',
-                VERSE_TEXT: {lang: sentences[line_num] for lang, sentences in sentences_by_lang.items()},
-            }
+def bead_cost(pivot_len, other_len, ratio, prior):
+    # The cost is -log(probability) of the bead given how well the lengths match
+    mean = (pivot_len + other_len / ratio) / 2
+    if mean == 0:
+        return -math.log(prior)
+    delta = (pivot_len * ratio - other_len) / math.sqrt(mean * ALIGNMENT_VARIANCE)
+    match_prob = max(math.erfc(abs(delta) / math.sqrt(2)), 1e-300)
+    return -math.log(prior) - math.log(match_prob)
 
 
 def export_table(verses, language_names, params):
     print(f'Creating Word document with table rows...')
 
+    if params[PARAM_COMPARE] and not get_compare_pairs(params[PARAM_COMPARE], len(language_names)):
+        show_error(f'Unable to compare the columns, as there are only {len(language_names)} texts to compare')
+        return False
+
+    if params[PARAM_PARTS]:
+        return export_table_parts(verses, language_names, params)
+
     (col_names, col_widths) = calculate_columns(language_names, params)
-    table_data = []
+    header_row = [{ 'text': name, 'bold': True } for name in col_names]
 
-    # Add the headers
-    table_data.append([{ 'text': name, 'bold': True } for name in col_names])
+    doc = doc_utils.create_doc(landscape=True, my=2, mx=1.5, doc_format=params[PARAM_FORMAT])
 
-    # Add rows for each verse
-    for verse in verses:
-        verse_row = []
-        verse_row.append(verse[VERSE_REF])
+    if params[PARAM_PARALLEL]:
+        with ProcessPoolExecutor() as executor:
+            rendered_parts = chain([doc_utils.render_table_rows([header_row], col_widths, params[PARAM_FORMAT])],
+                render_chapters(executor, verses, params, col_widths, language_names))
+            doc_utils.add_rendered_table(doc, rendered_parts, col_widths)
+    else:
+        table_data = chain([header_row], get_verse_rows(verses, params, language_names))
+        doc_utils.add_table(doc, table_data, col_widths)
+
+    return save_document(doc, params)
+
+
+def export_table_parts(verses, language_names, params):
+    # Keep the sentence rows in the same part as their verse
+    verse_groups = (list(group) for _, group in groupby(verses, key=lambda verse: ':'.join(verse.ref.split(':')[:2])))
+    parts = doc_utils.split_parts(verse_groups, params[PARAM_PARTS], get_ref=lambda group: group[0].ref, get_size=len)
+
+    # Each part is built in its own process, so the parts themselves are built in the usual way
+    part_params = { **params, PARAM_PARTS: None, PARAM_PARALLEL: False }
+    export_part = partial(export_table_part, language_names=language_names, params=part_params)
+    return doc_utils.export_parts(parts, params[PARAM_OUTPUT_PATH], export_part, get_ref=lambda group: group[0].ref)
 
-        if params[PARAM_COMPARE]:
-            # Compare the last two texts
-            *other, old, new = language_names
-            verse_row.extend(verse[VERSE_TEXT][lang_name] or '' for lang_name in other)
 
-            old_runs, new_runs = compare_text(verse[VERSE_TEXT][old], verse[VERSE_TEXT][new])
-            verse_row.extend([old_runs, new_runs])
+def export_table_part(verse_groups, part_path, language_names, params):
+    # This is run in a worker process
+    params = { **params, PARAM_OUTPUT_PATH: part_path }
+    if not export_table(chain.from_iterable(verse_groups), language_names, params):
+        return None
+    return params[PARAM_OUTPUT_PATH]
+
+
+def get_verse_rows(verses, params, language_names=None):
+    compare_pairs = None
+    for ref, texts in verses:
+        verse_row = [ref]
+
+        if params[PARAM_COMPARE]:
+            if compare_pairs is None:
+                compare_pairs = get_compare_pairs(params[PARAM_COMPARE], len(texts))
+            verse_row.extend(compare_texts(texts, compare_pairs, language_names))
         else:
-            verse_row.extend(verse[VERSE_TEXT][lang_name] or '' for lang_name in language_names)
+            verse_row.extend(texts)
+
+        yield verse_row
+
 
-        table_data.append(verse_row)
+def render_chapters(executor, verses, params, col_widths, language_names=None):
+    """
+    Build the rows for each chapter in a separate process, and yield the rendered rows in order.
+    Only a few chapters are read ahead at a time, so the whole text is never held in memory.
+    """
+    max_pending = 2 * (os.cpu_count() or 1)
+    pending = deque()
+    for _, chapter_verses in groupby(verses, key=lambda verse: get_chapter(verse.ref)):
+        pending.append(executor.submit(render_verse_rows, list(chapter_verses), params, col_widths, language_names))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
 
-    doc = doc_utils.create_doc(landscape=True, my=2, mx=1.5)
-    doc_utils.add_table(doc, table_data, col_widths)
+    while pending:
+        yield pending.popleft().result()
 
-    return save_document(doc, params[PARAM_OUTPUT_PATH])
+
+def render_verse_rows(verses, params, col_widths, language_names=None):
+    # This is run in a worker process
+    return doc_utils.render_table_rows(get_verse_rows(verses, params, language_names), col_widths, params[PARAM_FORMAT])
+
+
+def get_chapter(ref):
+    # The reference is in the format {book} {chapter}:{verse}(:{sentence})
+    book, _, numbers = ref.rpartition(' ')
+    return (book, numbers.split(':')[0])
 
 
 def compare_text(old, new):
-    old_runs, old_i = [], 0
-    new_runs, new_i = [], 0
+    old_runs, new_runs = compare_texts((old, new), [(0, 1)])
+    return (old_runs, new_runs)
+
+
+def compare_texts(texts, compare_pairs, language_names=None):
+    """
+    Compare each (old_index, new_index) pair of texts, and return the runs for each text with the differences formatted.
+    A text can be in more than one pair (e.g. old->intermediate->new), in which case the differences from every pair are shown.
+    Texts that aren't compared are returned as they are.
+    Each text is split into words the way its language is set up to be, if the language names are given.
+    """
+    # Split each text into tokens only once, even if it is in more than one pair
+    compared_cols = {col for pair in compare_pairs for col in pair}
+    tokens = {col: get_tokenizer(language_names[col] if language_names else None).split(texts[col]) for col in compared_cols}
+    diff_ranges = {col: [] for col in compared_cols}
+
+    for old_col, new_col in compare_pairs:
+        for diff in find_differences(texts[old_col], texts[new_col], old_tokens=tokens[old_col], new_tokens=tokens[new_col]):
+            diff_ranges[old_col].append(diff.old_indices)
+            diff_ranges[new_col].append(diff.new_indices)
+
+    return [format_differences(text, diff_ranges[col]) if col in compared_cols else text for col, text in enumerate(texts)]
+
+
+def format_differences(text, diff_ranges):
+    runs, text_i = [], 0
 
     diff_format = { 'bold': True, 'red': True }
 
-    for diff in find_differences(old, new):
-        (old_start, old_end) = diff.old_indices
-        (new_start, new_end) = diff.new_indices
-
-        if old_start > old_i:
-            old_runs.append({ 'text': old[old_i:old_start] })
-        if old_start != old_end:
-            old_runs.append({ 'text': old[old_start:old_end], **diff_format })
-        old_i = old_end
-
-        if new_start > new_i:
-            new_runs.append({ 'text': new[new_i:new_start] })
-        if new_start != new_end:
-            new_runs.append({ 'text': new[new_start:new_end], **diff_format })
-        new_i = new_end
-    
-    if old_i < len(old):
-        old_runs.append({ 'text': old[old_i:] })
-    if new_i < len(new):
-        new_runs.append({ 'text': new[new_i:] })
-    
-    return (old_runs, new_runs)
+    for start, end in sorted(diff_ranges):
+        if end <= text_i and start < text_i:
+            # already covered by a difference from another pair
+            continue
+        start = max(start, text_i)
+
+        if start > text_i:
+            runs.append({ 'text': text[text_i:start] })
+        if start != end:
+            runs.append({ 'text': text[start:end], **diff_format })
+        text_i = end
+
+    if text_i < len(text):
+        runs.append({ 'text': text[text_i:] })
+
+    return runs
 
 
 def calculate_columns(languages, params):
@@ -191,28 +500,69 @@ def calculate_columns(languages, params):
     return (col_names, col_widths)
 
 
-def save_document(doc, path:Path):
+def save_document(doc, params):
     try:
-        doc.save(str(path))
-        print(f'Successfully exported "{path}"')
+        params[PARAM_OUTPUT_PATH] = doc_utils.save_document(doc, params[PARAM_OUTPUT_PATH])
+        print(f'Successfully exported "{params[PARAM_OUTPUT_PATH]}"')
         return True
     except PermissionError:
-        show_error(f'"{path.name}" is currently open. Please close and try again.')
+        show_error(f'"{params[PARAM_OUTPUT_PATH].name}" is currently open. Please close and try again.')
         return False
 
 
 def show_error(text):
     print("Error: " + text)
-    import ctypes  
-    ctypes.windll.user32.MessageBoxW(0, text, "Error Creating Word Document", 0 + 16)
+    error_utils.show_error_dialog(text)
 
 
-if __name__ == "__main__":
-    params = get_params()
-    if params:
-        verses, language_names = import_text(params[PARAM_INPUT_PATH])
+def get_memo_options(params):
+    # Everything apart from the text itself that changes the table
+    return {
+        'script': 'tbta_export_to_table',
+        'split': params[PARAM_SPLIT_SENTENCES],
+        'notes': params[PARAM_NOTES_COLUMN],
+        'compare': params[PARAM_COMPARE],
+        'parts': params[PARAM_PARTS],
+        'range': params[PARAM_RANGE],
+        'format': params[PARAM_FORMAT],
+    }
+
+
+def get_saved_paths(params, output_path):
+    """
+    The files that were made for the output path, or [] if any of them had to be saved with another name because the usual one was open.
+    """
+    if params[PARAM_PARTS]:
+        return doc_utils.get_part_paths(output_path)
+    return [output_path] if params[PARAM_OUTPUT_PATH] == output_path else []
+
+
+def main(argv):
+    params = get_params(argv)
+    if not params:
+        return False
+
+    # If the same text was already exported with the same options, the table is left as it is
+    output_path = params[PARAM_OUTPUT_PATH]
+    memo = output_memo.get_memo(output_path, [params[PARAM_INPUT_PATH]], get_memo_options(params))
+    unchanged_paths = None if params[PARAM_REBUILD] else output_memo.find_unchanged(memo)
+    if unchanged_paths:
+        print(f'"{params[PARAM_INPUT_PATH].name}" has not changed since "{unchanged_paths[0].name}" was made, so it was not exported again')
+    else:
+        verses, language_names = import_text(params[PARAM_INPUT_PATH], params[PARAM_RANGE])
         if params[PARAM_SPLIT_SENTENCES]:
             verses = split_verse_sentences(verses)
-        if export_table(verses, language_names, params) and not params[PARAM_TEST]:
-            print(f'Deleting {params[PARAM_INPUT_PATH]}')
-            params[PARAM_INPUT_PATH].unlink()   # delete the original text file
+        if not export_table(verses, language_names, params):
+            return False
+        output_memo.save_memo(memo, get_saved_paths(params, output_path))
+
+    if not params[PARAM_TEST]:
+        print(f'Deleting {params[PARAM_INPUT_PATH]}')
+        params[PARAM_INPUT_PATH].unlink()   # delete the original text file
+    return True
+
+
+if __name__ == "__main__":
+    # Needed for the worker processes when running as a frozen executable
+    multiprocessing.freeze_support()
+    main(sys.argv)
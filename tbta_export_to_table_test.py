@@ -1,44 +1,62 @@
 import unittest
+import tempfile
+import zipfile
 from pathlib import Path
+from docx import Document
 from tbta_export_to_table import *
+import doc_utils
+import ref_utils
 
-# TODO redo tests
+TWO_LANGUAGES = """
+Ruth 1:1
+English: Title: Elimelech and Naomi move from Bethlehem to Moab. When judges were ruling Israel, there was a famine in Israel.
+Gichuka: Taĩto: Erimereki na Naomi kũthama Bethireemu kũthiĩ Moabu. Rĩrĩa aciirithania ma-thaga Iciraeri, kwa-rĩ na ng'aragu.
 
-def setup_params(file_name, split=False, notes=False, compare=False):
-    file_path = Path('./test/' + file_name)
-    return {
-        PARAM_INPUT_PATH: file_path,
-        PARAM_OUTPUT_PATH: file_path.with_name(f'{file_path.stem}.docx'),
-        PARAM_SPLIT_SENTENCES: split,
-        PARAM_NOTES_COLUMN: notes,
-        PARAM_COMPARE: compare,   #TODO test compare functionality
-    }
+Ruth 1:2
+English: The man's name was Elimelech. His wife's name was Naomi.
+
+Ruth 1:3
+Gichuka: Ĩndĩ Erimereki a-kuire.
+
+Ruth 1:4
+
+Ruth 1:5
+Gichuka: Maaloni na Kirioni nao makua.
+English: Then Mahlon and Kilion also died.
+Tagalog: Pagkatapos ay namatay din sina Mahlon at Kilion.
+
+Matthew 4:6
+English: The devil said, “It is written that God will command his angels to protect you.” Footnote: See Psalms 91:11-12.
+Tagalog: Sinabi ng diyablo, “Nakasulat na uutusan ng Diyos ang kanyang mga anghel.” Talababa: Makita ninyong Mga Awit 91:11-12.
+"""
 
 
 class VerseTestCase(unittest.TestCase):
 
+    def importLines(self, text):
+        (verses, language_names) = get_verses(parse_verse_texts(text.splitlines()))
+        return (list(verses), language_names)
+
     def findVerse(self, verses, ref):
         for verse in verses:
-            if verse[VERSE_REF] == ref:
-                return verse[VERSE_TEXT]
+            if verse.ref == ref:
+                return verse
+        self.fail(f'{ref} not found')
 
-    # def assertRefEqual(self, verse, expected):
-    #     self.assertEqual(expected, verse[VERSE_REF])
-
-    def assertVerseEqual(self, text, ref, expected):
-        self.assertEqual(expected, text, f'{ref} not as expected')
+    def assertVerseEqual(self, verse, lang_index, expected):
+        self.assertEqual(expected, verse.texts[lang_index], f'{verse.ref} not as expected')
 
     def assertVerseEmpty(self, verse, lang_index):
-        self.assertEqual('', verse[VERSE_TEXT][lang_index], f'{verse[VERSE_REF]} should be empty')
+        self.assertEqual('', verse.texts[lang_index], f'{verse.ref} should be empty')
 
     def assertVerseNotEmpty(self, verse, lang_index):
-        self.assertNotEqual('', verse[VERSE_TEXT][lang_index], f'{verse[VERSE_REF]} should not be empty')
+        self.assertNotEqual('', verse.texts[lang_index], f'{verse.ref} should not be empty')
 
     def assertVerseStartswith(self, verse, lang_index, expected):
-        self.assertTrue(verse[VERSE_TEXT][lang_index].startswith(expected), f'{verse[VERSE_REF]} not as expected')
+        self.assertTrue(verse.texts[lang_index].startswith(expected), f'{verse.ref} not as expected')
 
     def assertVerseEndswith(self, verse, lang_index, expected):
-        self.assertTrue(verse[VERSE_TEXT][lang_index].endswith(expected), f'{verse[VERSE_REF]} not as expected')
+        self.assertTrue(verse.texts[lang_index].endswith(expected), f'{verse.ref} not as expected')
 
     def assertContains(self, text, expected):
         self.assertTrue(expected in text)
@@ -47,177 +65,315 @@ class VerseTestCase(unittest.TestCase):
 class TestTwoLanguagesSimple(VerseTestCase):
 
     def test_all_english_all_target(self):
-        params = setup_params('Ruth 1 w English.txt')
-        (verses, language_names) = import_for_table(params)
+        (verses, language_names) = self.importLines(TWO_LANGUAGES)
 
         self.assertListEqual(['English', 'Gichuka'], language_names)
+        self.assertEqual(6, len(verses))
 
-        self.assertIsNotNone(verses)
-        self.assertEqual(22, len(verses))
-
-        (_, target) = self.findVerse(verses, 'Ruth 1:1')
-        self.assertStartswith(target, "Title: Erimereki na Naomi kuuma Bethireemu kũthiĩ Moabu. Rĩrĩa aciirithania ma-thaga Iciraeri")
-        self.assertContains(target, 'Footnote')
-
-        verse = self.findVerse(verses, 'Ruth 1:10')
-        self.assertVerseEqual(verse, 0, "Then Naomi's daughters-in-law said to her, “We'll certainly go to your people with you.”")
+        verse = self.findVerse(verses, 'Ruth 1:1')
+        self.assertEqual(2, len(verse.texts))
+        self.assertVerseStartswith(verse, 0, 'Title: Elimelech and Naomi move from Bethlehem to Moab.')
+        self.assertVerseStartswith(verse, 1, 'Taĩto: Erimereki na Naomi kũthama Bethireemu kũthiĩ Moabu.')
+        self.assertContains(verse.texts[1], "ng'aragu")
 
     def test_all_english_some_target(self):
-        params = setup_params('Genesis 1-2 Ibwe and English.txt')
-        (_, verses) = import_for_table(params)
-
-        self.assertIsNotNone(verses)
-        self.assertEqual(56, len(verses))
+        (verses, _) = self.importLines(TWO_LANGUAGES)
 
-        (english, target) = self.findVerse(verses, 'Genesis 1:21')
-        self.assertRefEqual(target, 'Genesis 1:21')
-        self.assertVerseEmpty(target)
-        self.assertVerseNotEmpty(english)
+        verse = self.findVerse(verses, 'Ruth 1:2')
+        self.assertVerseEqual(verse, 0, "The man's name was Elimelech. His wife's name was Naomi.")
+        self.assertVerseEmpty(verse, 1)
 
     def test_some_english_some_target(self):
-        params = setup_params('Genesis 1-2 Ibwe and English both missing.txt')
-        (_, verses) = import_for_table(params)
-
-        self.assertIsNotNone(verses)
-        self.assertEqual(56, len(verses))
-
-        # both missing in 1:22
-        (english, target) = self.findVerse(verses, 'Genesis 1:22')
-        self.assertRefEqual(target, 'Genesis 1:22')
-        self.assertVerseEmpty(target)
-        self.assertVerseEmpty(english)
-
-        # only english missing in 2:5
-        (english, target) = self.findVerse(verses, 'Genesis 2:5')
-        self.assertRefEqual(target, 'Genesis 2:5')
-        self.assertVerseStartswith(target, "Title: Adam wan Hawa bagana di Eden. Pada jaman nang")
-        self.assertVerseEmpty(english)
-
-        # both present again in 2:22
-        (english, target) = self.findVerse(verses, 'Genesis 2:22')
-        self.assertRefEqual(target, 'Genesis 2:22')
-        self.assertVerseStartswith(target, "Lalu Allah Al Khalik maulah bibinian")
-        self.assertVerseStartswith(english, "Then the LORD God made a woman")
+        (verses, _) = self.importLines(TWO_LANGUAGES)
 
-    def test_some_target_some_other(self):
-        params = setup_params('Esther 1 w Tagalog.txt')
-        (_, verses) = import_for_table(params)
+        # only english missing in 1:3
+        verse = self.findVerse(verses, 'Ruth 1:3')
+        self.assertVerseEmpty(verse, 0)
+        self.assertVerseEqual(verse, 1, 'Ĩndĩ Erimereki a-kuire.')
 
-        self.assertIsNotNone(verses)
-        self.assertEqual(22, len(verses))
+        # both missing in 1:4
+        verse = self.findVerse(verses, 'Ruth 1:4')
+        self.assertVerseEmpty(verse, 0)
+        self.assertVerseEmpty(verse, 1)
 
-        # tagalog missing in 1:10
-        (target, tagalog) = self.findVerse(verses, 'Eciteri 1:10')
-        self.assertVerseNotEmpty(target)
-        self.assertVerseEmpty(tagalog)
+    def test_some_target_some_other(self):
+        (verses, _) = self.importLines(TWO_LANGUAGES)
 
-        # both missing in 1:12
-        (target, tagalog) = self.findVerse(verses, 'Eciteri 1:12')
-        self.assertVerseEmpty(target)
-        self.assertVerseEmpty(tagalog)
+        # the texts are put in the order of the first verse, and other languages are left out
+        verse = self.findVerse(verses, 'Ruth 1:5')
+        self.assertTupleEqual(('Then Mahlon and Kilion also died.', 'Maaloni na Kirioni nao makua.'), verse.texts)
 
-        # target missing in 1:22
-        (target, tagalog) = self.findVerse(verses, 'Eciteri 1:22')
-        self.assertVerseEmpty(target)
-        self.assertVerseNotEmpty(tagalog)
+        verse = self.findVerse(verses, 'Matthew 4:6')
+        self.assertVerseNotEmpty(verse, 0)
+        self.assertVerseEmpty(verse, 1)
 
     def test_footnote_with_verse_ref(self):
-        params = setup_params('Matthew 4 Tagalog and English.txt', footnote='Talababa:')
-        (_, verses) = import_for_table(params)
+        (verses, language_names) = self.importLines(TWO_LANGUAGES.replace('Gichuka', 'Tagalog', 1))
+        self.assertListEqual(['English', 'Tagalog'], language_names)
 
-        self.assertIsNotNone(verses)
-        self.assertEqual(25, len(verses))
-
-        # footnote with verse reference is handled correctly
-        (english, tagalog) = self.findVerse(verses, 'Matthew 4:6')
-        self.assertVerseEndswith(tagalog, 'Talababa: Makita ninyong Mga Awit 91:11-12.')
-        self.assertVerseEndswith(english, 'Footnote: See Psalms 91:11-12.')
+        # a footnote with a verse reference doesn't start a new verse
+        self.assertEqual('Matthew 4:6', verses[-1].ref)
+        self.assertVerseEndswith(verses[-1], 0, 'Footnote: See Psalms 91:11-12.')
+        self.assertVerseEndswith(verses[-1], 1, 'Talababa: Makita ninyong Mga Awit 91:11-12.')
 
 
 class TestThreeLanguagesSimple(VerseTestCase):
 
     def test_all_three(self):
-        params = setup_params('Esther 1 Triple.txt')
-        (_, verses) = import_for_table(params)
-
-        self.assertIsNotNone(verses)
-        self.assertEqual(22, len(verses))
+        (verses, language_names) = import_text(Path('./test_docs/export_to_word/Gichuka Differences.txt'))
+        verses = list(verses)
 
-        (english, target, third) = self.findVerse(verses, 'Esther 1:1')
-        self.assertVerseStartswith(english, "Title: King Xerxes")
-        self.assertRefEqual(target, 'Eciteri 1:1')
-        self.assertVerseStartswith(target, "Title: Cakceci akĩthũra")
-        self.assertRefEqual(third, 'Esther 1:1')
-        self.assertVerseStartswith(third, "Pamagat: Nagalit")
+        self.assertListEqual(['English', 'Old Gichuka', 'New Gichuka'], language_names)
+        self.assertEqual(30, len(verses))
 
-        (_, target, third) = self.findVerse(verses, 'Esther 1:6')
-        self.assertVerseContains(target, 'Footnote:')
-        self.assertVerseStartswith(third, "Bago pumunta")
+        verse = self.findVerse(verses, 'Ruthu 1:1')
+        self.assertVerseStartswith(verse, 0, 'Title: Elimelech and Naomi move from Bethlehem to Moab.')
+        self.assertVerseNotEmpty(verse, 1)
+        self.assertNotEqual(verse.texts[1], verse.texts[2])
 
-        (english, target, third) = self.findVerse(verses, 'Esther 1:22')
-        self.assertVerseStartswith(english, "King Xerxes sent letters")
-        self.assertVerseStartswith(target, "Cakceci a-tũmire barũa")
-        self.assertVerseStartswith(third, "Nagpadala si Haring Xerxes")
+        # the text is in decomposed form, so check the last verse by position
+        verse = verses[-1]
+        self.assertVerseStartswith(verse, 0, 'After Noah was born, Lamech lived')
+        self.assertVerseStartswith(verse, 1, 'Nuu ag')
+        self.assertVerseStartswith(verse, 2, 'Nuu ag')
 
     def test_all_three_missing_some(self):
-        params = setup_params('Esther 1 Triple some missing.txt')
-        (_, verses) = import_for_table(params)
-
-        self.assertIsNotNone(verses)
-        self.assertEqual(22, len(verses))
-
-        # third language missing
-        (english, target, third) = self.findVerse(verses, 'Esther 1:1')
-        self.assertVerseStartswith(english, "Title: King Xerxes")
-        self.assertVerseStartswith(target, "Title: Cakceci akĩthũra")
-        self.assertVerseEmpty(third)
-
-        # english missing
-        (english, target, third) = self.findVerse(verses, 'Esther 1:4')
-        self.assertVerseEmpty(english)
-        self.assertVerseStartswith(target, "Kabinda ka ntukũ ĩgana")
-        self.assertVerseStartswith(third, "Sa loob ng 180 araw")
-
-        # target missing
-        (english, target, third) = self.findVerse(verses, 'Esther 1:5')
-        self.assertVerseStartswith(english, "After that feast ended")
-        self.assertVerseEmpty(target)
-        self.assertVerseStartswith(third, "Matapos ang pistang iyon")
-
-        # target and third missing
-        (english, target, third) = self.findVerse(verses, 'Esther 1:10')
-        self.assertVerseStartswith(english, "After seven days")
-        self.assertVerseEmpty(target)
-        self.assertVerseEmpty(third)
+        (verses, _) = import_text(Path('./test_docs/export_to_word/Gichuka Differences.txt'))
+        verses = list(verses)
+
+        # english missing in Proverbs
+        for ref in ('Nthumo 4:7', 'Nthumo 4:20', 'Nthumo 5:11'):
+            verse = self.findVerse(verses, ref)
+            self.assertVerseEmpty(verse, 0)
+            self.assertVerseNotEmpty(verse, 1)
+            self.assertVerseNotEmpty(verse, 2)
 
         # all present again
-        (english, target, third) = self.findVerse(verses, 'Esther 1:11')
-        self.assertVerseStartswith(english, "Then King Xerxes")
-        self.assertVerseStartswith(target, "Cakceci a-thire")
-        self.assertVerseStartswith(third, "Pagkatapos")
+        verse = verses[verses.index(self.findVerse(verses, 'Nthumo 5:11')) + 1]
+        self.assertVerseStartswith(verse, 0, 'That evening and that morning')
+        self.assertVerseStartswith(verse, 1, '<Literal Alternate: ')
+        self.assertVerseStartswith(verse, 2, '<Literal Alternate: ')
 
 
 class TestTwoLanguagesSplitSentences(VerseTestCase):
 
     def test_split_none_missing(self):
-        params = setup_params('Ruth 1 w English.txt', split=True)
-        (_, verses) = import_for_table(params)
-
-        self.assertIsNotNone(verses)
-        verses = list(verses)   # verses is returned as a generator but we need a list here
-        self.assertEqual(101, len(verses))
-
-        (_, target) = self.findVerse(verses, 'Ruth 1:1')
-        self.assertVerseNotEmpty(target)
-        self.assertVerseStartswith(target, "Title: Erimereki na Naomi kuuma Bethireemu kũthiĩ Moabu. Rĩrĩa aciirithania ma-thaga Iciraeri")
-
-        (english, target) = self.findVerse(verses, 'Ruth 1:1:5')
-        self.assertRefEqual(target, 'Ruthu 1:1:5')
-        self.assertVerseStartswith(target, 'Footnote:')
-        self.assertVerseEmpty(english)
+        (verses, _) = self.importLines(TWO_LANGUAGES)
+        verses = list(split_verse_sentences(iter(verses)))
+
+        verse = self.findVerse(verses, 'Ruth 1:1')
+        self.assertVerseStartswith(verse, 1, 'Taĩto: Erimereki na Naomi kũthama Bethireemu kũthiĩ Moabu.')
+
+        verse = self.findVerse(verses, 'Ruth 1:1:1')
+        self.assertVerseEqual(verse, 0, 'Title: Elimelech and Naomi move from Bethlehem to Moab.')
+        self.assertVerseEqual(verse, 1, 'Taĩto: Erimereki na Naomi kũthama Bethireemu kũthiĩ Moabu.')
+
+        # a sentence that is missing in one language is left empty
+        verse = self.findVerse(verses, 'Ruth 1:2:2')
+        self.assertVerseEqual(verse, 0, "His wife's name was Naomi.")
+        self.assertVerseEmpty(verse, 1)
+
+        # nothing to split in an empty verse
+        self.assertNotIn('Ruth 1:4:1', [verse.ref for verse in verses])
+
+class TestImportText(unittest.TestCase):
+
+    def test_verses_are_streamed(self):
+        (verses, language_names) = import_text(Path('./test_docs/export_to_word/Ibwe Differences.txt'))
+        self.assertNotIsInstance(verses, list)
+        self.assertListEqual(['English', 'Old Ibwe', 'New Ibwe'], language_names)
+
+        first_verse = next(verses)
+        self.assertEqual('Markus 1:19', first_verse.ref)
+        self.assertEqual(3, len(first_verse.texts))
+        self.assertTrue(first_verse.texts[2].startswith('Lalu Nabi Isa tarus bajalan'))
+
+        self.assertEqual(18, len(list(verses)))
+
+    def test_split_sentences(self):
+        (verses, _) = import_text(Path('./test_docs/export_to_word/Ibwe Differences.txt'))
+        verses = split_verse_sentences(verses)
+        full_verse = next(verses)
+        self.assertEqual('Markus 1:19', full_verse.ref)
+        first_sentence = next(verses)
+        self.assertEqual('Markus 1:19:1', first_sentence.ref)
+        self.assertEqual('Then Jesus continued walking and saw James and his brother John.', first_sentence.texts[0])
+
+    def test_range(self):
+        (verses, language_names) = import_text(Path('./test_docs/export_to_word/Ibwe Differences.txt'), ref_utils.parse_range('Markus 3-5'))
+        self.assertListEqual(['English', 'Old Ibwe', 'New Ibwe'], language_names)
+        self.assertListEqual(['Markus 3:17', 'Markus 3:18', 'Markus 3:33', 'Markus 5:37'], [verse.ref for verse in verses])
+
+
+class TestAlignSentences(unittest.TestCase):
+
+    def test_same_number_of_sentences(self):
+        english = ['Then Jesus continued walking.', 'He saw James and his brother John.']
+        target = ['Lalu Nabi Isa tarus bajalan.', 'Inya malihat Yakobus wan adingnya Yahya.']
+        rows = align_verse_sentences([english, target])
+        self.assertListEqual(list(zip(english, target)), rows)
+
+    def test_combined_sentence(self):
+        english = ['Title: Jesus calls Levi.', 'While Jesus was walking, he saw Levi, who was Alphaeus\' son.', 'So Levi stood up.', 'And he followed Jesus.']
+        target = ['Judul: Nabi Isa mangiau Lewi.', 'Wayah Nabi Isa bajalan, Sidin malihat Lewi, nang anak Alfius.', 'Maka badiri ai Lewi lalu maumpati Nabi Isa.']
+        rows = align_verse_sentences([english, target])
+        self.assertEqual(3, len(rows))
+        self.assertEqual(('So Levi stood up. And he followed Jesus.', 'Maka badiri ai Lewi lalu maumpati Nabi Isa.'), rows[2])
+
+    def test_missing_sentence(self):
+        english = ['Javan had sons named Elisha and Tarshish.', 'There were also the people of Kittim and Rodanim.']
+        target = []
+        rows = align_verse_sentences([english, target])
+        self.assertListEqual([(english[0], ''), (english[1], '')], rows)
+
+    def test_three_languages(self):
+        english = ['Joseph wanted to live in Judea.', 'But he was afraid to go there.', 'So Joseph went to Galilee.']
+        old = ['Yusup handak bagana di Yudia, tagal inya takutan tulak ka sana.', 'Maka Yusup tulakan ka Galilea.']
+        new = ['Yusup handak bagana di Yudia.', 'Tagal inya takutan tulak ka sana.', 'Maka Yusup tulakan ka Galilea.']
+        rows = align_verse_sentences([english, old, new])
+        self.assertEqual(2, len(rows))
+        self.assertEqual('Joseph wanted to live in Judea. But he was afraid to go there.', rows[0][0])
+        self.assertEqual('Yusup handak bagana di Yudia. Tagal inya takutan tulak ka sana.', rows[0][2])
+        self.assertTupleEqual(('So Joseph went to Galilee.', old[1], new[2]), rows[1])
+
+    def test_empty(self):
+        self.assertListEqual([], align_verse_sentences([[], []]))
+
+
+class TestCompare(unittest.TestCase):
+
+    def test_parse_compare_pairs(self):
+        self.assertListEqual([(1, 2), (3, 4)], parse_compare_pairs('2-3,4-5'))
+        self.assertListEqual([(0, 1), (1, 2)], parse_compare_pairs('1-2, 2-3'))
+        self.assertIsNone(parse_compare_pairs('2'))
+        self.assertIsNone(parse_compare_pairs('0-1'))
+        self.assertIsNone(parse_compare_pairs('2-2'))
+
+    def test_get_compare_pairs(self):
+        self.assertListEqual([(1, 2)], get_compare_pairs(True, 3))
+        self.assertListEqual([(0, 2)], get_compare_pairs([(0, 2)], 3))
+        self.assertIsNone(get_compare_pairs([(0, 3)], 3))
+        self.assertIsNone(get_compare_pairs(True, 1))
+
+    def test_default_pair_matches_compare_text(self):
+        english = 'Then Jesus saw James and John.'
+        old = 'Lalu Nabi Isa malihat Yakobus wan Yahya.'
+        new = 'Lalu Nabi Isa malihat Yakobus tu wan Yahya tu.'
+        (old_runs, new_runs) = compare_text(old, new)
+        self.assertListEqual([english, old_runs, new_runs], compare_texts((english, old, new), get_compare_pairs(True, 3)))
+        self.assertEqual(old, ''.join(run['text'] for run in old_runs))
+        self.assertFalse(any(run.get('bold') for run in old_runs))
+        self.assertEqual(new, ''.join(run['text'] for run in new_runs))
+        self.assertListEqual(['tu', 'tu'], [run['text'].strip() for run in new_runs if run.get('bold')])
+
+    def test_three_way_compare(self):
+        old = 'Lalu Nabi Isa malihat Yakobus.'
+        intermediate = 'Lalu Nabi Isa tarus malihat Yakobus.'
+        new = 'Lalu Nabi Isa tarus bajalan.'
+        (old_runs, intermediate_runs, new_runs) = compare_texts((old, intermediate, new), [(0, 1), (1, 2)])
+
+        # The intermediate text shows the differences from both the old and the new text
+        bold_text = [run['text'].strip() for run in intermediate_runs if run.get('bold')]
+        self.assertListEqual(['tarus', 'malihat Yakobus'], bold_text)
+        self.assertEqual(intermediate, ''.join(run['text'] for run in intermediate_runs))
+        self.assertEqual(old, ''.join(run['text'] for run in old_runs))
+        self.assertListEqual(['bajalan'], [run['text'].strip() for run in new_runs if run.get('bold')])
+
+    def test_compare_with_split_sentences(self):
+        (verses, language_names) = import_text(Path('./test_docs/export_to_word/Ibwe Differences.txt'))
+        params = { PARAM_COMPARE: [(1, 2)] }
+        rows = list(get_verse_rows(split_verse_sentences(verses), params))
+
+        # Markus 1:19 has a difference in the second sentence only
+        self.assertEqual('Markus 1:19:2', rows[2][0])
+        self.assertTrue(any(run.get('bold') for run in rows[2][3]))
+        self.assertFalse(any(run.get('bold') for run in rows[1][3]))
+
+
+class TestParallelExport(unittest.TestCase):
+
+    def export_document_xml(self, file_name, parallel, **kwargs):
+        input_path = Path('./test_docs/export_to_word/' + file_name)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            params = {
+                PARAM_INPUT_PATH: input_path,
+                PARAM_OUTPUT_PATH: Path(temp_dir) / f'{input_path.stem}.docx',
+                PARAM_SPLIT_SENTENCES: False,
+                PARAM_NOTES_COLUMN: False,
+                PARAM_COMPARE: False,
+                PARAM_PARALLEL: parallel,
+                PARAM_PARTS: None,
+                PARAM_FORMAT: doc_utils.FORMAT_DOCX,
+                **kwargs,
+            }
+            (verses, language_names) = import_text(input_path)
+            if params[PARAM_SPLIT_SENTENCES]:
+                verses = split_verse_sentences(verses)
+            self.assertTrue(export_table(verses, language_names, params))
+            with zipfile.ZipFile(params[PARAM_OUTPUT_PATH]) as docx:
+                return docx.read('word/document.xml')
+
+    def test_parallel_matches_serial(self):
+        serial = self.export_document_xml('Gichuka Differences.txt', parallel=False, **{ PARAM_NOTES_COLUMN: True })
+        parallel = self.export_document_xml('Gichuka Differences.txt', parallel=True, **{ PARAM_NOTES_COLUMN: True })
+        self.assertEqual(serial, parallel)
+
+    def test_parallel_matches_serial_compare(self):
+        serial = self.export_document_xml('Ibwe Differences.txt', parallel=False, **{ PARAM_COMPARE: True })
+        parallel = self.export_document_xml('Ibwe Differences.txt', parallel=True, **{ PARAM_COMPARE: True })
+        self.assertEqual(serial, parallel)
+
+    def test_parallel_matches_serial_split(self):
+        serial = self.export_document_xml('Ibwe Differences.txt', parallel=False, **{ PARAM_SPLIT_SENTENCES: True })
+        parallel = self.export_document_xml('Ibwe Differences.txt', parallel=True, **{ PARAM_SPLIT_SENTENCES: True })
+        self.assertEqual(serial, parallel)
+
+    def test_parallel_matches_serial_html(self):
+        input_path = Path('./test_docs/export_to_word/Ibwe Differences.txt')
+        outputs = []
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for parallel in (False, True):
+                params = get_params(['', '-c', '-n', '-t', '--format=html', str(input_path)])
+                params[PARAM_OUTPUT_PATH] = Path(temp_dir) / f'{parallel}.html'
+                params[PARAM_PARALLEL] = parallel
+                (verses, language_names) = import_text(input_path)
+                self.assertTrue(export_table(verses, language_names, params))
+                outputs.append(params[PARAM_OUTPUT_PATH].read_text(encoding='utf-8'))
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertIn('<td>Markus 1:19</td>', outputs[0])
+        self.assertIn('<span style="color: red"><b>', outputs[0])
+
+
+class TestExportParts(unittest.TestCase):
+
+    def test_parts_by_chapter(self):
+        input_path = Path('./test_docs/export_to_word/Gichuka Differences.txt')
+        with tempfile.TemporaryDirectory() as temp_dir:
+            params = {
+                PARAM_INPUT_PATH: input_path,
+                PARAM_OUTPUT_PATH: Path(temp_dir) / 'Gichuka Differences.docx',
+                PARAM_SPLIT_SENTENCES: True,
+                PARAM_NOTES_COLUMN: False,
+                PARAM_COMPARE: True,
+                PARAM_PARALLEL: False,
+                PARAM_PARTS: doc_utils.PARTS_CHAPTER,
+                PARAM_FORMAT: doc_utils.FORMAT_DOCX,
+            }
+            (verses, language_names) = import_text(input_path)
+            verses = list(split_verse_sentences(verses))
+            self.assertTrue(export_table(iter(verses), language_names, params))
+
+            # A part for each chapter, each with its own header row, and every row in one of them
+            chapters = list(dict.fromkeys(get_chapter(verse.ref) for verse in verses))
+            part_paths = [doc_utils.get_part_path(params[PARAM_OUTPUT_PATH], num + 1) for num in range(len(chapters))]
+            row_counts = [len(Document(str(part_path)).tables[0].rows) - 1 for part_path in part_paths]
+            self.assertEqual(len(verses), sum(row_counts))
+            self.assertFalse(doc_utils.get_part_path(params[PARAM_OUTPUT_PATH], len(chapters) + 1).exists())
+
+            index = (Path(temp_dir) / 'Gichuka Differences.docx.index').read_text(encoding='utf-8').splitlines()
+            self.assertEqual(len(chapters), len(index))
+            self.assertEqual('Gichuka Differences - part 1.docx: Ruthu 1:1', index[0])
 
-        (english, _) = self.findVerse(verses, 'Ruth 1:21:5')
-        self.assertVerseNotEmpty(english)
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -1,65 +1,280 @@
 import sys
+import os
+import re
+import glob
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import multiprocessing
 import doc_utils
+import error_utils
+import output_memo
+import ref_utils
+import text_utils
 
 # Parameter Name constants
 PARAM_INPUT_PATH = 'input_path'
+PARAM_INPUT_PATHS = 'input_paths'
 PARAM_OUTPUT_PATH = 'output_path'
+PARAM_PARTS = 'parts'
+PARAM_FORMAT = 'format'
+PARAM_REBUILD = 'rebuild'
+PARAM_RANGE = 'range'
 PARAM_TEST = 'test'
 
-def get_params():
-    # usage is: tbta_export_to_word.exe (-t) "text_file.txt"
-    is_test = '-T' in sys.argv or '-t' in sys.argv
-    
-    non_flag_args = [a for a in sys.argv if not a.startswith('-')]
+def get_params(argv):
+    # usage is: tbta_export_to_word.exe (-t) (--parts=(chapter|book|500)) (--range="Gen 1:1-2:25") (--format=(docx|html|rtf)) (--rebuild) "text_file.txt" ("text_file2.txt" "folder" "Ruth *.txt" ...)
+    is_test = '-T' in argv or '-t' in argv
+
+    # Large exports can be split into several documents, e.g. --parts=chapter
+    parts_arg = next((a for a in argv if a.lower().startswith('--parts=')), None)
+    parts = None
+    if parts_arg:
+        parts = doc_utils.parse_parts_arg(parts_arg[len('--parts='):])
+        if not parts:
+            show_error(f'Unexpected format for "{parts_arg}". Please use --parts=chapter, --parts=book, or a number of paragraphs like --parts=500')
+            return None
+
+    # Only some of the verses can be exported, e.g. --range="Gen 1:1-2:25"
+    range_arg, ref_range = ref_utils.get_range_arg(argv)
+    if range_arg and not ref_range:
+        show_error(f'Unexpected format for "{range_arg}". {ref_utils.RANGE_ERROR}')
+        return None
+
+    # Documents that only need to be read can be made much more quickly as HTML or RTF, e.g. --format=html
+    format_arg = next((a for a in argv if a.lower().startswith('--format=')), None)
+    doc_format = doc_utils.FORMAT_DOCX
+    if format_arg:
+        doc_format = doc_utils.parse_format_arg(format_arg[len('--format='):])
+        if not doc_format:
+            show_error(f'Unexpected format for "{format_arg}". Please use --format=docx, --format=html or --format=rtf')
+            return None
+
+    non_flag_args = [a for a in argv if not a.startswith('-')]
 
     # The text file path is required
     if len(non_flag_args) < 2:
         show_error('Please specify a .txt file to import')
         return None
 
-    file_name = sys.argv[-1]
-    file_path = Path(file_name).with_suffix('.txt')
-    if not file_path.exists():
-        show_error(f'Specified File "{file_name}" does not exist...')
+    # Any number of files can be given, as well as folders or wildcard patterns that match several files
+    file_paths = []
+    for file_name in non_flag_args[1:]:
+        if any(char in file_name for char in '*?['):
+            file_paths.extend(sorted(Path(match) for match in glob.glob(file_name) if match.lower().endswith('.txt')))
+        elif Path(file_name).is_dir():
+            file_paths.extend(sorted(Path(file_name).glob('*.txt')))
+        else:
+            file_path = Path(file_name).with_suffix('.txt')
+            if not file_path.exists():
+                show_error(f'Specified File "{file_name}" does not exist...')
+                return None
+            file_paths.append(file_path)
+
+    if not file_paths:
+        show_error(f'No .txt files found in "{" ".join(non_flag_args[1:])}"')
         return None
 
+    return {
+        PARAM_INPUT_PATHS: list(dict.fromkeys(file_paths)),   # remove duplicates but keep the order
+        PARAM_PARTS: parts,
+        PARAM_RANGE: ref_range,
+        PARAM_FORMAT: doc_format,
+        PARAM_REBUILD: '--rebuild' in argv,
+        PARAM_TEST: is_test,
+    }
+
+
+def get_file_params(file_path, is_test, parts=None, ref_range=None, doc_format=doc_utils.FORMAT_DOCX, rebuild=False):
     return {
         PARAM_INPUT_PATH: file_path,
-        PARAM_OUTPUT_PATH: file_path.with_name(f'{file_path.stem}.docx'),
+        PARAM_OUTPUT_PATH: file_path.with_name(file_path.stem + doc_utils.get_format_suffix(doc_format)),
+        PARAM_PARTS: parts,
+        PARAM_RANGE: ref_range,
+        PARAM_FORMAT: doc_format,
+        PARAM_REBUILD: rebuild,
         PARAM_TEST: is_test,
     }
 
 
 def export_text(params):
+    """
+    Returns None if the document was saved, otherwise the error text.
+    """
     print(f'Creating Word document from "{params[PARAM_INPUT_PATH]}"...')
-    doc = doc_utils.create_doc()
 
-    # TODO handle utf-16-le again?
-    with params[PARAM_INPUT_PATH].open(encoding='utf-8-sig', newline='\n') as file:
-        for line in file:
-            # Split the text into runs based on asterisks
-            runs = [{ 'text': t, 'highlight': i % 2 == 1 } for i, t in enumerate(line.strip().split('*'))]
-            doc_utils.add_paragraph(doc, runs)
+    with text_utils.open_text(params[PARAM_INPUT_PATH]) as file:
+        lines = filter_lines(file, params[PARAM_RANGE]) if params[PARAM_RANGE] else file
+        if params[PARAM_PARTS]:
+            return export_parts(lines, params)
+        return export_lines(lines, params)
+
+
+def export_lines(lines, params):
+    """
+    Same as export_text(), but for lines of text that have already been read.
+    """
+    doc = doc_utils.create_doc(doc_format=params[PARAM_FORMAT])
+    for line in lines:
+        # Split the text into runs based on asterisks
+        runs = [{ 'text': t, 'highlight': i % 2 == 1 } for i, t in enumerate(line.strip().split('*'))]
+        doc_utils.add_paragraph(doc, runs)
 
     try:
-        doc.save(str(params[PARAM_OUTPUT_PATH]))
+        params[PARAM_OUTPUT_PATH] = doc_utils.save_document(doc, params[PARAM_OUTPUT_PATH])
         print(f'Successfully exported "{params[PARAM_OUTPUT_PATH]}"')
-        return True
+        return None
     except PermissionError:
-        show_error(f'"{params[PARAM_OUTPUT_PATH].name}" is currently open. Please close and try again.')
-        return False
+        return f'"{params[PARAM_OUTPUT_PATH].name}" is currently open. Please close and try again.'
+
+
+VERSE_REF_REGEX = re.compile(r'[^:]+? \d+:\d+')
+def get_blocks(lines):
+    """
+    Yields (ref, lines) for each block of lines, where blocks are separated by blank lines.
+    The ref is from the first line that starts with a verse reference, or None (e.g. for headings).
+    """
+    block, ref = [], None
+    for line in lines:
+        if line.strip() and block and not block[-1].strip():
+            yield (ref, block)
+            block, ref = [], None
+        block.append(line)
+        if ref is None:
+            ref_match = VERSE_REF_REGEX.match(line.lstrip('\ufeff'))
+            ref = ref_match[0] if ref_match else None
+    if block:
+        yield (ref, block)
+
+
+def filter_lines(lines, ref_range):
+    """
+    Yields only the lines of the verses in the range. A heading is kept if the verse after it is in the range,
+    and anything before the first verse (e.g. the languages and the book name) is always kept.
+    """
+    headings = []
+    seen_verse = False
+    for ref, block_lines in get_blocks(lines):
+        if ref is None:
+            if seen_verse:
+                headings.extend(block_lines)
+            else:
+                yield from block_lines
+            continue
+        seen_verse = True
+        if ref_range.contains_ref(ref):
+            yield from headings
+            yield from block_lines
+        headings = []
+
+
+def export_parts(lines, params):
+    """
+    Same as export_lines(), but split into several documents. Returns None if they were all saved, otherwise the error text.
+    """
+    get_ref = lambda block: block[0]
+    parts = doc_utils.split_parts(get_blocks(lines), params[PARAM_PARTS], get_ref, get_size=lambda block: len(block[1]))
+    export_part = partial(export_lines_part, params={ **params, PARAM_PARTS: None })
+    if not doc_utils.export_parts(parts, params[PARAM_OUTPUT_PATH], export_part, get_ref):
+        return f'Unable to save all of the parts of "{params[PARAM_OUTPUT_PATH].name}"'
+    return None
+
+
+def export_lines_part(blocks, part_path, params):
+    # This is run in a worker process
+    params = { **params, PARAM_OUTPUT_PATH: part_path }
+    error = export_lines((line for _, block_lines in blocks for line in block_lines), params)
+    if error:
+        print('Error: ' + error)
+        return None
+    return params[PARAM_OUTPUT_PATH]
+
+
+def export_file(params):
+    """
+    Export one text file, and delete it if that worked (unless in test mode).
+    If the same text was already exported with the same options, the document is left as it is (unless rebuilding).
+    Returns None if successful, otherwise the error text.
+    """
+    output_path = params[PARAM_OUTPUT_PATH]
+    memo = output_memo.get_memo(output_path, [params[PARAM_INPUT_PATH]], get_memo_options(params))
+    unchanged_paths = None if params[PARAM_REBUILD] else output_memo.find_unchanged(memo)
+    if unchanged_paths:
+        print(f'"{params[PARAM_INPUT_PATH].name}" has not changed since "{unchanged_paths[0].name}" was made, so it was not exported again')
+    else:
+        try:
+            error = export_text(params)
+        except Exception as e:
+            error = f'{type(e).__name__}: {e}'
+        if error:
+            return error
+        output_memo.save_memo(memo, get_saved_paths(params, output_path))
+
+    if not params[PARAM_TEST]:
+        print(f'Deleting {params[PARAM_INPUT_PATH]}')
+        params[PARAM_INPUT_PATH].unlink()   # delete the original text file
+    return None
+
+
+def get_saved_paths(params, output_path):
+    """
+    The files that were made for the output path, or [] if any of them had to be saved with another name because the usual one was open.
+    """
+    if params[PARAM_PARTS]:
+        return doc_utils.get_part_paths(output_path)
+    return [output_path] if params[PARAM_OUTPUT_PATH] == output_path else []
+
+
+def get_memo_options(params):
+    # Everything apart from the text itself that changes the document
+    return { 'script': 'tbta_export_to_word', 'parts': params[PARAM_PARTS], 'range': params[PARAM_RANGE], 'format': params[PARAM_FORMAT] }
+
+
+def export_batch(file_paths, is_test, parts=None, ref_range=None, doc_format=doc_utils.FORMAT_DOCX, rebuild=False):
+    """
+    Export several text files at once, each in a worker process.
+    Returns a list of (file_path, error text or None) in the same order as the files.
+    """
+    all_params = [get_file_params(file_path, is_test, parts, ref_range, doc_format, rebuild) for file_path in file_paths]
+    with ProcessPoolExecutor(max_workers=min(len(all_params), os.cpu_count() or 1), initializer=doc_utils.init_save_worker) as executor:
+        errors = list(executor.map(export_file, all_params))
+    return list(zip(file_paths, errors))
+
+
+def show_summary(results):
+    failed = [(file_path, error) for file_path, error in results if error]
+    print(f'\nExported {len(results) - len(failed)} of {len(results)} files')
+    for file_path, error in results:
+        print(f'  {"FAILED" if error else "OK"}: {file_path.name}' + (f' - {error}' if error else ''))
+
+    if failed:
+        show_error(f'{len(failed)} of {len(results)} files could not be exported:\n' + '\n'.join(f'{file_path.name}: {error}' for file_path, error in failed))
 
 
 def show_error(text):
     print("Error: " + text)
-    import ctypes  
-    ctypes.windll.user32.MessageBoxW(0, text, "Error Creating Word Document", 0 + 16)
+    error_utils.show_error_dialog(text)
+
+
+def main(argv):
+    params = get_params(argv)
+    if not params:
+        return False
+
+    file_paths = params[PARAM_INPUT_PATHS]
+    if len(file_paths) == 1:
+        error = export_file(get_file_params(file_paths[0], params[PARAM_TEST], params[PARAM_PARTS], params[PARAM_RANGE], params[PARAM_FORMAT], params[PARAM_REBUILD]))
+        if error:
+            show_error(error)
+            return False
+        return True
+
+    results = export_batch(file_paths, params[PARAM_TEST], params[PARAM_PARTS], params[PARAM_RANGE], params[PARAM_FORMAT], params[PARAM_REBUILD])
+    show_summary(results)
+    return all(error is None for _, error in results)
 
 
 if __name__ == "__main__":
-    params = get_params()
-    if params:
-        if export_text(params) and not params[PARAM_TEST]:
-            print(f'Deleting {params[PARAM_INPUT_PATH]}')
-            params[PARAM_INPUT_PATH].unlink()   # delete the original text file
+    # Needed for the worker processes when running as a frozen executable
+    multiprocessing.freeze_support()
+    main(sys.argv)
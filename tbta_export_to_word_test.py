@@ -0,0 +1,221 @@
+import os
+import unittest
+import shutil
+import tempfile
+import zipfile
+from pathlib import Path
+from unittest.mock import patch
+from tbta_export_to_word import *
+import ref_utils
+
+FILE_NAMES = ['Ruth 1 - Tagalog.txt', 'Ruth 1 w English.txt', 'Esther 1 w English.txt']
+
+
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.dir = Path(self.temp_dir.name)
+        for file_name in FILE_NAMES:
+            shutil.copy('./test_docs/export_to_word/' + file_name, self.dir)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_params(self):
+        # A folder, a wildcard pattern, and a file can all be given, and each file is only exported once
+        params = get_params(['', '-t', str(self.dir), str(self.dir / 'Ruth*.txt'), str(self.dir / 'Ruth 1 - Tagalog')])
+        self.assertEqual(sorted(self.dir / name for name in FILE_NAMES), params[PARAM_INPUT_PATHS])
+        self.assertTrue(params[PARAM_TEST])
+
+    def test_batch(self):
+        self.assertTrue(main(['', str(self.dir)]))
+        for file_name in FILE_NAMES:
+            self.assertTrue((self.dir / file_name).with_suffix('.docx').exists())
+            self.assertFalse((self.dir / file_name).exists())
+        # No temporary files are left behind, just the documents and their memo files
+        expected_names = [f'{Path(file_name).stem}.docx{suffix}' for file_name in FILE_NAMES for suffix in ('', '.memo')]
+        self.assertEqual(sorted(expected_names), sorted(path.name for path in self.dir.iterdir()))
+
+    def test_batch_test_mode(self):
+        self.assertTrue(main(['', '-t', str(self.dir / '*.txt')]))
+        for file_name in FILE_NAMES:
+            self.assertTrue((self.dir / file_name).with_suffix('.docx').exists())
+            self.assertTrue((self.dir / file_name).exists())
+
+    def test_batch_failure(self):
+        # Something in the way of one output file
+        (self.dir / 'Ruth 1 w English.docx').mkdir()
+        results = export_batch(sorted(self.dir.glob('*.txt')), is_test=False)
+
+        errors = { file_path.name: error for file_path, error in results }
+        self.assertIsNotNone(errors['Ruth 1 w English.txt'])
+        self.assertIsNone(errors['Ruth 1 - Tagalog.txt'])
+        self.assertIsNone(errors['Esther 1 w English.txt'])
+
+        # Only the files that were exported are deleted
+        self.assertTrue((self.dir / 'Ruth 1 w English.txt').exists())
+        self.assertFalse((self.dir / 'Ruth 1 - Tagalog.txt').exists())
+
+
+class TestParts(unittest.TestCase):
+
+    def test_parts_by_chapter(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            input_path = Path(temp_dir) / 'Genesis 1-2 Ibwe and English.txt'
+            shutil.copy('./test_docs/export_to_word/Genesis 1-2 Ibwe and English.txt', input_path)
+            # A part left from an earlier export with more parts
+            old_part_path = Path(temp_dir) / 'Genesis 1-2 Ibwe and English - part 3.docx'
+            old_part_path.write_bytes(b'old part')
+            self.assertTrue(main(['', '--parts=chapter', str(input_path)]))
+
+            self.assertFalse(input_path.exists())
+            self.assertFalse(old_part_path.exists())
+            self.assertFalse((Path(temp_dir) / 'Genesis 1-2 Ibwe and English.docx').exists())
+            index = (Path(temp_dir) / 'Genesis 1-2 Ibwe and English.docx.index').read_text(encoding='utf-8').splitlines()
+            self.assertEqual([
+                'Genesis 1-2 Ibwe and English - part 1.docx: Genesis 1:1 - Genesis 1:31',
+                'Genesis 1-2 Ibwe and English - part 2.docx: Genesis 2:1 - Genesis 2:25',
+            ], index)
+
+            # The index isn't taken for another text file to export
+            shutil.copy('./test_docs/export_to_word/Ruth 1 w English.txt', temp_dir)
+            self.assertEqual([Path(temp_dir) / 'Ruth 1 w English.txt'], get_params(['', '-t', temp_dir])[PARAM_INPUT_PATHS])
+
+    def test_blocks(self):
+        lines = ['Heading\n', '\n', 'Title: A title\n', 'Ruth 1:1 Text\n', 'Ruth 1:1 Teks\n', '\n', '\n', 'Ruth 1:2 Text\n']
+        self.assertEqual([
+            (None, ['Heading\n', '\n']),
+            ('Ruth 1:1', ['Title: A title\n', 'Ruth 1:1 Text\n', 'Ruth 1:1 Teks\n', '\n', '\n']),
+            ('Ruth 1:2', ['Ruth 1:2 Text\n']),
+        ], list(get_blocks(lines)))
+
+
+class TestRange(unittest.TestCase):
+
+    def test_filter_lines(self):
+        # Anything before the first verse is kept, and headings go with the verse after them
+        lines = ['Languages\n', '\n', 'Ruth 1:1 Text\n', '\n', 'Heading\n', '\n', 'Ruth 1:2 Text\n', '\n', 'Heading 2\n', '\n', 'Ruth 2:1 Text\n']
+        self.assertEqual(['Languages\n', '\n', 'Heading\n', '\n', 'Ruth 1:2 Text\n', '\n'],
+            list(filter_lines(lines, ref_utils.parse_range('Ruth 1:2-5'))))
+        self.assertEqual(['Languages\n', '\n'], list(filter_lines(lines, ref_utils.parse_range('Esther 1'))))
+
+    def test_params(self):
+        params = get_params(['', '--range=Ruth 1:5-10', './test_docs/export_to_word/Ruth 1 w English.txt'])
+        self.assertEqual(ref_utils.RefRange('Ruth', (1, 5), (1, 10)), params[PARAM_RANGE])
+
+    def test_export_range(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            input_path = Path(temp_dir) / 'Ruth 1 w English.txt'
+            shutil.copy('./test_docs/export_to_word/Ruth 1 w English.txt', input_path)
+            self.assertTrue(main(['', '-t', '--range=Ruth 1:5-10', str(input_path)]))
+
+            xml = zipfile.ZipFile(input_path.with_suffix('.docx')).read('word/document.xml').decode('utf-8')
+            self.assertNotIn('Ruth 1:4', xml)
+            self.assertIn('Ruth 1:5', xml)
+            self.assertIn('Ruth 1:10', xml)
+            self.assertNotIn('Ruth 1:11', xml)
+
+    def test_formats(self):
+        # The same text can be exported as HTML or RTF instead of a Word document
+        with tempfile.TemporaryDirectory() as temp_dir:
+            input_path = Path(temp_dir) / 'Ruth 1 w English.txt'
+            shutil.copy('./test_docs/export_to_word/Ruth 1 w English.txt', input_path)
+            self.assertTrue(main(['', '-t', '--format=html', str(input_path)]))
+            self.assertTrue(main(['', '-t', '--format=rtf', str(input_path)]))
+            self.assertIn('Ruth 1:1', input_path.with_suffix('.html').read_text(encoding='utf-8'))
+            self.assertIn('Ruth 1:1', input_path.with_suffix('.rtf').read_text(encoding='ascii'))
+            self.assertFalse(input_path.with_suffix('.docx').exists())
+
+
+class TestMemo(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.input_path = Path(self.temp_dir.name) / 'Ruth 1 w English.txt'
+        shutil.copy('./test_docs/export_to_word/Ruth 1 w English.txt', self.input_path)
+        self.output_path = self.input_path.with_suffix('.docx')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def export(self, *flags):
+        with patch('tbta_export_to_word.export_text', wraps=export_text) as mock_export:
+            self.assertTrue(main(['', '-t', *flags, str(self.input_path)]))
+            return mock_export.called
+
+    def test_unchanged(self):
+        self.assertTrue(self.export())
+        self.assertTrue(self.input_path.with_name('Ruth 1 w English.docx.memo').exists())
+
+        # The same text isn't exported again, but the document is touched
+        os.utime(self.output_path, (0, 0))
+        self.assertFalse(self.export())
+        self.assertGreater(self.output_path.stat().st_mtime, 0)
+
+        # Unless it's rebuilt, the options are different, the text changes, or the document is gone
+        self.assertTrue(self.export('--rebuild'))
+        self.assertTrue(self.export('--range=Ruth 1:1-5'))
+        self.assertFalse(self.export('--range=Ruth 1:1-5'))
+        self.input_path.write_text(self.input_path.read_text(encoding='utf-8-sig') + '\nRuth 1:23 More text\n', encoding='utf-8')
+        self.assertTrue(self.export('--range=Ruth 1:1-5'))
+        self.output_path.unlink()
+        self.assertTrue(self.export('--range=Ruth 1:1-5'))
+
+    def test_saved_as_other_name(self):
+        self.assertTrue(self.export())
+        self.input_path.write_text(self.input_path.read_text(encoding='utf-8-sig') + '\nRuth 1:23 More text\n', encoding='utf-8')
+
+        # The document is open, so the new one is saved as "(2)" and the old one is out of date
+        real_replace = os.replace
+        def replace(src, dst):
+            if Path(dst) == self.output_path:
+                raise PermissionError(dst)
+            real_replace(src, dst)
+        with patch('doc_utils.os.replace', side_effect=replace), patch('doc_utils.time.sleep'):
+            self.assertTrue(self.export())
+        self.assertTrue(self.input_path.with_name('Ruth 1 w English (2).docx').exists())
+        self.assertFalse(self.input_path.with_name('Ruth 1 w English.docx.memo').exists())
+
+        # So the next export makes it again
+        self.assertTrue(self.export())
+
+    def test_input_deleted(self):
+        # The text file is still deleted when the document didn't need to be made again
+        self.assertTrue(self.export())
+        self.assertTrue(main(['', str(self.input_path)]))
+        self.assertFalse(self.input_path.exists())
+        self.assertTrue(self.output_path.exists())
+
+    def test_fixed_time(self):
+        # With a fixed time, the same text always makes exactly the same document
+        with patch.dict(os.environ, { doc_utils.FIXED_TIME_ENV: '1700000000' }):
+            self.export()
+            first = self.output_path.read_bytes()
+            self.export('--rebuild')
+            self.assertEqual(first, self.output_path.read_bytes())
+            with zipfile.ZipFile(self.output_path) as docx:
+                self.assertEqual({ (2023, 11, 14, 22, 13, 20) }, { info.date_time for info in docx.infolist() })
+                self.assertIn(b'2023-11-14T22:13:20Z', docx.read('docProps/core.xml'))
+
+
+class TestEncodings(unittest.TestCase):
+
+    def test_utf16(self):
+        # A UTF-16 export from TBTA makes the same document as a UTF-8 one
+        with tempfile.TemporaryDirectory() as temp_dir:
+            text = Path('./test_docs/export_to_word/Ruth 1 w English.txt').read_text(encoding='utf-8-sig')
+            utf8_path = Path(temp_dir) / 'utf8.txt'
+            utf16_path = Path(temp_dir) / 'utf16.txt'
+            utf8_path.write_text(text, encoding='utf-8-sig')
+            utf16_path.write_text(text.replace('\n', '\r\n'), encoding='utf-16')
+
+            self.assertTrue(main(['', '-t', str(utf8_path)]))
+            self.assertTrue(main(['', '-t', str(utf16_path)]))
+            utf8_xml = zipfile.ZipFile(utf8_path.with_suffix('.docx')).read('word/document.xml')
+            utf16_xml = zipfile.ZipFile(utf16_path.with_suffix('.docx')).read('word/document.xml')
+            self.assertEqual(utf8_xml, utf16_xml)
+
+
+if __name__ == '__main__':
+    unittest.main()
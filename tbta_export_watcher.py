@@ -0,0 +1,203 @@
+import sys
+import re
+import time
+import shlex
+import signal
+import multiprocessing
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+import text_utils
+from tbta_export_server import WORKER_COUNT, init_worker, run_job
+
+# Scripts that files are routed to
+SCRIPT_WORD = 'tbta_export_to_word'
+SCRIPT_TABLE = 'tbta_export_to_table'
+SCRIPT_CONCEPTS = 'tbta_missing_concepts_to_word'
+
+# Parameter Name constants
+PARAM_FOLDER = 'folder'
+PARAM_SCRIPT_FLAGS = 'script_flags'
+PARAM_INTERVAL = 'interval'
+
+POLL_INTERVAL = 1.0     # seconds between looking at the folder
+SETTLE_TIME = 2.0       # seconds a file has to stay the same size before it is converted
+SIGNATURE_LINES = 50    # how many lines to look at to decide what kind of export a file is
+
+
+CONCEPT_REGEX = re.compile(r'Concept \([a-zA-Z]+\): ')
+VERSE_REF_REGEX = re.compile(r'.+? \d+:\d+(?::\d+)?')
+VERSE_TEXT_REGEX = re.compile(r'[^:]+:.*')
+def get_script_for_file(path: Path):
+    """
+    Decide which script should convert the file based on its contents:
+    - 'Concept (...)' lines are unlinked concepts
+    - a verse reference on its own line followed by 'Language: text' lines is a table
+    - anything else is just text for a Word document
+    Returns None if the file can't be read.
+    """
+    try:
+        with text_utils.open_text(path) as file:
+            lines = [line.strip() for _, line in zip(range(SIGNATURE_LINES), file)]
+    except OSError:
+        return None
+
+    if any(CONCEPT_REGEX.match(line) for line in lines):
+        return SCRIPT_CONCEPTS
+
+    non_empty = [line for line in lines if line]
+    if len(non_empty) >= 2 and VERSE_REF_REGEX.fullmatch(non_empty[0]) and VERSE_TEXT_REGEX.fullmatch(non_empty[1]):
+        return SCRIPT_TABLE
+
+    return SCRIPT_WORD
+
+
+def get_params(argv):
+    # usage is: tbta_export_watcher.exe (--word="-t") (--table="-c -s") (--concepts="-n") (--interval=1) "folder"
+    folder_args = [a for a in argv[1:] if not a.startswith('-')]
+    if len(folder_args) != 1:
+        print('Please specify a folder to watch')
+        return None
+
+    folder = Path(folder_args[0])
+    if not folder.is_dir():
+        print(f'Specified folder "{folder}" does not exist...')
+        return None
+
+    # Flags to pass along to each script, since TBTA isn't there to give them
+    script_flags = { SCRIPT_WORD: [], SCRIPT_TABLE: [], SCRIPT_CONCEPTS: [] }
+    flag_args = { '--word=': SCRIPT_WORD, '--table=': SCRIPT_TABLE, '--concepts=': SCRIPT_CONCEPTS }
+    interval = POLL_INTERVAL
+    for arg in argv[1:]:
+        for prefix, script in flag_args.items():
+            if arg.startswith(prefix):
+                script_flags[script] = shlex.split(arg[len(prefix):])
+        if arg.startswith('--interval='):
+            try:
+                interval = float(arg[len('--interval='):])
+            except ValueError:
+                print(f'Unexpected format for "{arg}". Please give the number of seconds like --interval=1')
+                return None
+
+    return {
+        PARAM_FOLDER: folder,
+        PARAM_SCRIPT_FLAGS: script_flags,
+        PARAM_INTERVAL: interval,
+    }
+
+
+class FolderWatcher:
+    """
+    Polls a folder for new text files, and once a file has stopped changing, converts it with
+    the matching script on a pool of worker processes.
+    A file that fails is left alone until it changes again, so it isn't retried over and over.
+    """
+    def __init__(self, folder: Path, script_flags: dict[str, list[str]], settle_time=SETTLE_TIME):
+        self.folder = folder
+        self.script_flags = script_flags
+        self.settle_time = settle_time
+        self.pending: dict[Path, tuple[tuple[int, int], float]] = {}    # path -> ((size, mtime), time first seen like that)
+        self.done: dict[Path, tuple[int, int]] = {}                     # path -> (size, mtime) when it was converted
+        self.running: dict = {}                                         # future -> (path, script)
+
+    def poll(self, now=None):
+        """
+        Returns the files that are ready to be converted: ones that haven't changed for the settle time.
+        """
+        now = time.monotonic() if now is None else now
+        ready = []
+        seen = set()
+        for path in self.folder.glob('*.txt'):
+            seen.add(path)
+            try:
+                stat = path.stat()
+            except OSError:
+                continue    # deleted since the folder was listed
+            signature = (stat.st_size, stat.st_mtime_ns)
+
+            if self.done.get(path) == signature:
+                continue
+
+            last_signature, since = self.pending.get(path, (None, now))
+            if signature != last_signature:
+                # New or still being written, so start waiting again
+                self.pending[path] = (signature, now)
+            elif stat.st_size > 0 and now - since >= self.settle_time and is_readable(path):
+                ready.append(path)
+                del self.pending[path]
+                self.done[path] = signature
+
+        # Forget about files that are gone (e.g. deleted after converting)
+        for path in list(self.pending) + list(self.done):
+            if path not in seen:
+                self.pending.pop(path, None)
+                self.done.pop(path, None)
+        return ready
+
+    def submit(self, executor, path: Path):
+        script = get_script_for_file(path)
+        if not script:
+            return None
+        argv = [script, *self.script_flags.get(script, []), path.name]
+        print(f'Converting "{path.name}" with {script}')
+        future = executor.submit(run_job, script, argv, str(path.parent.resolve()))
+        self.running[future] = (path, script)
+        return future
+
+    def collect(self):
+        """
+        Report on the conversions that have finished. Returns the list of (path, success).
+        """
+        results = []
+        for future in [f for f in self.running if f.done()]:
+            path, script = self.running.pop(future)
+            try:
+                success, output = future.result()
+            except Exception as e:
+                success, output = False, f'{type(e).__name__}: {e}\n'
+            print(output, end='')
+            print(f'{"Finished" if success else "FAILED"}: "{path.name}" ({script})')
+            results.append((path, success))
+        return results
+
+    def watch(self, interval=POLL_INTERVAL, workers=WORKER_COUNT):
+        print(f'Watching "{self.folder}" with {workers} workers. Press Ctrl+C to stop.')
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_watcher_worker) as executor:
+            try:
+                while True:
+                    for path in self.poll():
+                        self.submit(executor, path)
+                    self.collect()
+                    time.sleep(interval)
+            except KeyboardInterrupt:
+                print('Stopping once the current conversions are done...')
+        self.collect()
+
+
+def init_watcher_worker():
+    # Ctrl+C is handled by the watcher, which lets the current conversions finish
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    init_worker()
+
+
+def is_readable(path: Path):
+    # On Windows a file that is still open for writing by TBTA can't be opened
+    try:
+        with path.open('rb'):
+            return True
+    except OSError:
+        return False
+
+
+def main(argv):
+    params = get_params(argv)
+    if not params:
+        return False
+    FolderWatcher(params[PARAM_FOLDER], params[PARAM_SCRIPT_FLAGS]).watch(params[PARAM_INTERVAL])
+    return True
+
+
+if __name__ == "__main__":
+    # Needed for the worker processes when running as a frozen executable
+    multiprocessing.freeze_support()
+    main(sys.argv)
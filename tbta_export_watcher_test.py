@@ -0,0 +1,82 @@
+import unittest
+import shutil
+import tempfile
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, wait
+from tbta_export_watcher import *
+
+
+class TestSignature(unittest.TestCase):
+
+    def test_scripts(self):
+        self.assertEqual(SCRIPT_TABLE, get_script_for_file(Path('./test_docs/export_to_word/Ibwe Differences.txt')))
+        self.assertEqual(SCRIPT_WORD, get_script_for_file(Path('./test_docs/export_to_word/Ruth 1 w English.txt')))
+        self.assertEqual(SCRIPT_CONCEPTS, get_script_for_file(Path('./test_docs/missing_concepts_to_word/Esther 1 Issues.txt')))
+        self.assertIsNone(get_script_for_file(Path('./test_docs/Missing.txt')))
+
+
+class TestWatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.dir = Path(self.temp_dir.name)
+        self.watcher = FolderWatcher(self.dir, { SCRIPT_TABLE: ['-c'] }, settle_time=2)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_debounce(self):
+        path = self.dir / 'Export.txt'
+        path.write_text('Ruth 1:1 ', encoding='utf-8')
+        self.assertEqual([], self.watcher.poll(now=0))
+
+        # Still being written
+        with path.open('a', encoding='utf-8') as file:
+            file.write('When judges were ruling Israel')
+        self.assertEqual([], self.watcher.poll(now=1))
+        self.assertEqual([], self.watcher.poll(now=2))
+
+        # It hasn't changed for long enough
+        self.assertEqual([path], self.watcher.poll(now=3))
+
+        # And it is only converted once
+        self.assertEqual([], self.watcher.poll(now=10))
+
+    def test_empty_file(self):
+        (self.dir / 'Export.txt').touch()
+        self.watcher.poll(now=0)
+        self.assertEqual([], self.watcher.poll(now=10))
+
+    def test_convert(self):
+        shutil.copy('./test_docs/export_to_word/Ibwe Differences.txt', self.dir)
+        shutil.copy('./test_docs/export_to_word/Ruth 1 w English.txt', self.dir)
+        self.watcher.poll(now=0)
+        ready = self.watcher.poll(now=5)
+        self.assertEqual(2, len(ready))
+
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            wait([self.watcher.submit(executor, path) for path in ready])
+        results = self.watcher.collect()
+
+        self.assertTrue(all(success for _, success in results))
+        self.assertTrue((self.dir / 'Ibwe Differences.docx').exists())
+        self.assertTrue((self.dir / 'Ruth 1 w English.docx').exists())
+        # The scripts delete the text files when they succeed
+        self.assertEqual([], list(self.dir.glob('*.txt')))
+
+
+class TestParams(unittest.TestCase):
+
+    def test_params(self):
+        params = get_params(['', '--table=-c -s', '--interval=0.5', './test_docs'])
+        self.assertEqual(Path('./test_docs'), params[PARAM_FOLDER])
+        self.assertEqual(['-c', '-s'], params[PARAM_SCRIPT_FLAGS][SCRIPT_TABLE])
+        self.assertEqual([], params[PARAM_SCRIPT_FLAGS][SCRIPT_WORD])
+        self.assertEqual(0.5, params[PARAM_INTERVAL])
+
+    def test_missing_folder(self):
+        self.assertIsNone(get_params(['', './Missing Folder']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,18 @@
 import sys
+import os
 import re
+import time
+import zlib
+import struct
+import tempfile
+import unicodedata
+from itertools import accumulate
+from pathlib import Path
 from typing import NamedTuple
 
+from diff_map import DiffMap
+from diff_stats import DiffStats, Profiler, PHASE_TOKENIZE, PHASE_LCS, PHASE_FIXUP, PHASE_TOTAL
+
 class Indices(NamedTuple):
     start: int
     end: int
@@ -14,26 +25,34 @@ class DiffData(NamedTuple):
     diff: str
     old_indices: Indices
     new_indices: Indices
+    approximate: bool = False   # the verse was too big to diff word by word, so a coarser diff was used
 
 class TextRange:
-    def __init__(self, tokens: list[Token], char_indices: Indices):
-        self.tokens = tokens
+    """
+    A range of tokens from a text. The tokens are kept as lists of their texts and where they start and end,
+    which slices more cheaply than a Token for each one. Indexing a single token still gives a Token.
+    """
+    def __init__(self, texts: list[str], starts: list[int], ends: list[int], char_indices: Indices, tokenizer: 'Tokenizer|None'=None):
+        self.texts = texts
+        self.starts = starts
+        self.ends = ends
         self.char_indices = char_indices
+        self.tokenizer = tokenizer or get_default_tokenizer()
 
     def __repr__(self):
-        return ''.join(self.as_str_list()).strip()
+        return ''.join(self.texts).strip()
 
     def __len__(self):
-        return len(self.tokens)
+        return len(self.texts)
     
     def __getitem__(self, x: int|slice):
         if isinstance(x, slice):
-            return self._slice((x.start or 0, x.stop if x.stop is not None else len(self.tokens)))
+            return self._slice((x.start or 0, x.stop if x.stop is not None else len(self.texts)))
         else:
-            return self.tokens[x]
+            return Token(self.texts[x], Indices(self.starts[x], self.ends[x]))
 
     def as_str_list(self):
-        return [t.text for t in self.tokens]
+        return self.texts
 
     def _slice(self, token_indices: Indices):
         start, end = token_indices
@@ -46,38 +65,99 @@ class TextRange:
         elif start >= len(self):
             new_start_char = self.char_indices[1]
         else:
-            new_start_char = self.tokens[start].char_indices[0]
+            new_start_char = self.starts[start]
             
         if not len(self):
             new_end_char = self.char_indices[1]
         elif end == 0:
             new_end_char = self.char_indices[0]
         elif end < 0:
-            new_end_char = self.tokens[len(self)+end-1].char_indices[1]
+            new_end_char = self.ends[len(self)+end-1]
         else:
-            new_end_char = self.tokens[end-1].char_indices[1]
+            new_end_char = self.ends[end-1]
         
-        return TextRange(self.tokens[start:end], Indices(new_start_char, new_end_char))
+        return TextRange(self.texts[start:end], self.starts[start:end], self.ends[start:end], Indices(new_start_char, new_end_char), self.tokenizer)
 
 
-PUNCTUATION = ',.?!:<>"“”‘’'
-SPLIT_REGEX = re.compile(f'([ {PUNCTUATION}])')
-PUNC_REGEX = re.compile(f'([{PUNCTUATION}]+)')
-def split_tokens(text: str) -> TextRange:
-    tokens = []
-    token_start, token_end = 0, 0
-    for token in SPLIT_REGEX.split(text):
-        if not len(token):
-            continue
-        token_end = token_start + len(token)
-        tokens.append(Token(token, Indices(token_start, token_end)))
-        token_start = token_end
-    return TextRange(tokens, (0, len(text)))
+# Punctuation is found from the unicode categories, so it works for any script (e.g. ; ¿ « » ، 。)
+PUNCTUATION_CATEGORIES = ('Po', 'Ps', 'Pe', 'Pi', 'Pf')     # not dashes (Pd), so words like urang-urang stay together
+WORD_PUNCTUATION = "'"          # an apostrophe is part of the word in many languages, e.g. cari'i
+EXTRA_PUNCTUATION = '<>'        # TBTA marks implicit information with <<...>>
+
+_unicode_punctuation = None
+def get_unicode_punctuation():
+    # Only the Basic Multilingual Plane is checked, which has the punctuation for all the scripts in current use
+    global _unicode_punctuation
+    if _unicode_punctuation is None:
+        _unicode_punctuation = frozenset(c for c in map(chr, range(0x10000)) if unicodedata.category(c) in PUNCTUATION_CATEGORIES)
+    return _unicode_punctuation
+
+
+class Tokenizer:
+    """
+    Splits text into tokens: words, and single spaces and punctuation marks.
+    The punctuation comes from the unicode categories, which can be adjusted for a language with extra_punctuation
+    and word_characters, or replaced completely by giving punctuation.
+    The whole table of separators becomes one character class, so the text is split in a single scan,
+    and the token offsets are worked out from the token lengths without a python loop.
+    """
+    def __init__(self, punctuation: str|None=None, extra_punctuation: str='', word_characters: str=''):
+        if punctuation is None:
+            punctuation = (get_unicode_punctuation() | set(EXTRA_PUNCTUATION)) - set(WORD_PUNCTUATION)
+        self.punctuation = frozenset(punctuation).union(extra_punctuation).difference(word_characters, ' ')
+        self.split_regex = re.compile(f"([ {re.escape(''.join(sorted(self.punctuation)))}])")
+
+    def is_punctuation(self, token_text: str):
+        return token_text[:1] in self.punctuation
+
+    def split(self, text: str) -> TextRange:
+        texts = list(filter(None, self.split_regex.split(text)))
+        ends = list(accumulate(map(len, texts)))
+        starts = [0, *ends[:-1]] if ends else []
+        return TextRange(texts, starts, ends, (0, len(text)), self)
+
+
+# Tokenizer settings for particular languages, by the lowercase language name (e.g. 'ibwe' is used for 'Old Ibwe' and 'New Ibwe').
+# Each is the arguments for Tokenizer(), e.g. { 'tagalog': { 'word_characters': '’' } }
+LANGUAGE_TOKENIZERS: dict[str, dict[str, str]] = {}
+
+_tokenizers: dict[str, Tokenizer] = {}
+def get_tokenizer(language_name: str|None=None):
+    words = language_name.lower().split() if language_name else []
+    key = next((word for word in reversed(words) if word in LANGUAGE_TOKENIZERS), '')
+    if key not in _tokenizers:
+        _tokenizers[key] = Tokenizer(**LANGUAGE_TOKENIZERS.get(key, {}))
+    return _tokenizers[key]
+
+def get_default_tokenizer():
+    return get_tokenizer(None)
 
 
+def split_tokens(text: str, tokenizer: Tokenizer|None=None) -> TextRange:
+    return (tokenizer or get_default_tokenizer()).split(text)
+
+
+# The most work (old words x new words) to spend on a word by word diff of one verse.
+# This keeps a heavily restructured verse, or the wrong book being compared, from taking seconds and hundreds of MB.
+DIFF_BUDGET = 250_000
+
+# The engine that finds the matching words. Every engine in DIFF_ENGINES (at the bottom) must give exactly the same
+# results as the 'reference' one, which is checked by tbta_diff_fuzz.py. Other engines are only used when asked for.
+DEFAULT_ENGINE = 'reference'
+
 SMART_QUOTE_REGEX = re.compile(r'[“”‘’]')
-def find_differences(old: str, new: str, try_match_words: bool=False, separate_punctuation: bool=False) -> list[DiffData]:
+def find_differences(old: str, new: str, try_match_words: bool=False, separate_punctuation: bool=False,
+        old_tokens: TextRange|None=None, new_tokens: TextRange|None=None, budget: int|None=DIFF_BUDGET,
+        engine: str=DEFAULT_ENGINE, stats: DiffStats|None=None) -> list[DiffData]:
+    """
+    The tokens from split_tokens() can be passed in if they are already known,
+    e.g. when the same text is compared against several others.
+    If the texts are too long to diff word by word within the budget, they are diffed by sentences or chunks instead,
+    and the differences are marked as approximate. A budget of None means there is no limit.
+    If DiffStats are given, the diff is added to them with how long each part of it took.
+    """
     diffs = []
+    approximate = False
 
     def record_diff(old_range: TextRange, new_range: TextRange):
         if len(old_range) and len(new_range) and old_range[0].text == ' ' and new_range[0].text == ' ':
@@ -90,11 +170,11 @@ def find_differences(old: str, new: str, try_match_words: bool=False, separate_p
         diff_key = SMART_QUOTE_REGEX.sub(lambda m: '"' if m[0] in '“”' else "'", f'{old_range}->{new_range}')
         if len(diff_key) > 2:
             # don't include any empty diffs
-            diffs.append(DiffData(diff_key, old_range.char_indices, new_range.char_indices))
+            diffs.append(DiffData(diff_key, old_range.char_indices, new_range.char_indices, approximate))
     
     def handle_punctuation_change(old_diff: TextRange, new_diff: TextRange):
-        old_punc_match = PUNC_REGEX.match(old_diff[0].text) if len(old_diff) else None
-        new_punc_match = PUNC_REGEX.match(new_diff[0].text) if len(new_diff) else None
+        old_punc_match = len(old_diff) and old_diff.tokenizer.is_punctuation(old_diff.texts[0])
+        new_punc_match = len(new_diff) and new_diff.tokenizer.is_punctuation(new_diff.texts[0])
         if old_punc_match and new_punc_match:
             # punctuation at the start is changed
             record_diff(old_diff[0:1], new_diff[0:1])
@@ -118,10 +198,10 @@ def find_differences(old: str, new: str, try_match_words: bool=False, separate_p
         old_matched_indices, new_matched_indices = [], []
         new_str_list = new_diff.as_str_list()
 
-        for old_token_index, old_token in enumerate(old_diff.tokens):
-            if old_token.text == ' ':
+        for old_token_index, old_token_text in enumerate(old_diff.texts):
+            if old_token_text == ' ':
                 continue
-            closest = get_closest_match(old_token.text, new_str_list)
+            closest = get_closest_match(old_token_text, new_str_list, engine)
             if closest:
                 new_token_index = new_str_list.index(closest)
                 old_matched_indices.append((old_token_index, old_token_index + 1))
@@ -154,14 +234,31 @@ def find_differences(old: str, new: str, try_match_words: bool=False, separate_p
         return ([old_diff[start:end] for (start, end) in old_range_split_indices],
             [new_diff[start:end] for (start, end) in new_range_split_indices])
 
-    old_tokens = split_tokens(old)
-    new_tokens = split_tokens(new)
+    def add_stats(tokenized_time, lcs_time):
+        end_time = time.perf_counter()
+        stats.add_request(len(old_tokens) + len(new_tokens), approximate, {
+            PHASE_TOKENIZE: tokenized_time - start_time,
+            PHASE_LCS: lcs_time - tokenized_time,
+            PHASE_FIXUP: end_time - lcs_time,
+            PHASE_TOTAL: end_time - start_time,
+        })
+
+    start_time = time.perf_counter() if stats else 0
+    if old_tokens is None:
+        old_tokens = split_tokens(old)
+    if new_tokens is None:
+        new_tokens = split_tokens(new)
+    tokenized_time = time.perf_counter() if stats else 0
 
     if not old or not new:
         record_diff(old_tokens, new_tokens)
+        if stats:
+            add_stats(tokenized_time, tokenized_time)
         return diffs
 
-    for (a_range, b_range) in get_diff_ranges(old_tokens, new_tokens):
+    diff_ranges, approximate = get_diff_ranges(old_tokens, new_tokens, budget, engine)
+    lcs_time = time.perf_counter() if stats else 0
+    for (a_range, b_range) in diff_ranges:
         a_start, a_end = a_range
         b_start, b_end = b_range
         old_diff = old_tokens[a_start:a_end]
@@ -178,15 +275,18 @@ def find_differences(old: str, new: str, try_match_words: bool=False, separate_p
         else:
             record_diff(old_diff, new_diff)
 
+    if stats:
+        add_stats(tokenized_time, lcs_time)
     return diffs
 
 
-def get_closest_match(word, possibilities):
+def get_closest_match(word, possibilities, engine=DEFAULT_ENGINE):
     # Simplified version of difflib.get_close_matches()
     # See https://github.com/python/cpython/blob/e0f7c1097e19b6f5c2399e19f283c9fb373c243f/Lib/difflib.py#L667
     # and see https://github.com/python/cpython/blob/e0f7c1097e19b6f5c2399e19f283c9fb373c243f/Lib/difflib.py#L40
     cutoff = 0.8
     a, la = word, len(word)
+    find_overlaps = DIFF_ENGINES[engine]
 
     close_matches = []
     for b in possibilities:
@@ -208,9 +308,10 @@ def get_closest_match(word, possibilities):
     return max(close_matches, key=lambda x: x[0])[1]
 
 
-def get_diff_ranges(a: TextRange, b: TextRange):
+def get_diff_ranges(a: TextRange, b: TextRange, budget: int|None=None, engine: str=DEFAULT_ENGINE):
     """
-    Returns a list of ((start_a, end_a), (start_b, end_b)) tuples, representing the minimal ranges of differences in a and b.
+    Returns a list of ((start_a, end_a), (start_b, end_b)) tuples, representing the minimal ranges of differences in a and b,
+    and whether the ranges are approximate because the budget was exceeded.
     For a deletion, start_b and end_b will be the same. For an insertion, start_a and end_a will be the same.
     Spaces are ignored.
     """
@@ -237,20 +338,7 @@ def get_diff_ranges(a: TextRange, b: TextRange):
         b_index_map.append(j)
     b_index_map.append(len(b_full))
 
-    matches = find_overlaps(norm_a, norm_b)
-
-    # Generate diff ranges
-    diffs = []
-    prev_a = prev_b = 0
-    for ma, mb in matches:
-        if prev_a < ma or prev_b < mb:
-            diffs.append(((prev_a, ma), (prev_b, mb)))
-        prev_a = ma + 1
-        prev_b = mb + 1
-
-    # Any remaining tail differences
-    if prev_a < len(norm_a) or prev_b < len(norm_b):
-        diffs.append(((prev_a, len(norm_a)), (prev_b, len(norm_b))))
+    diffs, approximate = get_bounded_diff_ranges(norm_a, norm_b, budget, engine)
 
     # Adjust the indices back to include the space tokens as well
     true_diffs = []
@@ -281,7 +369,80 @@ def get_diff_ranges(a: TextRange, b: TextRange):
 
         true_diffs.append(((a_start, a_end), (b_start, b_end)))
 
-    return true_diffs
+    return true_diffs, approximate
+
+
+def get_match_diff_ranges(matches, len_a, len_b):
+    """
+    Turn the matching (index_a, index_b) pairs into the ranges between them that are different.
+    """
+    diffs = []
+    prev_a = prev_b = 0
+    for ma, mb in matches:
+        if prev_a < ma or prev_b < mb:
+            diffs.append(((prev_a, ma), (prev_b, mb)))
+        prev_a = ma + 1
+        prev_b = mb + 1
+
+    # Any remaining tail differences
+    if prev_a < len_a or prev_b < len_b:
+        diffs.append(((prev_a, len_a), (prev_b, len_b)))
+    return diffs
+
+
+def get_bounded_diff_ranges(a: list[str], b: list[str], budget: int|None, engine: str=DEFAULT_ENGINE):
+    """
+    Same as get_match_diff_ranges(find_overlaps(a, b)), unless that would take more than the budget.
+    Then the words are grouped into sentences, or failing that into chunks, and those are diffed instead.
+    Any sentences or chunks that changed are diffed word by word if they fit in the budget, otherwise the whole of
+    them is one difference. If even that is too much, the whole text is one difference.
+    Returns (diff ranges, whether they are approximate).
+    """
+    find_overlaps = DIFF_ENGINES[engine]
+    if budget is None or len(a) * len(b) <= budget:
+        return get_match_diff_ranges(find_overlaps(a, b), len(a), len(b)), False
+
+    for split_units in (split_sentence_units, split_chunk_units):
+        a_starts, b_starts = split_units(a), split_units(b)
+        if len(a_starts) * len(b_starts) > budget or (len(a_starts) <= 1 and len(b_starts) <= 1):
+            continue
+
+        # The index after the last word closes off the last unit
+        a_starts.append(len(a))
+        b_starts.append(len(b))
+        a_units = [tuple(a[start:end]) for start, end in zip(a_starts, a_starts[1:])]
+        b_units = [tuple(b[start:end]) for start, end in zip(b_starts, b_starts[1:])]
+
+        diffs = []
+        for (ua_start, ua_end), (ub_start, ub_end) in get_match_diff_ranges(find_overlaps(a_units, b_units), len(a_units), len(b_units)):
+            a_start, a_end = a_starts[ua_start], a_starts[ua_end]
+            b_start, b_end = b_starts[ub_start], b_starts[ub_end]
+            if (a_end - a_start) * (b_end - b_start) <= budget:
+                sub_diffs = get_match_diff_ranges(find_overlaps(a[a_start:a_end], b[b_start:b_end]), a_end - a_start, b_end - b_start)
+                diffs.extend(((a_start + sa_start, a_start + sa_end), (b_start + sb_start, b_start + sb_end))
+                    for (sa_start, sa_end), (sb_start, sb_end) in sub_diffs)
+            else:
+                diffs.append(((a_start, a_end), (b_start, b_end)))
+        return diffs, True
+
+    # Replace the whole text
+    return [((0, len(a)), (0, len(b)))], True
+
+
+SENTENCE_END = '.?!'
+def split_sentence_units(words: list[str]):
+    # Returns the index where each sentence starts
+    return [0] + [i + 1 for i, word in enumerate(words[:-1]) if word in SENTENCE_END]
+
+
+CHUNK_SIZE = 16
+def split_chunk_units(words: list[str]):
+    """
+    Returns the index where each chunk starts. Chunks end after punctuation, or after a word whose checksum happens to
+    divide by CHUNK_SIZE, so the chunks are about that long and an inserted word doesn't shift where the later chunks end.
+    """
+    return [0] + [i + 1 for i, word in enumerate(words[:-1])
+        if (len(word) == 1 and not word.isalnum()) or zlib.crc32(word.encode('utf-8')) % CHUNK_SIZE == 0]
 
 def find_overlaps(a, b):
     """
@@ -316,26 +477,226 @@ def find_overlaps(a, b):
     return matches
 
 
-if __name__ == "__main__":
-    exit_signal = 'close-pipe'
-    while True:
-        old_text = sys.stdin.readline().strip()
-        if old_text == exit_signal:
-            break
-        new_text = sys.stdin.readline().strip()
-        if new_text == exit_signal:
-            break
+def find_overlaps_trimmed(a, b):
+    """
+    Same as find_overlaps(), but faster.
+    The backtracking in find_overlaps() matches equal items at the end first, so the common ending is matched
+    without putting it in the LCS table. The table is also built a row at a time, without indexing into it.
+    """
+    len_a, len_b = len(a), len(b)
+    suffix = 0
+    while suffix < len_a and suffix < len_b and a[len_a - suffix - 1] == b[len_b - suffix - 1]:
+        suffix += 1
+    len_a -= suffix
+    len_b -= suffix
 
-        diffs = find_differences(old_text, new_text)
-        old_indices, new_indices = zip(*[(diff.old_indices, diff.new_indices) for diff in diffs]) if len(diffs) else ((), ())
-        old_str = ','.join((f'{start}-{end}' for start, end in old_indices))
-        new_str = ','.join((f'{start}-{end}' for start, end in new_indices))
-        full_str = f'{old_str};{new_str}'
+    # Build LCS table
+    dp = [[0] * (len_b + 1)]
+    for i in range(len_a):
+        a_i = a[i]
+        prev_row = dp[-1]
+        row = [0]
+        left = 0
+        for j in range(len_b):
+            if a_i == b[j]:
+                left = prev_row[j] + 1
+            elif prev_row[j + 1] > left:
+                left = prev_row[j + 1]
+            row.append(left)
+        dp.append(row)
 
+    # Backtrack to find matching indices
+    i, j = len_a, len_b
+    matches = [(len_a + k, len_b + k) for k in reversed(range(suffix))]
+    while i > 0 and j > 0:
+        if a[i - 1] == b[j - 1]:
+            matches.append((i - 1, j - 1))
+            i -= 1
+            j -= 1
+        elif dp[i - 1][j] >= dp[i][j - 1]:
+            i -= 1
+        else:
+            j -= 1
+    matches.reverse()  # from start to end
+
+    return matches
+
+
+DIFF_ENGINES = {
+    'reference': find_overlaps,
+    'trimmed': find_overlaps_trimmed,
+}
+
+
+# Lines that TBTA can send in place of the old text. Every other line is a text to diff.
+COMMAND_CLOSE = 'close-pipe'
+COMMAND_STATS = 'stats'                 # reply with the stats so far as one line of JSON
+COMMAND_START_PROFILE = 'start-profile'
+COMMAND_DUMP_PROFILE = 'dump-profile'   # stop profiling and reply with the path of the .pstats file
+COMMAND_OPEN_MAP = 'open-map'           # open-map {path}: open a diff map file and reply with its number of verses
+COMMAND_DIFF_RANGE = 'diff-range'       # diff-range {start} {end}: diff verses start to end - 1 of the map and reply with how many there were
+COMMAND_CLOSE_MAP = 'close-map'
+
+# Parameter Name constants
+PARAM_BUDGET = 'budget'
+PARAM_STATS_LOG = 'stats_log'
+PARAM_STATS_INTERVAL = 'stats_interval'
+PARAM_PROFILE_DIR = 'profile_dir'
+
+STATS_INTERVAL = 300    # seconds between each line written to the stats log
+
+
+def get_params(argv):
+    # usage is: tbta_find_differences.exe (--budget=250000) (--stats-log="stats.jsonl") (--stats-interval=300) (--profile-dir="folder")
+    # where the budget of 0 means verses are always diffed word by word, no matter how long they take
+    params = {
+        PARAM_BUDGET: DIFF_BUDGET,
+        PARAM_STATS_LOG: None,
+        PARAM_STATS_INTERVAL: STATS_INTERVAL,
+        PARAM_PROFILE_DIR: Path(tempfile.gettempdir()),
+    }
+    for arg in argv[1:]:
+        name, _, value = arg.partition('=')
+        value = value.strip('"')
         try:
-            print(full_str, flush=True)
+            if name == '--budget':
+                params[PARAM_BUDGET] = int(value) or None
+            elif name == '--stats-log':
+                params[PARAM_STATS_LOG] = Path(value)
+            elif name == '--stats-interval':
+                params[PARAM_STATS_INTERVAL] = float(value)
+            elif name == '--profile-dir':
+                params[PARAM_PROFILE_DIR] = Path(value)
+        except ValueError:
+            print(f'Unexpected format for "{arg}". Please give a number, like {name}=300', file=sys.stderr)
+            return None
+    return params
+
+
+def format_diffs(diffs: list[DiffData]):
+    """
+    The differences as TBTA reads them: the old ranges, then the new ranges, e.g. '0-3,12-18;0-9,18-26'
+    """
+    old_indices, new_indices = zip(*[(diff.old_indices, diff.new_indices) for diff in diffs]) if len(diffs) else ((), ())
+    old_str = ','.join((f'{start}-{end}' for start, end in old_indices))
+    new_str = ','.join((f'{start}-{end}' for start, end in new_indices))
+    return f'{old_str};{new_str}'
+
+
+def write_stats_log(stats: DiffStats, path: Path):
+    with path.open('a', encoding='utf-8') as file:
+        file.write(stats.to_json() + '\n')
+
+
+def diff_map_range(diff_map: DiffMap, start: int, end: int, params, stats: DiffStats|None=None):
+    """
+    Diff verses start to end - 1 of the map, writing the ranges into the map.
+    Returns the reply for the diff-range command.
+    """
+    if not 0 <= start <= end <= diff_map.verse_count:
+        return f'error: the range must be within 0-{diff_map.verse_count}'
+    try:
+        for index in range(start, end):
+            old_text, new_text = diff_map.get_texts(index)
+            diffs = find_differences(old_text, new_text, budget=params[PARAM_BUDGET], stats=stats)
+            diff_map.set_diffs(index, [(diff.old_indices, diff.new_indices) for diff in diffs])
+    except (ValueError, struct.error, UnicodeDecodeError, OSError) as e:
+        # A broken map mustn't stop the server, since TBTA keeps using it for other books
+        return f'error: {e}'
+    return str(end - start)
+
+
+def run_map_command(command: str, diff_map: DiffMap|None, params, stats: DiffStats):
+    """
+    Returns (reply, the diff map that is open now).
+    """
+    name, _, arg = command.partition(' ')
+    if name == COMMAND_OPEN_MAP:
+        if diff_map:
+            diff_map.close()
+        try:
+            diff_map = DiffMap(Path(arg.strip().strip('"')))
+            return (str(diff_map.verse_count), diff_map)
+        except (OSError, ValueError) as e:
+            return (f'error: {e}', None)
+
+    if not diff_map:
+        return ('error: no map is open', None)
+    if name == COMMAND_CLOSE_MAP:
+        diff_map.close()
+        return ('closed', None)
+
+    try:
+        start, end = (int(number) for number in arg.split())
+    except ValueError:
+        return (f'error: expected {COMMAND_DIFF_RANGE} {{start}} {{end}}', diff_map)
+    return (diff_map_range(diff_map, start, end, params, stats), diff_map)
+
+
+def serve(input_file, output_file, params):
+    """
+    Read pairs of lines (the old text then the new text) and write the differences between them as one line,
+    until the input ends or the close command is sent. The other commands are answered with one line as well,
+    so TBTA can always read one line for each thing it sends.
+    Whole books can be diffed without sending each verse by putting them in a diff map file (see diff_map.py).
+    """
+    stats = DiffStats()
+    profiler = Profiler()
+    diff_map = None
+    profile_count = 0
+    stats_log = params[PARAM_STATS_LOG]
+    last_log_time = time.monotonic()
+
+    def reply(line):
+        try:
+            print(line, file=output_file, flush=True)
+            return True
         except OSError:
             # This occurs if TBTA crashes or closes the pipe unexpectedly, so we should just exit the program
+            return False
+
+    while True:
+        old_text = input_file.readline()
+        if not old_text:
+            break
+        old_text = old_text.strip()
+        if old_text == COMMAND_CLOSE:
+            break
+
+        if old_text == COMMAND_STATS:
+            response = stats.to_json()
+        elif old_text == COMMAND_START_PROFILE:
+            profiler.start()
+            response = 'profiling'
+        elif old_text == COMMAND_DUMP_PROFILE:
+            profile_count += 1
+            path = params[PARAM_PROFILE_DIR] / f'tbta_find_differences_{os.getpid()}_{profile_count}.pstats'
+            response = str(profiler.dump(path) or 'not profiling')
+        elif old_text.partition(' ')[0] in (COMMAND_OPEN_MAP, COMMAND_DIFF_RANGE, COMMAND_CLOSE_MAP):
+            response, diff_map = run_map_command(old_text, diff_map, params, stats)
+        else:
+            new_text = input_file.readline().strip()
+            if new_text == COMMAND_CLOSE:
+                break
+            response = format_diffs(find_differences(old_text, new_text, budget=params[PARAM_BUDGET], stats=stats))
+
+        if not reply(response):
             break
 
-    sys.exit(0)
\ No newline at end of file
+        if stats_log and time.monotonic() - last_log_time >= params[PARAM_STATS_INTERVAL]:
+            write_stats_log(stats, stats_log)
+            last_log_time = time.monotonic()
+
+    if diff_map:
+        diff_map.close()
+    if stats_log and stats.requests:
+        write_stats_log(stats, stats_log)
+    return stats
+
+
+if __name__ == "__main__":
+    params = get_params(sys.argv)
+    if not params:
+        sys.exit(1)
+    serve(sys.stdin, sys.stdout, params)
+    sys.exit(0)
@@ -1,5 +1,11 @@
+import io
+import json
+import tempfile
 import unittest
-from tbta_find_differences import find_differences, DiffData
+from pathlib import Path
+from unittest.mock import patch
+import tbta_find_differences
+from tbta_find_differences import find_differences, split_tokens, get_tokenizer, DiffData, Tokenizer
 
 
 class TestDiffAnalysis(unittest.TestCase):
@@ -183,5 +189,152 @@ class TestDiffAnalysis(unittest.TestCase):
         self.assertListEqual(actual_simple, expected_simple)
 
 
+class TestDiffBudget(unittest.TestCase):
+    old = 'Wan Hirudis mautus urang-urang nang bailmu tu ka Betlehem. Imbah bubuhan ikam manamuakan anak nang itu, hanyar langsung datangi aku. Wan padahakan ha bubuhan ikam lawan aku.'
+    new = 'Imbah itu Hirudis manyuruh urang-urang nang bisa tu ka Betlehem. Imbah bubuhan ikam manamuakan anak nang itu, hanyar langsung datangi aku. Padahakan ha bubuhan ikam lawan aku.'
+
+    def test_within_budget(self):
+        # A verse that fits in the budget is diffed exactly the same as with no budget
+        expected = find_differences(self.old, self.new, try_match_words=True, separate_punctuation=True, budget=None)
+        actual = find_differences(self.old, self.new, try_match_words=True, separate_punctuation=True, budget=10_000)
+        self.assertListEqual(actual, expected)
+        self.assertFalse(any(diff.approximate for diff in actual))
+
+    def test_sentence_fallback(self):
+        # Only the sentences that changed are diffed word by word, and the unchanged sentence isn't included
+        actual = find_differences(self.old, self.new, budget=200)
+        expected = [
+            DiffData('Wan->Imbah itu', (0, 3), (0, 9), True),
+            DiffData('mautus->manyuruh', (12, 18), (18, 26), True),
+            DiffData('bailmu->bisa', (36, 42), (44, 48), True),
+            DiffData('Wan padahakan->Padahakan', (133, 146), (139, 148), True),
+        ]
+        self.assertListEqual(actual, expected)
+
+    def test_whole_verse_fallback(self):
+        actual = find_differences(self.old, self.new, budget=1)
+        self.assertListEqual(actual, [DiffData(f'{self.old}->{self.new}', (0, len(self.old)), (0, len(self.new)), True)])
+
+    def test_long_verse(self):
+        # Two unrelated texts without any sentence breaks fall back to chunks, and the indices still line up with the text
+        old = ' '.join(f'kata{i % 97}' for i in range(3000))
+        new = ' '.join(f'kata{i % 89}' for i in range(3000))
+        diffs = find_differences(old, new)
+        self.assertTrue(diffs)
+        for diff in diffs:
+            self.assertTrue(diff.approximate)
+            self.assertEqual(diff.diff, f'{old[slice(*diff.old_indices)].strip()}->{new[slice(*diff.new_indices)].strip()}')
+
+
+class TestTokenizer(unittest.TestCase):
+
+    def test_offsets(self):
+        tokens = split_tokens('Lalu Nabi Isa, “bajalan.”')
+        self.assertListEqual(['Lalu', ' ', 'Nabi', ' ', 'Isa', ',', ' ', '“', 'bajalan', '.', '”'], tokens.texts)
+        self.assertListEqual([(0, 4), (4, 5), (5, 9), (9, 10), (10, 13), (13, 14), (14, 15), (15, 16), (16, 23), (23, 24), (24, 25)],
+            list(zip(tokens.starts, tokens.ends)))
+        self.assertEqual(('Isa', (10, 13)), tokens[4])
+
+    def test_unicode_punctuation(self):
+        self.assertListEqual(['¿', 'Qué', '?', ' ', '«', 'hola', '»', ';', ' ', '(', 'sí', ')'], split_tokens('¿Qué? «hola»; (sí)').texts)
+        self.assertListEqual(['سلام', '،', ' ', 'دنیا'], split_tokens('سلام، دنیا').texts)
+        self.assertListEqual(['你好', '。', '世界', '、'], split_tokens('你好。世界、').texts)
+
+    def test_word_characters(self):
+        # Apostrophes and hyphens are part of words, and <<...>> marks are split off
+        self.assertListEqual(["cari'i", ' ', 'urang-urang', ' ', '<', '<', 'nang', '>', '>'], split_tokens("cari'i urang-urang <<nang>>").texts)
+
+    def test_language_config(self):
+        with patch.dict(tbta_find_differences.LANGUAGE_TOKENIZERS, { 'tagalog': { 'word_characters': '’/' } }):
+            tbta_find_differences._tokenizers.clear()
+            try:
+                self.assertListEqual(['ang', ' ', 'ama’y/ina'], get_tokenizer('Old Tagalog').split('ang ama’y/ina').texts)
+                self.assertListEqual(['ang', ' ', 'ama', '’', 'y', '/', 'ina'], get_tokenizer('English').split('ang ama’y/ina').texts)
+            finally:
+                tbta_find_differences._tokenizers.clear()
+
+    def test_finer_diffs(self):
+        # Punctuation like brackets is split from the word, so only the word is shown as changed
+        actual = find_differences('(Bubuhannya tulak.)', '(Buhannya tulak.)')
+        self.assertListEqual([DiffData('Bubuhannya->Buhannya', (1, 11), (1, 9))], actual)
+
+
+
+class TestServe(unittest.TestCase):
+
+    def serve(self, lines, **params):
+        output = io.StringIO()
+        stats = tbta_find_differences.serve(io.StringIO(''.join(line + '\n' for line in lines)), output,
+            { **tbta_find_differences.get_params(['']), **params })
+        return output.getvalue().splitlines(), stats
+
+    def test_diffs(self):
+        output, _ = self.serve(['Wan Hirudis mautus.', 'Imbah itu Hirudis manyuruh.', 'a b c', 'a c', 'close-pipe', 'x', 'y'])
+        self.assertListEqual(['0-3,12-18;0-9,18-26', '2-4;2-2'], output)
+
+    def test_stats(self):
+        output, stats = self.serve(['a b c', 'a c', 'stats', 'a b', 'a b'])
+        self.assertEqual(2, stats.requests)
+        self.assertEqual(3, len(output))
+        summary = json.loads(output[1])
+        self.assertEqual(1, summary['requests'])
+        self.assertEqual(8, summary['tokens']['max'])
+        self.assertListEqual(['tokenize', 'lcs', 'fixup', 'total'], list(summary['latency_ms']))
+
+    def test_stats_log(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            log_path = Path(temp_dir) / 'stats.jsonl'
+            # With no interval, a line is written after every request, and once more at the end
+            self.serve(['a b c', 'a c', 'a b', 'a b'], stats_log=log_path, stats_interval=0)
+            lines = [json.loads(line) for line in log_path.read_text(encoding='utf-8').splitlines()]
+            self.assertListEqual([1, 2, 2], [line['requests'] for line in lines])
+
+    def test_profile(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            output, _ = self.serve(['dump-profile', 'start-profile', 'a b c', 'a c', 'dump-profile'], profile_dir=Path(temp_dir))
+            self.assertEqual('not profiling', output[0])
+            self.assertEqual('profiling', output[1])
+            self.assertTrue(Path(output[3]).exists())
+            self.assertEqual(Path(temp_dir), Path(output[3]).parent)
+
+    def test_diff_map(self):
+        import diff_map
+        pairs = [('Wan Hirudis mautus.', 'Imbah itu Hirudis manyuruh.'), ('a b c', 'a c'), ('a\nb', 'a\nb c'), ('x', 'x')]
+        with tempfile.TemporaryDirectory() as temp_dir:
+            map_path = Path(temp_dir) / 'Ruth.map'
+            diff_map.write_map(map_path, pairs)
+            output, stats = self.serve([f'open-map "{map_path}"', 'diff-range 1 4', 'diff-range 0 1', 'diff-range 3 5', 'close-map', 'diff-range 0 1'])
+            self.assertListEqual(['4', '3', '1', 'error: the range must be within 0-4', 'closed', 'error: no map is open'], output)
+            self.assertEqual(4, stats.requests)
+
+            # The same ranges as the pipe gives
+            with diff_map.DiffMap(map_path) as result_map:
+                for i, (old, new) in enumerate(pairs):
+                    self.assertListEqual([(diff.old_indices, diff.new_indices) for diff in find_differences(old, new)], result_map.get_diffs(i))
+
+    def test_broken_diff_map(self):
+        import diff_map
+        with tempfile.TemporaryDirectory() as temp_dir:
+            short_path = Path(temp_dir) / 'Short.map'
+            short_path.write_bytes(diff_map.HEADER.pack(diff_map.MAGIC, 1000, diff_map.MAX_DIFFS))
+            cut_path = Path(temp_dir) / 'Cut.map'
+            diff_map.write_map(cut_path, [('a b', 'a c'), ('Wan Hirudis mautus.', 'Imbah itu Hirudis manyuruh.')])
+            cut_path.write_bytes(cut_path.read_bytes()[:-3])
+
+            # The errors are replies, and the server carries on
+            output, _ = self.serve([f'open-map "{short_path}"', f'open-map "{cut_path}"', 'diff-range 0 2', 'diff-range 0 1', 'a', 'b'])
+            self.assertTrue(output[0].startswith('error: '))
+            self.assertEqual('2', output[1])
+            self.assertTrue(output[2].startswith('error: verse 1 '))
+            self.assertListEqual(['1', '0-1;0-1'], output[3:])
+
+    def test_params(self):
+        params = tbta_find_differences.get_params(['', '--budget=0', '--stats-log="stats.jsonl"', '--stats-interval=60'])
+        self.assertIsNone(params[tbta_find_differences.PARAM_BUDGET])
+        self.assertEqual(Path('stats.jsonl'), params[tbta_find_differences.PARAM_STATS_LOG])
+        self.assertEqual(60, params[tbta_find_differences.PARAM_STATS_INTERVAL])
+        self.assertIsNone(tbta_find_differences.get_params(['', '--budget=lots']))
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -1,26 +1,71 @@
 import sys
 import re
+import heapq
 from pathlib import Path
+from typing import NamedTuple
 import time
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
 
 import doc_utils
+import error_utils
+import lexicon_cache
+import output_memo
+import ref_utils
+import text_utils
 
 
 # Parameter Name Constants
 PARAM_INPUT_PATH = 'input_path'
 PARAM_OUTPUT_PATH = 'output_path'
 PARAM_NOTES_COLUMN = 'add_notes_column'
+PARAM_INFLECTIONS_PATH = 'inflections_path'
+PARAM_CACHE_PATH = 'cache_path'
+PARAM_NEW_ONLY = 'new_only'
+PARAM_LEXICON = 'lexicon'
 PARAM_PASSAGE = 'passage'
+PARAM_RANGE = 'range'
+PARAM_FORMAT = 'format'
+PARAM_REBUILD = 'rebuild'
+PARAM_PARALLEL = 'parallel'
 PARAM_TEST = 'test'
 
-# Concept Info Fields
-CONCEPT_WORD = 'word'
-CONCEPT_GLOSS = 'gloss'
-CONCEPT_VERSE_REF = 'verse_ref'
-CONCEPT_VERSE_TEXT = 'verse_text'
-CONCEPT_OCCURRENCES = 'verse_occurrences'
-CONCEPT_SAMPLE = 'sample'
-CONCEPT_TARGETS = 'target_words'
+
+class Occurrence(NamedTuple):
+    text: str
+    locations: list[tuple[int, int]]
+
+class Concept:
+    # There can be thousands of these, so use slots rather than a dict for each one
+    __slots__ = ('word', 'gloss', 'verse_ref', 'verse_text', 'other_refs', 'occurrences', 'sample', 'targets')
+
+    def __init__(self, word: str, gloss: str):
+        self.word = word
+        self.gloss = gloss
+        self.verse_ref: str|None = None
+        self.verse_text: str|None = None
+        self.other_refs: list[str] = []     # the other verses the same concept was found in
+        self.occurrences: list[Occurrence]|None = None
+        self.sample: str|None = None
+        self.targets: str|None = None
+
+    def __repr__(self):
+        return f'Concept({self.word})'
+
+    def sort_key(self):
+        return (self.word.lower(), self.word)
+
+    def merge(self, other: 'Concept'):
+        # Keep the first verse for the example, and just list the others
+        if other.verse_ref is not None and other.verse_ref != self.verse_ref and other.verse_ref not in self.other_refs:
+            if self.verse_ref is None:
+                self.verse_ref, self.verse_text = other.verse_ref, other.verse_text
+            else:
+                self.other_refs.append(other.verse_ref)
+        if self.sample is None:
+            self.sample = other.sample
+        if self.targets is None:
+            self.targets = other.targets
 
 # Semantic Categories
 CATEGORY_PROPER = 'Proper Name'
@@ -42,14 +87,14 @@ HEADER_TARGET_GLOSS = 'Target Glosses'
 HEADER_NOTES = 'Notes'
 
 
-def get_params():
-    # usage is: tbta_missing_concepts_to_word.exe -n -t "text_file.txt"
+def get_params(argv):
+    # usage is: tbta_missing_concepts_to_word.exe -n -p -i="inflections.txt" --new-only --lexicon --cache="cache.sqlite3" --range="Gen 1:1-2:25" --format=(docx|html|rtf) --rebuild -t "text_file.txt"
     # The text file path is required
-    if len(sys.argv) < 2:
+    if len(argv) < 2:
         print('Please specify a .txt file to import')
         return None
 
-    file_name = sys.argv[-1]
+    file_name = argv[-1]
     if file_name.startswith('-'):
         print('File name must be the last argument')
         return None
@@ -59,87 +104,521 @@ def get_params():
         print('Specified File does not exist...')
         return None
 
+    # Extra inflected forms can be given in a data file, e.g. -i="inflections.txt"
+    inflections_arg = next((a for a in argv[1:-1] if a[:3].lower() == '-i='), None)
+    inflections_path = Path(inflections_arg[3:]) if inflections_arg else None
+    if inflections_path and not inflections_path.exists():
+        print(f'Specified inflections file "{inflections_path}" does not exist...')
+        return None
+
+    # Concepts that have been exported are remembered in a cache file next to the text file, unless another file is given
+    new_only = '--new-only' in argv
+    lexicon = '--lexicon' in argv
+    cache_arg = next((a for a in argv[1:-1] if a.startswith('--cache=')), None)
+    cache_path = None
+    if cache_arg:
+        cache_path = Path(cache_arg[len('--cache='):])
+    elif new_only or lexicon:
+        cache_path = file_path.with_name(lexicon_cache.CACHE_FILE_NAME)
+
+    # Only the concepts from some of the verses can be exported, e.g. --range="Gen 1:1-2:25"
+    range_arg, ref_range = ref_utils.get_range_arg(argv[1:-1])
+    if range_arg and not ref_range:
+        print(f'Unexpected format for "{range_arg}". {ref_utils.RANGE_ERROR}')
+        return None
+
+    # Tables that only need to be read can be made much more quickly as HTML or RTF, e.g. --format=html
+    format_arg = next((a for a in argv[1:-1] if a.lower().startswith('--format=')), None)
+    doc_format = doc_utils.FORMAT_DOCX
+    if format_arg:
+        doc_format = doc_utils.parse_format_arg(format_arg[len('--format='):])
+        if not doc_format:
+            print(f'Unexpected format for "{format_arg}". Please use --format=docx, --format=html or --format=rtf')
+            return None
+    suffix = doc_utils.get_format_suffix(doc_format)
+
     return {
         PARAM_INPUT_PATH: file_path,
-        PARAM_OUTPUT_PATH: file_path.with_name(f'Lexicon - {file_path.stem}.docx'),
-        PARAM_NOTES_COLUMN: '-N' in sys.argv or '-n' in sys.argv,
-        PARAM_TEST: '-T' in sys.argv or '-t' in sys.argv,
+        PARAM_OUTPUT_PATH: file_path.with_name(f'Lexicon{suffix}' if lexicon else f'Lexicon - {file_path.stem}{suffix}'),
+        PARAM_NOTES_COLUMN: '-N' in argv or '-n' in argv,
+        PARAM_INFLECTIONS_PATH: inflections_path,
+        PARAM_CACHE_PATH: cache_path,
+        PARAM_NEW_ONLY: new_only,
+        PARAM_LEXICON: lexicon,
+        PARAM_RANGE: ref_range,
+        PARAM_FORMAT: doc_format,
+        PARAM_REBUILD: '--rebuild' in argv,
+        PARAM_PARALLEL: '-P' in argv or '-p' in argv,
+        PARAM_TEST: '-T' in argv or '-t' in argv,
     }
 
 
-def import_concepts(params):
+def load_inflections(params):
+    inflections = InflectionIndex()
+    if params[PARAM_INFLECTIONS_PATH]:
+        inflections.load(params[PARAM_INFLECTIONS_PATH])
+    return inflections
+
+
+def import_concepts(params, inflections: 'InflectionIndex|None' = None):
+    categories = {}
+    concepts_by_word = {}
+
+    for category, concept in read_concepts(params):
+        # The same concept can be missing from many verses in a whole book, but it only needs one row
+        key = (category, concept.word)
+        if key in concepts_by_word:
+            concepts_by_word[key].merge(concept)
+            continue
+        concepts_by_word[key] = concept
+
+        categories.setdefault(category, []).append(concept)
+
+    # Each category is sorted once, which is O(n log n) and merges the runs that are already in alphabetical order
+    for concepts in categories.values():
+        concepts.sort(key=Concept.sort_key)
+
+    # Now that all of the words are known, find them in the verses all at once
+    find_occurrences(categories, inflections or load_inflections(params))
+
+    # Only for debug purposes
+    # for k,v in categories.items():
+    #     print(f'Retrieved {len(v)} {k} unlinked concepts from "{path}"')
+    return categories
+
+
+def read_concepts(params):
+    """
+    Yields (category, concept) for each concept in the text file, once all of its lines have been read.
+    With a range, the concepts from verses outside of it are dropped, and the rest of their lines aren't looked at.
+    """
     CONCEPT_REGEX = re.compile(r'^Concept \((?P<category>[a-zA-Z]+)\): (?P<word>[.a-zA-Z0-9- ]+?-[A-Z])(?:  \'(?P<gloss>.+?)\')?$')
     VERSE_REGEX = re.compile(r'^Verse: (?P<ref>[.a-zA-Z0-9- ]+:\d+) ?(?P<text>.*)$')
     GLOSS_REPLACE_REGEX = re.compile(r'\((LDV|simple|inexplicable|proper name|universal primitive)\) ')
-    categories = {}
+
+    # Many concepts come from the same verse, so keep a single copy of each verse's text
+    verse_texts = {}
 
     path = params[PARAM_INPUT_PATH]
-    with path.open() as f:
+    ref_range = params[PARAM_RANGE]
+    with text_utils.open_text(path) as f:
+        category = None
         concept = None
         for line_num, line in enumerate(f):
             if line.startswith('Concept'):
+                if concept:
+                    yield (category, concept)
+                concept = None
+
                 concept_match = CONCEPT_REGEX.match(line)
                 if not concept_match:
                     print('Unexpected format for Concept on line ' + str(line_num))
                     continue
                 gloss = concept_match['gloss'] or ''
-                concept = {
-                    CONCEPT_WORD: concept_match['word'],
-                    CONCEPT_GLOSS: GLOSS_REPLACE_REGEX.sub('', gloss)
-                }
+                concept = Concept(concept_match['word'], GLOSS_REPLACE_REGEX.sub('', gloss))
                 category = CATEGORY_PROPER if '(proper name)' in gloss else concept_match['category']
-                categories.setdefault(category, []).append(concept)
+
+            elif line.startswith('Current Passage'):
+                # This only appears once at the top of the text file
+                params[PARAM_PASSAGE] = line[len('Current Passage: '):].strip()
+
+            elif not concept:
+                continue
 
             elif line.startswith('Sample Sentence'):
-                concept[CONCEPT_SAMPLE] = line[len('Sample Sentence: '):].strip()
+                concept.sample = line[len('Sample Sentence: '):].strip()
 
             elif line.startswith('Verse'):
                 verse_match = VERSE_REGEX.match(line)
-                concept[CONCEPT_VERSE_REF] = verse_match['ref']
-                concept[CONCEPT_VERSE_TEXT] = verse_match['text']
-                concept[CONCEPT_OCCURRENCES] = extract_verse_occurrences(concept[CONCEPT_WORD], verse_match['text'], split_sentences=True)
+                if ref_range and not ref_range.contains_ref(verse_match['ref']):
+                    concept = None
+                    continue
+                concept.verse_ref = verse_match['ref']
+                concept.verse_text = verse_texts.setdefault(verse_match['text'], verse_match['text'])
 
             elif line.startswith('Target Words'):
-                concept[CONCEPT_TARGETS] = line[len('Target Words: '):].strip()
-                if CONCEPT_VERSE_TEXT in concept:
-                    # Redo finding the occurrences within the whole verse, rather than per sentence
-                    concept[CONCEPT_OCCURRENCES] = extract_verse_occurrences(concept[CONCEPT_WORD], concept[CONCEPT_VERSE_TEXT], split_sentences=False)
+                concept.targets = line[len('Target Words: '):].strip()
+
+        if concept:
+            yield (category, concept)
+
+
+# Common irregular forms that can't be found by adding a suffix to the word.
+# Since -ed and -d aren't matched for these words (e.g. seed isn't see), any regular past forms are listed as well.
+BUILTIN_INFLECTIONS = {
+    'arise': ['arose', 'arisen'],
+    'be': ['am', 'is', 'are', 'was', 'were', 'been', 'being'],
+    'bear': ['bore', 'born', 'borne'],
+    'beat': ['beaten'],
+    'become': ['became'],
+    'begin': ['began', 'begun'],
+    'bind': ['bound'],
+    'bite': ['bit', 'bitten'],
+    'bleed': ['bled'],
+    'blow': ['blew', 'blown'],
+    'break': ['broke', 'broken'],
+    'bring': ['brought'],
+    'build': ['built'],
+    'burn': ['burnt', 'burned'],
+    'buy': ['bought'],
+    'catch': ['caught'],
+    'child': ['children'],
+    'choose': ['chose', 'chosen'],
+    'come': ['came'],
+    'dig': ['dug'],
+    'do': ['does', 'did', 'done'],
+    'draw': ['drew', 'drawn'],
+    'drink': ['drank', 'drunk'],
+    'drive': ['drove', 'driven'],
+    'eat': ['ate', 'eaten'],
+    'fall': ['fell', 'fallen'],
+    'feed': ['fed'],
+    'feel': ['felt'],
+    'fight': ['fought'],
+    'find': ['found'],
+    'flee': ['fled'],
+    'fly': ['flew', 'flown', 'flies'],
+    'foot': ['feet'],
+    'forget': ['forgot', 'forgotten'],
+    'forgive': ['forgave', 'forgiven'],
+    'freeze': ['froze', 'frozen'],
+    'get': ['got', 'gotten'],
+    'give': ['gave', 'given'],
+    'go': ['went', 'gone', 'goes'],
+    'goose': ['geese'],
+    'grind': ['ground'],
+    'grow': ['grew', 'grown'],
+    'hang': ['hung', 'hanged'],
+    'have': ['has', 'had', 'having'],
+    'hear': ['heard'],
+    'hide': ['hid', 'hidden'],
+    'hold': ['held'],
+    'keep': ['kept'],
+    'kneel': ['knelt', 'kneeled'],
+    'know': ['knew', 'known'],
+    'lay': ['laid'],
+    'lead': ['led'],
+    'leave': ['left'],
+    'lend': ['lent'],
+    'lie': ['lay', 'lain', 'lying', 'lied'],
+    'lose': ['lost'],
+    'louse': ['lice'],
+    'make': ['made'],
+    'man': ['men'],
+    'mean': ['meant'],
+    'meet': ['met'],
+    'mouse': ['mice'],
+    'ox': ['oxen'],
+    'pay': ['paid'],
+    'person': ['people'],
+    'ride': ['rode', 'ridden'],
+    'ring': ['rang', 'rung', 'ringed'],
+    'rise': ['rose', 'risen'],
+    'run': ['ran'],
+    'say': ['said'],
+    'see': ['saw', 'seen'],
+    'seek': ['sought'],
+    'sell': ['sold'],
+    'send': ['sent'],
+    'shake': ['shook', 'shaken'],
+    'shine': ['shone', 'shined'],
+    'shoot': ['shot'],
+    'sing': ['sang', 'sung'],
+    'sink': ['sank', 'sunk'],
+    'sit': ['sat'],
+    'slay': ['slew', 'slain'],
+    'sleep': ['slept'],
+    'speak': ['spoke', 'spoken'],
+    'spend': ['spent'],
+    'stand': ['stood'],
+    'steal': ['stole', 'stolen'],
+    'strike': ['struck', 'stricken'],
+    'swear': ['swore', 'sworn'],
+    'take': ['took', 'taken'],
+    'teach': ['taught'],
+    'tear': ['tore', 'torn'],
+    'tell': ['told'],
+    'think': ['thought'],
+    'throw': ['threw', 'thrown'],
+    'tooth': ['teeth'],
+    'understand': ['understood'],
+    'wake': ['woke', 'woken'],
+    'wear': ['wore', 'worn'],
+    'weep': ['wept'],
+    'wife': ['wives'],
+    'win': ['won'],
+    'woman': ['women'],
+    'write': ['wrote', 'written'],
+    # Adjectives
+    'bad': ['worse', 'worst'],
+    'good': ['better', 'best'],
+    'many': ['more', 'most'],
+    'little': ['less', 'least'],
+}
+
+class InflectionIndex:
+    """
+    Maps inflected forms of words (e.g. "went", "children") back to their lemmas ("go", "child").
+    Forms that aren't in the index fall back to guessing the lemma by undoing the regular English endings.
+    """
+    def __init__(self, inflections=BUILTIN_INFLECTIONS):
+        self.lemmas: dict[str, set[str]] = {}
+        self.irregular_lemmas: set[str] = set()
+        self.add(inflections)
+
+    def add(self, inflections: dict[str, list[str]]):
+        for lemma, forms in inflections.items():
+            self.irregular_lemmas.add(lemma.lower())
+            for form in forms:
+                self.lemmas.setdefault(form.lower(), set()).add(lemma.lower())
+
+    def load(self, path: Path):
+        """
+        Load more forms from a text file with a line for each lemma, like:
+        go: went, gone, goes
+        """
+        inflections = {}
+        with text_utils.open_text(path) as f:
+            for line_num, line in enumerate(f):
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                lemma, sep, forms = line.partition(':')
+                if not sep or not lemma.strip():
+                    print(f'Unexpected format for inflections on line {line_num+1}')
+                    continue
+                inflections.setdefault(lemma.strip(), []).extend(form.strip() for form in forms.split(',') if form.strip())
+        self.add(inflections)
+
+    def get_lemma_endings(self, form: str):
+        """
+        Returns a dict of the possible lemmas of a form -> the endings that were undone to get them.
+        The ending is None for the forms in the index, since they are always that lemma.
+        """
+        form = form.lower()
+        if form in self.lemmas:
+            return { lemma: {None} for lemma in self.lemmas[form] }
+        return get_stems(form)
+
+
+# The regular endings that get_stems() undoes, and the categories of words that can have them.
+# Many ordinary words look like they have one of these endings (e.g. "manner", "letter", "evening"),
+# so a guessed lemma is only used for a concept whose category can actually have that ending.
+CATEGORY_ENDINGS = {
+    CATEGORY_NOUN: ('ies', 'ves'),
+    CATEGORY_VERB: ('ing', 'ed', 'ies'),
+    CATEGORY_ADJECTIVE: ('er', 'est'),
+}
+
+
+def get_stems(form):
+    """
+    Guess the possible lemmas of a regularly inflected word, e.g. "carried" -> "carry", "running" -> "run".
+    Returns a dict of lemma -> the endings that were undone to get it.
+    Only the endings that WordMatcher doesn't already allow for are undone here.
+    """
+    stems = {}
+    add = lambda lemma, ending: stems.setdefault(lemma, set()).add(ending)
+    for ending in ('ing', 'ed', 'er', 'est'):
+        stem = form[:-len(ending)]
+        if not form.endswith(ending) or len(stem) < 2:
+            continue
+        add(stem, ending)
+        if not stem.endswith('e'):
+            add(stem + 'e', ending)         # making -> make, larger -> large (but not seed -> see)
+        if len(stem) > 2 and stem[-1] == stem[-2]:
+            add(stem[:-1], ending)          # stopped -> stop, bigger -> big
+        if stem.endswith('i'):
+            add(stem[:-1] + 'y', ending)    # carried -> carry, happiest -> happy
+        if stem.endswith('y') and ending == 'ing':
+            add(stem[:-1] + 'ie', ending)   # dying -> die
+    if form.endswith('ies') and len(form) > 4:
+        add(form[:-3] + 'y', 'ies')         # cities -> city
+    if form.endswith('ves') and len(form) > 4:
+        add(form[:-3] + 'f', 'ves')         # loaves -> loaf
+        add(form[:-3] + 'fe', 'ves')        # knives -> knife
+    return stems
 
-            elif line.startswith('Current Passage'):
-                # This only appears once at the top of the text file
-                params[PARAM_PASSAGE] = line[len('Current Passage: '):].strip()
 
-    # Only for debug purposes
-    # for k,v in categories.items():
-    #     print(f'Retrieved {len(v)} {k} unlinked concepts from "{path}"')
+SENTENCE_REGEX = re.compile(r'([^.?!]+[.?!]\S*) ?')
+BOUNDARY_REGEX = re.compile(r'\b')
+TOKEN_REGEX = re.compile(r'\w+')
+WORD_SUFFIXES = ('s', 'es', 'ed', 'd', '')
+PAST_SUFFIXES = ('ed', 'd')
+WORD_END = None
+
+class WordMatcher:
+    """
+    Finds all of a set of words in a text with a single scan, using a trie of the words.
+    This gives the same results as searching for each word separately with
+    r'\b(word(?:s|es|ed|d)?)\b' (ignoring case), without compiling a regex for each one.
+    If an InflectionIndex is given, each token of the text is also looked up in it to find irregular forms,
+    and words with irregular forms don't get the -ed or -d suffixes (so "seed" isn't "see").
+    Regular endings it guesses (see CATEGORY_ENDINGS) are only matched for words whose categories are given in word_categories.
+    Results are cached per text, since the same verse is usually shared by several concepts.
+    """
+    def __init__(self, words, inflections: InflectionIndex|None = None, word_categories: dict[str, set[str]]|None = None):
+        self.inflections = inflections
+        self.word_categories = word_categories or {}
+        self.irregular_lemmas = inflections.irregular_lemmas if inflections else set()
+        self.lemma_words = {}
+        self.trie = {}
+        for word in words:
+            self.lemma_words.setdefault(word.lower(), []).append(word)
+            node = self.trie
+            for char in word.lower():
+                node = node.setdefault(char, {})
+            # Words that only differ by case end at the same node
+            node.setdefault(WORD_END, []).append(word)
+        self.matches = {}
+        self.sentences = {}
+
+    def split_sentences(self, text):
+        if text not in self.sentences:
+            self.sentences[text] = SENTENCE_REGEX.findall(text)
+        return self.sentences[text]
+
+    def find(self, text):
+        """
+        Returns a dict of word -> list of (start, end) spans for the words that are in the text.
+        """
+        if text in self.matches:
+            return self.matches[text]
+
+        # Lowercasing can change the length of some characters, which would throw the spans off
+        lower_text = text.lower()
+        if len(lower_text) != len(text):
+            lower_text = ''.join(char if len(char.lower()) != 1 else char.lower() for char in text)
+
+        boundaries = {match.start() for match in BOUNDARY_REGEX.finditer(text)}
+        matches = {}
+        last_ends = {}
+        for start in sorted(boundaries):
+            node = self.trie
+            idx = start
+            while node is not None:
+                for word in node.get(WORD_END, ()):
+                    # Matches for the same word can't overlap, just like re.finditer
+                    if last_ends.get(word, 0) > start:
+                        continue
+                    for suffix in WORD_SUFFIXES:
+                        if suffix in PAST_SUFFIXES and word.lower() in self.irregular_lemmas:
+                            continue
+                        end = idx + len(suffix)
+                        if end in boundaries and lower_text.startswith(suffix, idx):
+                            matches.setdefault(word, []).append((start, end))
+                            last_ends[word] = end
+                            break
+                if idx >= len(lower_text):
+                    break
+                node = node.get(lower_text[idx])
+                idx += 1
+
+        if self.inflections:
+            self.find_inflections(text, matches)
+
+        self.matches[text] = matches
+        return matches
+
+
+    def find_inflections(self, text, matches):
+        changed = set()
+        for token in TOKEN_REGEX.finditer(text):
+            for lemma, endings in self.inflections.get_lemma_endings(token[0]).items():
+                for word in self.lemma_words.get(lemma, ()):
+                    if not any(self.allows_ending(word, ending) for ending in endings):
+                        continue
+                    spans = matches.setdefault(word, [])
+                    if token.span() not in spans:
+                        spans.append(token.span())
+                        changed.add(word)
+        for word in changed:
+            matches[word].sort()
+
+    def allows_ending(self, word, ending):
+        return ending is None or any(ending in CATEGORY_ENDINGS.get(category, ()) for category in self.word_categories.get(word, ()))
+
+
+def get_base_word(word):
+    # Remove the sense -X from the word
+    return word[:word.rindex('-')]
+
+
+def find_occurrences(categories, inflections=None):
+    word_categories = {}
+    for category, concepts in categories.items():
+        for concept in concepts:
+            word_categories.setdefault(get_base_word(concept.word), set()).add(category)
+    matcher = WordMatcher(word_categories.keys(), inflections, word_categories)
+    for concept in (concept for concepts in categories.values() for concept in concepts):
+        if concept.verse_text is None:
+            continue
+
+        # The verse might have an unrecognizable form of the word, the word
+        # might not be present at all due to restructuring. 
+        # When there are target words, show the whole verse rather than just the sentences with the word.
+        word = get_base_word(concept.word)
+        texts = [concept.verse_text] if concept.targets is not None else matcher.split_sentences(concept.verse_text)
+        concept.occurrences = [Occurrence(text, spans) for text in texts if (spans := matcher.find(text).get(word))]
+
+
+def select_concepts(categories, params, inflections: InflectionIndex|None = None):
+    """
+    Use the cache of concepts that were already exported to either leave them out (--new-only),
+    or add them all to make a lexicon for the whole project (--lexicon).
+    The concepts from the cache are found in their verses with the same inflections as the rest.
+    """
+    with lexicon_cache.LexiconCache(params[PARAM_CACHE_PATH]) as cache:
+        if params[PARAM_NEW_ONLY]:
+            new_categories = {}
+            for category, concepts in categories.items():
+                new_concepts = [concept for concept in concepts if not cache.contains(category, concept.word)]
+                if new_concepts:
+                    new_categories[category] = new_concepts
+            skipped = sum(len(concepts) for concepts in categories.values()) - sum(len(concepts) for concepts in new_categories.values())
+            print(f'Skipping {skipped} concepts that were already exported')
+            categories = new_categories
+
+        if params[PARAM_LEXICON]:
+            cached_concepts = {}
+            current_keys = {(category, concept.word) for category, concepts in categories.items() for concept in concepts}
+            for cached in cache.get_all():
+                if (cached.category, cached.word) not in current_keys:
+                    cached_concepts.setdefault(cached.category, []).append(from_cached_concept(cached))
+            find_occurrences(cached_concepts, inflections or load_inflections(params))
+
+            # Both lists are already in order, so they only need merging
+            categories = dict(categories)
+            for category, concepts in cached_concepts.items():
+                concepts.sort(key=Concept.sort_key)     # the cache's order is nearly the same, so this is cheap
+                categories[category] = list(heapq.merge(categories.get(category, []), concepts, key=Concept.sort_key))
+            params[PARAM_PASSAGE] = 'Lexicon'
+
     return categories
 
 
-SENTENCE_REGEX = re.compile(r'([^.?!]+[.?!]\S*) ?')
-def extract_verse_occurrences(word, text, split_sentences):
-    # Remove the sense -X from the word
-    dash_idx = word.rindex('-')
-    word = word[:dash_idx]
-    
-    occurrences = []
-
-    # The verse might have an unrecognizable form of the word, the word
-    # might not be present at all due to restructuring. 
-    word_regex = r'\b(' + re.escape(word) + r'(?:s|es|ed|d)?)\b'
-    texts = SENTENCE_REGEX.findall(text) if split_sentences else [text]
-    for text in texts:
-        word_matches = [word_match.span(1) for word_match in re.finditer(word_regex, text, re.IGNORECASE)]
-        if word_matches:
-            occurrences.append({
-                'text': text,
-                'locations': word_matches,
-            })
-
-    return occurrences
+def record_concepts(categories, params):
+    # Only called once the document has been saved, so nothing is marked as exported if it wasn't
+    with lexicon_cache.LexiconCache(params[PARAM_CACHE_PATH]) as cache:
+        cache.add(to_cached_concept(category, concept, params[PARAM_OUTPUT_PATH].name)
+                  for category, concepts in categories.items() for concept in concepts)
+
+
+def to_cached_concept(category, concept, document):
+    return lexicon_cache.CachedConcept(category, concept.word, concept.gloss, concept.verse_ref, concept.verse_text, concept.sample, concept.targets, document)
+
+
+def from_cached_concept(cached):
+    concept = Concept(cached.word, cached.gloss)
+    concept.verse_ref = cached.verse_ref
+    concept.verse_text = cached.verse_text
+    concept.sample = cached.sample
+    concept.targets = cached.targets
+    return concept
 
 
 def export_document(categories, params):
-    doc = doc_utils.create_doc(landscape=True, mx=2.54)
+    doc = doc_utils.create_doc(landscape=True, mx=2.54, doc_format=params[PARAM_FORMAT])
 
     # Add the passage as a heading
     doc_utils.add_paragraph(doc, { 'text': params[PARAM_PASSAGE] , 'bold': True, 'size': 14 })
@@ -157,21 +636,46 @@ def export_document(categories, params):
         CATEGORY_PHRASAL,
     ]
     ordered_categories = sorted(categories.items(), key=lambda kv: table_order.index(kv[0]))
-    for idx, (category, concepts) in enumerate(ordered_categories):
-        create_table(category, concepts, idx+1, doc, params[PARAM_NOTES_COLUMN])
+    if params[PARAM_PARALLEL]:
+        # Build the rows for each category in a separate process, and then put the tables together in order
+        with ProcessPoolExecutor() as executor:
+            rendered_tables = [executor.submit(render_table, category, concepts, params[PARAM_NOTES_COLUMN], params[PARAM_FORMAT]) for category, concepts in ordered_categories]
+            for idx, ((category, concepts), rendered) in enumerate(zip(ordered_categories, rendered_tables)):
+                create_table(category, concepts, idx+1, doc, params[PARAM_NOTES_COLUMN], rendered)
+    else:
+        for idx, (category, concepts) in enumerate(ordered_categories):
+            create_table(category, concepts, idx+1, doc, params[PARAM_NOTES_COLUMN])
 
     try:
-        doc.save(str(params[PARAM_OUTPUT_PATH]))
+        params[PARAM_OUTPUT_PATH] = doc_utils.save_document(doc, params[PARAM_OUTPUT_PATH])
         return True
     except PermissionError:
         err_text = f'"{params[PARAM_OUTPUT_PATH].name}" is currently open. Please close and try again.'
         print("Error: " + err_text)
-        import ctypes  
-        ctypes.windll.user32.MessageBoxW(0, err_text, "Error Creating Word Document", 0 + 16)
+        error_utils.show_error_dialog(err_text)
         return False
 
 
-def create_table(category, concepts, table_num, doc, add_notes_column):
+def create_table(category, concepts, table_num, doc, add_notes_column, rendered=None):
+    (col_names, col_widths) = get_columns(category, add_notes_column)
+
+    if table_num > 1:
+        doc_utils.add_paragraph(doc, formatting={ 'space_after': 0 })
+
+    caption = f'Table {table_num}. {category}s'
+    if rendered:
+        doc_utils.add_rendered_table(doc, [rendered], col_widths, caption=caption)
+    else:
+        doc_utils.add_table(doc, get_table_data(category, concepts, col_names), col_widths, caption=caption)
+
+
+def render_table(category, concepts, add_notes_column, doc_format=doc_utils.FORMAT_DOCX):
+    # This is run in a worker process
+    (col_names, col_widths) = get_columns(category, add_notes_column)
+    return doc_utils.render_table_rows(get_table_data(category, concepts, col_names), col_widths, doc_format)
+
+
+def get_columns(category, add_notes_column):
     # Figure out the column names and widths
     if category == CATEGORY_PROPER:
         col_names = [f'Nouns: {category}s', HEADER_GLOSS, HEADER_TARGET_WORD]
@@ -182,40 +686,41 @@ def create_table(category, concepts, table_num, doc, add_notes_column):
     else:
         col_names = [category + 's', HEADER_GLOSS, HEADER_OCCURRENCE, HEADER_SAMPLE, HEADER_TARGET_WORD, HEADER_TARGET_GLOSS]
         col_widths = [2.7, 3.2, 6.3, 4, 3.4, 3.4]
+    return (col_names, col_widths)
 
-    if table_num > 1:
-        doc_utils.add_paragraph(doc, formatting={ 'space_after': 0 })
 
+def get_table_data(category, concepts, col_names):
     table_data = [
         # the header row
         [{ 'text': name, 'highlight': name == HEADER_TARGET_WORD } for name in col_names],
     ]
     table_data.extend(get_concept_rows(category, concepts))
-
-    doc_utils.add_table(doc, table_data, col_widths, caption=f'Table {table_num}. {category}s')
+    return table_data
 
 
 def get_concept_rows(category, concepts):
-    # TODO do we need to alphabetize the concepts?
     if category == CATEGORY_PROPER:
-        return [[concept[CONCEPT_WORD], concept[CONCEPT_GLOSS]] for concept in concepts]
+        return [[concept.word, concept.gloss] for concept in concepts]
     else:
-        return [[concept[CONCEPT_WORD], concept[CONCEPT_GLOSS], add_verse_sentences(concept), add_sample_sentences(concept), add_target_words(concept)] for concept in concepts]
+        return [[concept.word, concept.gloss, add_verse_sentences(concept), add_sample_sentences(concept), add_target_words(concept)] for concept in concepts]
 
 
 def add_verse_sentences(concept):
-    if CONCEPT_OCCURRENCES not in concept or not concept[CONCEPT_OCCURRENCES]:
+    if not concept.occurrences:
         # Show the whole verse and highlight the text so the user knows to attend to it
-        return { 'text': concept[CONCEPT_VERSE_REF] + ' ' + concept[CONCEPT_VERSE_TEXT], 'highlight': True, 'size': 10 }
+        runs = [{ 'text': concept.verse_ref + ' ' + concept.verse_text, 'highlight': True }]
+        add_other_refs(concept, runs)
+        for run in runs:
+            run['size'] = 10
+        return runs if len(runs) > 1 else runs[0]
 
-    runs = [{ 'text': concept[CONCEPT_VERSE_REF] }]
+    runs = [{ 'text': concept.verse_ref }]
 
     # Show each occurrence of the word in bold
-    for occurrence in concept[CONCEPT_OCCURRENCES]:
-        text = occurrence['text']
+    for text, locations in concept.occurrences:
         last_end = 0
         runs.append({ 'text': ' ' })
-        for occ_start, occ_end in occurrence['locations']:
+        for occ_start, occ_end in locations:
             if occ_start > last_end:
                 runs.append({ 'text': text[last_end:occ_start] })
             runs.append({ 'text': text[occ_start:occ_end], 'bold': True })
@@ -224,39 +729,78 @@ def add_verse_sentences(concept):
         if last_end < len(text):
             runs.append({ 'text': text[last_end:] })
 
+    add_other_refs(concept, runs)
     for run in runs:
         run['size'] = 10
     return runs
 
 
+def add_other_refs(concept, runs):
+    if concept.other_refs:
+        runs.append({ 'text': f' (also in {", ".join(concept.other_refs)})' })
+
+
 def add_sample_sentences(concept):
-    if CONCEPT_SAMPLE not in concept:
+    if concept.sample is None:
         return ''
 
     # Start with the sample sentence itself with the separating bar
     return [
-        { 'text': concept[CONCEPT_SAMPLE] + ' | ', 'size': 10 },
+        { 'text': concept.sample + ' | ', 'size': 10 },
         { 'text': 'Translation here.', 'highlight': True, 'size': 10 },
     ]
 
 
 def add_target_words(concept):
-    if CONCEPT_TARGETS not in concept:
+    if concept.targets is None:
         return ''
-    return concept[CONCEPT_TARGETS]
+    return concept.targets
 
 
-if __name__ == "__main__":
-    params = get_params()
-    if params:
-        concepts = import_concepts(params)
+def get_memo_options(params):
+    # Everything apart from the text and the inflections file that changes the document
+    return { 'script': 'tbta_missing_concepts_to_word', 'notes': params[PARAM_NOTES_COLUMN], 'range': params[PARAM_RANGE], 'format': params[PARAM_FORMAT] }
+
+
+def main(argv):
+    params = get_params(argv)
+    if not params:
+        return False
+
+    # If the same text was already exported with the same options, the document is left as it is.
+    # That can't be known when the cache is used, since what is exported depends on what was exported before.
+    memo = None
+    output_path = params[PARAM_OUTPUT_PATH]
+    if not params[PARAM_CACHE_PATH]:
+        input_paths = [params[PARAM_INPUT_PATH], *([params[PARAM_INFLECTIONS_PATH]] if params[PARAM_INFLECTIONS_PATH] else [])]
+        memo = output_memo.get_memo(output_path, input_paths, get_memo_options(params))
+    unchanged_paths = output_memo.find_unchanged(memo) if memo and not params[PARAM_REBUILD] else None
+    if unchanged_paths:
+        print(f'"{params[PARAM_INPUT_PATH].name}" has not changed since "{unchanged_paths[0].name}" was made, so it was not exported again')
+    else:
+        inflections = load_inflections(params)
+        concepts = import_concepts(params, inflections)
+        exported_concepts = select_concepts(concepts, params, inflections) if params[PARAM_CACHE_PATH] else concepts
         start = time.time()
-        success = export_document(concepts, params)
+        success = export_document(exported_concepts, params)
         end = time.time()
         print('time elapsed:', end-start)
-        if success:
-        # if export_document(concepts, params):
-            if not params[PARAM_TEST]:
-                print(f'Deleting {params[PARAM_INPUT_PATH]}')
-                params[PARAM_INPUT_PATH].unlink()   # delete the original text file
-            print(f'Successfully exported "{params[PARAM_OUTPUT_PATH]}"')
+        if not success:
+            return False
+        if params[PARAM_CACHE_PATH]:
+            record_concepts(concepts, params)
+        if memo:
+            # Nothing is recorded if the document had to be saved with another name
+            output_memo.save_memo(memo, [output_path] if params[PARAM_OUTPUT_PATH] == output_path else [])
+    if not params[PARAM_TEST]:
+        print(f'Deleting {params[PARAM_INPUT_PATH]}')
+        params[PARAM_INPUT_PATH].unlink()   # delete the original text file
+    print(f'Successfully exported "{params[PARAM_OUTPUT_PATH]}"')
+    return True
+
+
+if __name__ == "__main__":
+    # Needed for the worker processes when running as a frozen executable
+    multiprocessing.freeze_support()
+    main(sys.argv)
+
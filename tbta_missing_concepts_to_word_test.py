@@ -1,18 +1,31 @@
 import unittest
+import re
+import shutil
+import tempfile
+import zipfile
+from unittest.mock import patch
 from pathlib import Path
 from tbta_missing_concepts_to_word import *
+import ref_utils
 
-def setup_params(file_name, export_name=None, notes=False):
+def setup_params(file_name, export_name=None, notes=False, parallel=False):
     file_path = Path('./test_docs/missing_concepts_to_word/' + file_name)
     return {
         PARAM_INPUT_PATH: file_path,
         PARAM_OUTPUT_PATH: file_path.with_name(f'Lexicon - {export_name or file_path.stem}.docx'),
         PARAM_NOTES_COLUMN: notes,
+        PARAM_INFLECTIONS_PATH: None,
+        PARAM_CACHE_PATH: None,
+        PARAM_NEW_ONLY: False,
+        PARAM_LEXICON: False,
+        PARAM_RANGE: None,
+        PARAM_FORMAT: doc_utils.FORMAT_DOCX,
+        PARAM_PARALLEL: parallel,
     }
 
 def find_concept(word, category):
     for concept in category:
-        if concept[CONCEPT_WORD] == word:
+        if concept.word == word:
             return concept
     return None
 
@@ -37,31 +50,41 @@ class TestImportConcepts(unittest.TestCase):
         # Regular verb
         concept = find_concept('describe-A', concepts[CATEGORY_VERB])
         self.assertIsNotNone(concept)
-        self.assertIn(CONCEPT_SAMPLE, concept)
-        self.assertIn(CONCEPT_OCCURRENCES, concept)
-        self.assertEqual(1, len(concept[CONCEPT_OCCURRENCES]))
+        self.assertIsNotNone(concept.sample)
+        self.assertIsNotNone(concept.occurrences)
+        self.assertEqual(1, len(concept.occurrences))
 
         # Regular proper noun
         concept = find_concept('Media-A', concepts[CATEGORY_PROPER])
         self.assertIsNotNone(concept)
-        self.assertNotEqual('', concept[CONCEPT_GLOSS])
-        self.assertNotIn(CONCEPT_SAMPLE, concept)
-        self.assertIn(CONCEPT_OCCURRENCES, concept)
-        self.assertEqual(1, len(concept[CONCEPT_OCCURRENCES]))
+        self.assertNotEqual('', concept.gloss)
+        self.assertIsNone(concept.sample)
+        self.assertIsNotNone(concept.occurrences)
+        self.assertEqual(1, len(concept.occurrences))
 
         # missing gloss
         concept = find_concept('Karshena-A', concepts[CATEGORY_NOUN])
         self.assertIsNotNone(concept)
-        self.assertEqual('', concept[CONCEPT_GLOSS])
+        self.assertEqual('', concept.gloss)
 
         # missing verse text
         concept = find_concept('cup-A', concepts[CATEGORY_NOUN])
         self.assertIsNotNone(concept)
-        self.assertEqual('', concept[CONCEPT_VERSE_TEXT])
-        self.assertIn(CONCEPT_OCCURRENCES, concept)
-        self.assertEqual(0, len(concept[CONCEPT_OCCURRENCES]))
+        self.assertEqual('', concept.verse_text)
+        self.assertIsNotNone(concept.occurrences)
+        self.assertEqual(0, len(concept.occurrences))
 
 
+    def test_range(self):
+        params = setup_params('Esther 1 Issues.txt')
+        params[PARAM_RANGE] = ref_utils.parse_range('Esther 1:6')
+        concepts = import_concepts(params)
+
+        all_concepts = [concept for category in concepts.values() for concept in category]
+        self.assertTrue(all_concepts)
+        self.assertTrue(all(concept.verse_ref == 'Esther 1:6' for concept in all_concepts))
+        self.assertIsNone(find_concept('Media-A', concepts.get(CATEGORY_PROPER, [])))
+
     def test_export_no_notes(self):
         params = setup_params('Esther 1 Issues.txt')
         concepts = import_concepts(params)
@@ -87,11 +110,214 @@ class TestImportConcepts(unittest.TestCase):
 
         much = find_concept('much-A', concepts[CATEGORY_ADVERB])
         self.assertIsNotNone(much)
-        self.assertIn(CONCEPT_TARGETS, much)
-        self.assertGreater(len(much[CONCEPT_TARGETS]), 0)
+        self.assertIsNotNone(much.targets)
+        self.assertGreater(len(much.targets), 0)
 
         export_document(concepts, params)
 
 
+    def test_export_parallel(self):
+        documents = []
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for parallel in [False, True]:
+                params = setup_params('Esther 1 Issues.txt', notes=True, parallel=parallel)
+                params[PARAM_OUTPUT_PATH] = Path(temp_dir) / f'Lexicon {parallel}.docx'
+                concepts = import_concepts(params)
+                self.assertTrue(export_document(concepts, params))
+                with zipfile.ZipFile(params[PARAM_OUTPUT_PATH]) as docx:
+                    documents.append(docx.read('word/document.xml'))
+
+        # The tables built in parallel should come out exactly the same
+        self.assertEqual(documents[0], documents[1])
+
+
+    def test_alphabetical(self):
+        params = setup_params('Esther 1 Issues.txt')
+        concepts = import_concepts(params)
+        for category in concepts.values():
+            words = [concept.word.lower() for concept in category]
+            self.assertEqual(sorted(words), words)
+
+
+    def test_duplicates(self):
+        params = setup_params('Duplicate Issues.txt')
+        concepts = import_concepts(params)
+
+        # Each concept only gets one row, with the other verses listed
+        self.assertEqual(['banquet-A', 'king-A'], [concept.word for concept in concepts[CATEGORY_NOUN]])
+        king = concepts[CATEGORY_NOUN][1]
+        self.assertEqual('Esther 1:1', king.verse_ref)
+        self.assertEqual(['Esther 1:3', 'Esther 1:2'], king.other_refs)
+        runs = add_verse_sentences(king)
+        self.assertEqual(' (also in Esther 1:3, Esther 1:2)', runs[-1]['text'])
+
+        # Concepts from the same verse share the verse text
+        angry = concepts[CATEGORY_ADJECTIVE][0]
+        self.assertIs(king.verse_text, angry.verse_text)
+
+
+class TestWordMatcher(unittest.TestCase):
+
+    def test_suffixes(self):
+        matcher = WordMatcher(['describe', 'king', 'banquet'])
+        text = 'The King described the kings banquets. The kingdom kinged.'
+        matches = matcher.find(text)
+        self.assertEqual([(4, 8), (23, 28), (51, 57)], matches['king'])
+        self.assertEqual([(9, 18)], matches['describe'])
+        self.assertEqual([(29, 37)], matches['banquet'])
+
+
+    def test_same_as_regex(self):
+        # Every concept should find exactly what a separate regex for its word would find
+        params = setup_params('Esther 1 Issues.txt')
+        concepts = [concept for category in import_concepts(params).values() for concept in category]
+        words = {concept.word[:concept.word.rindex('-')] for concept in concepts}
+        matcher = WordMatcher(words)
+        for text in {concept.verse_text for concept in concepts if concept.verse_text}:
+            matches = matcher.find(text)
+            for word in words:
+                expected = [match.span(1) for match in re.finditer(r'\b(' + re.escape(word) + r'(?:s|es|ed|d)?)\b', text, re.IGNORECASE)]
+                self.assertEqual(expected, matches.get(word, []), f'{word} in "{text}"')
+
+
+class TestInflections(unittest.TestCase):
+
+    def test_irregular_forms(self):
+        matcher = WordMatcher(['go', 'child', 'eat', 'king'], InflectionIndex())
+        text = 'The king went out, and the children ate.'
+        matches = matcher.find(text)
+        self.assertEqual(['went'], [text[start:end] for start, end in matches['go']])
+        self.assertEqual(['children'], [text[start:end] for start, end in matches['child']])
+        self.assertEqual(['ate'], [text[start:end] for start, end in matches['eat']])
+        self.assertEqual(['king'], [text[start:end] for start, end in matches['king']])
+
+
+    def test_stemmer(self):
+        self.assertEqual({'ed'}, get_stems('carried')['carry'])
+        self.assertEqual({'ing'}, get_stems('running')['run'])
+        self.assertEqual({'ing'}, get_stems('making')['make'])
+        self.assertEqual({'er'}, get_stems('bigger')['big'])
+        self.assertEqual({'ies'}, get_stems('cities')['city'])
+        self.assertEqual({'ing'}, get_stems('dying')['die'])
+
+
+    def test_regular_endings(self):
+        words = { 'carry': {CATEGORY_VERB}, 'city': {CATEGORY_NOUN}, 'big': {CATEGORY_ADJECTIVE}, 'happy': {CATEGORY_ADJECTIVE} }
+        matcher = WordMatcher(words.keys(), InflectionIndex(), words)
+        text = 'The happiest man carried the bigger stone through the cities.'
+        matches = matcher.find(text)
+        self.assertEqual(['carried'], [text[start:end] for start, end in matches['carry']])
+        self.assertEqual(['cities'], [text[start:end] for start, end in matches['city']])
+        self.assertEqual(['bigger'], [text[start:end] for start, end in matches['big']])
+        self.assertEqual(['happiest'], [text[start:end] for start, end in matches['happy']])
+
+
+    def test_false_endings(self):
+        # Words that only look like they have a regular ending aren't matched to unrelated concepts
+        words = {
+            'man': {CATEGORY_NOUN}, 'let': {CATEGORY_VERB}, 'but': {CATEGORY_CONJUNCTION}, 'sin': {CATEGORY_NOUN, CATEGORY_VERB},
+            'in': {CATEGORY_ADPOSITION}, 'up': {CATEGORY_ADPOSITION}, 'see': {CATEGORY_VERB}, 'even': {CATEGORY_ADVERB, CATEGORY_ADJECTIVE},
+        }
+        matcher = WordMatcher(words.keys(), InflectionIndex(), words)
+        for text in ['In this manner', 'He wrote a letter', 'They ate butter', 'The sinner wept', 'The inner room', 'The upper room', 'He sowed seed', 'In the evening']:
+            matches = matcher.find(text)
+            for word in words:
+                self.assertFalse([span for span in matches.get(word, []) if text[span[0]:span[1]].lower() != word], f'{word} in "{text}"')
+
+        # Without categories only the irregular forms are matched
+        matcher = WordMatcher(['carry', 'go'], InflectionIndex())
+        self.assertEqual(['go'], list(matcher.find('He carried it and went.')))
+
+
+    def test_load(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / 'inflections.txt'
+            path.write_text('# extra forms\nsmite: smote, smitten\nnot a lemma line\n', encoding='utf-8')
+            inflections = InflectionIndex()
+            inflections.load(path)
+
+        self.assertEqual({'smite': {None}}, inflections.get_lemma_endings('Smote'))
+        self.assertEqual({'smite': {None}}, inflections.get_lemma_endings('smitten'))
+        # The built in forms are still there
+        self.assertEqual({'go': {None}}, inflections.get_lemma_endings('went'))
+
+
+    def test_import(self):
+        params = setup_params('Esther 1 Issues.txt')
+        concepts = import_concepts(params)
+
+        # Only found from its irregular past tense
+        concept = find_concept('hang-C', concepts[CATEGORY_VERB])
+        self.assertEqual(1, len(concept.occurrences))
+        text, locations = concept.occurrences[0]
+        self.assertEqual(['hung'], [text[start:end] for start, end in locations])
+
+
+class TestLexiconCache(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.dir = Path(self.temp_dir.name)
+        for file_name in ['Esther 1 Issues.txt', 'Duplicate Issues.txt']:
+            shutil.copy('./test_docs/missing_concepts_to_word/' + file_name, self.dir)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_new_only(self):
+        self.assertTrue(main(['', '--new-only', '-t', str(self.dir / 'Esther 1 Issues.txt')]))
+        self.assertTrue((self.dir / lexicon_cache.CACHE_FILE_NAME).exists())
+
+        params = get_params(['', '--new-only', '-t', str(self.dir / 'Duplicate Issues.txt')])
+        concepts = select_concepts(import_concepts(params), params)
+
+        # angry-B and Xerxes-A were already exported with Esther 1
+        self.assertEqual(['banquet-A', 'king-A'], [concept.word for concept in concepts[CATEGORY_NOUN]])
+        self.assertNotIn(CATEGORY_ADJECTIVE, concepts)
+        self.assertNotIn(CATEGORY_PROPER, concepts)
+
+    def test_lexicon(self):
+        self.assertTrue(main(['', '--new-only', '-t', str(self.dir / 'Esther 1 Issues.txt')]))
+        esther_concepts = import_concepts(setup_params('Esther 1 Issues.txt'))
+
+        params = get_params(['', '--lexicon', '-t', str(self.dir / 'Duplicate Issues.txt')])
+        self.assertEqual(self.dir / 'Lexicon.docx', params[PARAM_OUTPUT_PATH])
+        concepts = select_concepts(import_concepts(params), params)
+
+        # Everything from Esther 1 plus the two new nouns, in alphabetical order
+        self.assertEqual(len(esther_concepts[CATEGORY_NOUN]) + 2, len(concepts[CATEGORY_NOUN]))
+        self.assertEqual(len(esther_concepts[CATEGORY_VERB]), len(concepts[CATEGORY_VERB]))
+        words = [concept.word.lower() for concept in concepts[CATEGORY_NOUN]]
+        self.assertEqual(sorted(words), words)
+        self.assertTrue(export_document(concepts, params))
+
+    def test_lexicon_inflections(self):
+        self.assertTrue(main(['', '--new-only', '-t', str(self.dir / 'Esther 1 Issues.txt')]))
+        params = get_params(['', '--lexicon', '-t', str(self.dir / 'Duplicate Issues.txt')])
+
+        # Make another word of a cached concept's verse into one of its forms, like an -i inflections file would
+        cached = find_concept('hang-C', import_concepts(setup_params('Esther 1 Issues.txt'))[CATEGORY_VERB])
+        form = next(word for word in re.findall(r'\w+', cached.verse_text) if len(word) > 3 and word.lower() not in ('hang', 'hung'))
+        inflections = InflectionIndex()
+        inflections.add({ 'hang': [form] })
+
+        concepts = select_concepts(import_concepts(params, inflections), params, inflections)
+        concept = find_concept('hang-C', concepts[CATEGORY_VERB])
+        self.assertIn(form, [text[start:end] for text, spans in concept.occurrences for start, end in spans])
+
+    def test_memo(self):
+        # Without the cache, the same text isn't exported again
+        input_path = self.dir / 'Esther 1 Issues.txt'
+        self.assertTrue(main(['', '-t', str(input_path)]))
+        self.assertTrue((self.dir / 'Lexicon - Esther 1 Issues.docx.memo').exists())
+        with patch('tbta_missing_concepts_to_word.export_document', return_value=True) as export:
+            self.assertTrue(main(['', '-t', str(input_path)]))
+            export.assert_not_called()
+
+            # With the cache, what is exported depends on what was exported before, so it's always exported
+            self.assertTrue(main(['', '--new-only', '-t', str(input_path)]))
+            export.assert_called_once()
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
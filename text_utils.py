@@ -0,0 +1,66 @@
+import io
+import codecs
+from contextlib import contextmanager
+from pathlib import Path
+
+SAMPLE_SIZE = 4096              # bytes looked at to work out the encoding
+FALLBACK_ENCODING = 'cp1252'    # what Windows uses for older files that aren't unicode
+
+BOMS = [
+    (codecs.BOM_UTF8, 'utf-8'),
+    (codecs.BOM_UTF16_LE, 'utf-16-le'),
+    (codecs.BOM_UTF16_BE, 'utf-16-be'),
+]
+
+
+def detect_encoding(sample: bytes):
+    """
+    Work out the encoding from the first bytes of a file. Returns (encoding, length of the BOM).
+    Without a BOM, text that is mostly ASCII in UTF-16 has a zero byte in every other position.
+    Otherwise the text is UTF-8 if it can be decoded as UTF-8, and if not it's taken to be the Windows code page.
+    """
+    for bom, encoding in BOMS:
+        if sample.startswith(bom):
+            return (encoding, len(bom))
+
+    if len(sample) >= 2:
+        even_zeros = sample[0::2].count(0)
+        odd_zeros = sample[1::2].count(0)
+        half = len(sample) // 2
+        if odd_zeros > half * 0.3 and even_zeros < half * 0.05:
+            return ('utf-16-le', 0)
+        if even_zeros > half * 0.3 and odd_zeros < half * 0.05:
+            return ('utf-16-be', 0)
+
+    try:
+        # The sample might end part way through a character, so don't treat that as an error
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        return ('utf-8', 0)
+    except UnicodeDecodeError:
+        return (FALLBACK_ENCODING, 0)
+
+
+def fallback_decode_error(error: UnicodeDecodeError):
+    # A file that looked like UTF-8 at the start can still have some Windows code page text further on,
+    # so decode just those bytes with the code page instead of failing part way through the file
+    bad_bytes = error.object[error.start:error.end]
+    return (bad_bytes.decode(FALLBACK_ENCODING, errors='replace'), error.end)
+
+FALLBACK_ERRORS = 'tbta-fallback'
+codecs.register_error(FALLBACK_ERRORS, fallback_decode_error)
+
+
+@contextmanager
+def open_text(path: Path):
+    """
+    Open a text file for reading whatever its encoding (UTF-8, UTF-16, or the Windows code page).
+    The encoding is worked out from the start of the file, which is then read and decoded as it goes, without reading anything twice.
+    Any BOM is skipped, and Windows, Mac and Unix line endings all become '\\n'.
+    Use it like path.open(): with open_text(path) as file: for line in file: ...
+    """
+    with path.open('rb') as raw_file:
+        encoding, bom_length = detect_encoding(raw_file.peek(SAMPLE_SIZE)[:SAMPLE_SIZE])
+        raw_file.read(bom_length)
+        errors = FALLBACK_ERRORS if encoding == 'utf-8' else 'replace'
+        with io.TextIOWrapper(raw_file, encoding=encoding, errors=errors, newline=None) as file:
+            yield file
@@ -0,0 +1,67 @@
+import unittest
+import tempfile
+from pathlib import Path
+from text_utils import *
+
+
+class TestOpenText(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.temp_dir.name) / 'text.txt'
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def read_lines(self, data: bytes):
+        self.path.write_bytes(data)
+        with open_text(self.path) as file:
+            return list(file)
+
+    def test_utf8(self):
+        text = 'Ruth 1:1\nEnglish: “Naomi’s” husband\n'
+        self.assertListEqual(['Ruth 1:1\n', 'English: “Naomi’s” husband\n'], self.read_lines(text.encode('utf-8')))
+        self.assertListEqual(['Ruth 1:1\n', 'English: “Naomi’s” husband\n'], self.read_lines(codecs.BOM_UTF8 + text.encode('utf-8')))
+
+    def test_utf16(self):
+        text = 'Ruth 1:1\r\nEnglish: “Naomi’s” husband\r\n'
+        expected = ['Ruth 1:1\n', 'English: “Naomi’s” husband\n']
+        self.assertListEqual(expected, self.read_lines(codecs.BOM_UTF16_LE + text.encode('utf-16-le')))
+        self.assertListEqual(expected, self.read_lines(codecs.BOM_UTF16_BE + text.encode('utf-16-be')))
+        # TBTA can also write UTF-16 without a BOM
+        self.assertListEqual(expected, self.read_lines(text.encode('utf-16-le')))
+        self.assertListEqual(expected, self.read_lines(text.encode('utf-16-be')))
+
+    def test_code_page(self):
+        text = 'Verse: Génesis 1:1 “En el principio”\n'
+        self.assertListEqual([text], self.read_lines(text.encode('cp1252')))
+
+    def test_code_page_after_sample(self):
+        # Text that is only UTF-8 for the first part of the file still reads the rest, without starting again
+        start = 'Ruth 1:1 “Naomi”\n' * (SAMPLE_SIZE // 10)
+        lines = self.read_lines(start.encode('utf-8') + 'Verse: Génesis 1:1\n'.encode('cp1252'))
+        self.assertEqual('Ruth 1:1 “Naomi”\n', lines[0])
+        self.assertEqual('Verse: Génesis 1:1\n', lines[-1])
+
+    def test_line_endings(self):
+        self.assertListEqual(['a\n', 'b\n', 'c\n', '\n', 'd'], self.read_lines(b'a\r\nb\rc\n\r\nd'))
+
+    def test_empty(self):
+        self.assertListEqual([], self.read_lines(b''))
+
+
+class TestDetectEncoding(unittest.TestCase):
+
+    def test_detect(self):
+        self.assertEqual(('utf-8', 3), detect_encoding(codecs.BOM_UTF8 + b'abc'))
+        self.assertEqual(('utf-16-le', 2), detect_encoding(codecs.BOM_UTF16_LE + 'abc'.encode('utf-16-le')))
+        self.assertEqual(('utf-16-le', 0), detect_encoding('abc'.encode('utf-16-le')))
+        self.assertEqual(('utf-16-be', 0), detect_encoding('abc'.encode('utf-16-be')))
+        self.assertEqual(('utf-8', 0), detect_encoding('Génesis'.encode('utf-8')))
+        self.assertEqual(('cp1252', 0), detect_encoding('Génesis'.encode('cp1252')))
+        # The sample can end part way through a character
+        self.assertEqual(('utf-8', 0), detect_encoding('Génesis “'.encode('utf-8')[:-1]))
+
+
+if __name__ == '__main__':
+    unittest.main()